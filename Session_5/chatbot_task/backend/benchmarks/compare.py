@@ -0,0 +1,53 @@
+"""
+Compare two benchmark result files of benchmarks.run.
+
+Usage (from the backend directory):
+    python -m benchmarks.compare benchmarks/results/baseline.json benchmarks/results/candidate.json
+"""
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    """
+    Flatten the numeric values of a result file to dotted keys, e.g. "retrieval.latency_seconds.p95".
+    """
+    values = {}
+    for key, value in results.items():
+        if key in ("meta", "files"):
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline['meta']['commit']} ({baseline['meta']['timestamp']})")
+    print(f"candidate: {candidate['meta']['commit']} ({candidate['meta']['timestamp']})")
+    base_values, candidate_values = flatten(baseline), flatten(candidate)
+    width = max(map(len, base_values), default=10)
+    print(f"{'metric':<{width}} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name, base in base_values.items():
+        if name not in candidate_values:
+            continue
+        value = candidate_values[name]
+        change = f"{(value - base) / base * 100:+.1f}%" if base else ""
+        print(f"{name:<{width}} {base:>12.4g} {value:>12.4g} {change:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from src.llm_pool import ROLE_CHAT, ROLE_QUIZ, LLMEndpoint, LLMPool
+
+CHAT_ANSWER = (
+    "Retrieval Augmented Generation ergänzt die Eingabe des Sprachmodells um passende Abschnitte aus den Unterlagen. "
+    "Dazu werden die Chunks als Embeddings in einer Vektordatenbank gespeichert und zur Frage die ähnlichsten Chunks gesucht. "
+    "So kann das Modell Fragen zu Inhalten beantworten, die nicht in seinen Trainingsdaten enthalten sind."
+)
+
+QUIZ_ANSWER = json.dumps({
+    "Frage": "Wofür wird eine Vektordatenbank in einem RAG System verwendet?",
+    "Antworten": {
+        "A": "Zum Speichern und Durchsuchen von Embeddings",
+        "B": "Zum Trainieren des Sprachmodells",
+        "C": "Zum Ausliefern der Weboberfläche",
+    },
+    "Korrekte_Antwort": "A",
+    "Erklärung": "Die Vektordatenbank speichert die Embeddings der Chunks und findet die ähnlichsten zur Frage.",
+}, ensure_ascii=False)
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Stand-in for ChatOllama that returns fixed answers with a configurable latency, so the pipeline
+    can be benchmarked without a running LLM. Each whitespace separated word counts as one token.
+    """
+
+    responses: List[str]
+    first_token_latency: float = 0.2
+    token_latency: float = 0.02
+    index: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat-model"
+
+    def _tokens(self) -> List[str]:
+        response = self.responses[self.index % len(self.responses)]
+        self.index += 1
+        return [word + " " for word in response.split()]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens()
+        time.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens).strip()))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens()
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens).strip()))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens()):
+            if i:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens()):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def create_fake_llms(first_token_latency: float, token_latency: float):
+    """
+    Return a chat and a quiz (JSON) stand-in model with the given latencies.
+    """
+    chat_llm = FakeStreamingChatModel(responses=[CHAT_ANSWER], first_token_latency=first_token_latency,
+                                      token_latency=token_latency)
+    quiz_llm = FakeStreamingChatModel(responses=[QUIZ_ANSWER], first_token_latency=first_token_latency,
+                                      token_latency=token_latency)
+    return chat_llm, quiz_llm
+
+
+def create_fake_pool(first_token_latency: float, token_latency: float, max_in_flight: int) -> LLMPool:
+    """
+    Return an LLM pool with one stand-in endpoint for the chat and one for the quiz, each serving
+    max_in_flight requests in parallel.
+    """
+    chat_llm, quiz_llm = create_fake_llms(first_token_latency, token_latency)
+    return LLMPool([
+        LLMEndpoint("fake-chat", llm=chat_llm, json_llm=chat_llm, roles=[ROLE_CHAT], max_in_flight=max_in_flight),
+        LLMEndpoint("fake-quiz", llm=quiz_llm, json_llm=quiz_llm, roles=[ROLE_QUIZ], max_in_flight=max_in_flight),
+    ])
@@ -0,0 +1,86 @@
+"""
+Minimal Ollama compatible server with fixed answers and configurable latency, to test the LLM pool
+(routing, concurrency limits, health checks) against real HTTP endpoints without a GPU.
+
+It implements GET /api/tags and POST /api/chat (streamed and not streamed). Requests with
+"format": "json" get the quiz answer, all others the chat answer. Like Ollama, at most --parallel
+requests are generated at the same time, the others wait.
+
+Usage (from the backend directory):
+    python -m benchmarks.fake_ollama --port 11501 --model llama3.2 &
+    python -m benchmarks.fake_ollama --port 11502 --model llama3.2 --model llama3.2:1b &
+    LLM_ENDPOINTS='[{"url": "http://localhost:11501", "model": "llama3.2", "roles": ["chat"]},
+                    {"url": "http://localhost:11502", "model": "llama3.2", "roles": ["chat"]},
+                    {"url": "http://localhost:11502", "model": "llama3.2:1b", "roles": ["quiz"]}]' uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.fake_llm import CHAT_ANSWER, QUIZ_ANSWER
+
+
+def create_app(models: List[str], first_token_latency: float, token_latency: float, parallel: int) -> FastAPI:
+    app = FastAPI()
+    semaphore = asyncio.Semaphore(parallel)
+    app.state.requests = 0
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": model if ":" in model else f"{model}:latest", "model": model} for model in models]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model")
+        if model not in models and f"{model}:latest" not in models:
+            return JSONResponse(status_code=404, content={"error": f"model '{model}' not found"})
+        app.state.requests += 1
+        answer = QUIZ_ANSWER if body.get("format") == "json" else CHAT_ANSWER
+        tokens = [word + " " for word in answer.split()]
+
+        def message(content: str, done: bool) -> dict:
+            return {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "message": {"role": "assistant", "content": content}, "done": done,
+                    **({"done_reason": "stop", "eval_count": len(tokens), "prompt_eval_count": 0} if done else {})}
+
+        async def stream():
+            async with semaphore:
+                await asyncio.sleep(first_token_latency)
+                for i, token in enumerate(tokens):
+                    if i:
+                        await asyncio.sleep(token_latency)
+                    yield json.dumps(message(token, False)) + "\n"
+                yield json.dumps(message("", True)) + "\n"
+
+        if body.get("stream", True):
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        async with semaphore:
+            await asyncio.sleep(first_token_latency + token_latency * len(tokens))
+        return message("".join(tokens).strip(), True)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", action="append", help="Served model, can be repeated (default: llama3.2)")
+    parser.add_argument("--first-token-latency", type=float, default=0.5, help="Latency until the first token")
+    parser.add_argument("--token-latency", type=float, default=0.03, help="Latency per token")
+    parser.add_argument("--parallel", type=int, default=2, help="Requests generated at the same time (OLLAMA_NUM_PARALLEL)")
+    args = parser.parse_args()
+
+    app = create_app(args.model or ["llama3.2"], args.first_token_latency, args.token_latency, args.parallel)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Load test of the websocket chat with many concurrent sessions.
+
+By default the real FastAPI app (main.app) is started in-process with uvicorn. It uses the stand-in
+LLM of the benchmarks, an in-process Chroma and the workshop slides as corpus. For every
+concurrency level the given number of sessions ask the questions of benchmarks/questions.json
+at the same time. With --url an already running backend is tested instead.
+
+While the in-process server runs, a monitor coroutine on its event loop measures how late it is
+woken up. A high lag means that synchronous code blocks the event loop. With --asyncio-debug the
+callbacks that block the loop longer than --block-threshold are reported by name.
+
+Usage (from the backend directory):
+    python -m benchmarks.loadtest --concurrency 1 10 20 50 --output benchmarks/results/load.json
+    python -m benchmarks.loadtest --url ws://localhost:5001/ws --concurrency 5 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+import websockets
+
+from benchmarks.run import BENCHMARK_DIR, COLLECTION, configure_environment, find_documents, git_commit, percentiles
+
+
+class EventLoopMonitor:
+    """
+    Measure the scheduling lag of an event loop: a coroutine sleeps for a fixed interval and records
+    how much later than expected it wakes up.
+    """
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.lags: List[float] = []
+        self._running = True
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self._running:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def stop(self):
+        self._running = False
+
+    def reset(self) -> List[float]:
+        lags, self.lags = self.lags, []
+        return lags
+
+
+class SlowCallbackHandler(logging.Handler):
+    """
+    Collect the "Executing <Handle ...> took X seconds" warnings of asyncio debug mode.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(logging.WARNING)
+        self.callbacks: Counter = Counter()
+        self.seconds: List[float] = []
+
+    def emit(self, record: logging.LogRecord):
+        message = record.getMessage()
+        match = re.match(r"Executing (.*) took ([\d.]+) seconds", message)
+        if match:
+            # Adressen entfernen, damit gleiche Callbacks zusammengefasst werden
+            self.callbacks[re.sub(r" at 0x[0-9a-f]+", "", match.group(1))[:200]] += 1
+            self.seconds.append(float(match.group(2)))
+
+    def reset(self) -> dict:
+        report = {"count": len(self.seconds), "max_seconds": max(self.seconds, default=0.0),
+                  "top_callbacks": self.callbacks.most_common(5)}
+        self.callbacks, self.seconds = Counter(), []
+        return report
+
+
+class InProcessServer:
+    """
+    Run main.app with uvicorn in a background thread with its own event loop.
+    """
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        import uvicorn
+
+        import main
+        from benchmarks.run import benchmark_chatbot_class
+
+        main.CustomChatBot = benchmark_chatbot_class(args.embeddings, args.first_token_latency, args.token_latency)
+        self.app = main.app
+        self.port = self._free_port()
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning",
+                                                    ws_max_queue=64))
+        self.loop = asyncio.new_event_loop()
+        if args.asyncio_debug:
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = args.block_threshold
+        self.monitor = EventLoopMonitor()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.server.serve(),), daemon=True)
+
+    @staticmethod
+    def _free_port() -> int:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    def start(self, timeout: float = 600):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Backend did not start")
+            time.sleep(0.1)
+        asyncio.run_coroutine_threadsafe(self.monitor.run(), self.loop)
+
+    def index_corpus(self, documents):
+        chatbot = self.app.state.chatbot
+        for path in documents:
+            chatbot.index_file_to_vector_db(str(path), collection_name=COLLECTION)
+
+    def stop(self):
+        self.monitor.stop()
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+async def run_session(url: str, questions: List[str], mode: str, timeout: float) -> List[dict]:
+    """
+    Ask the questions one after another in one chat session and record the latencies of every answer.
+    """
+    session_url = f"{url}?mode=session&collection_name={COLLECTION}"
+    results, websocket = [], None
+    if mode == "session":
+        websocket = await websockets.connect(session_url, max_size=None)
+    for question in questions:
+        start = time.perf_counter()
+        result = {"first_chunk": None, "latency": None, "chunks": 0, "error": None}
+        try:
+            if mode == "single" or websocket is None:
+                websocket = await websockets.connect(
+                    f"{url}?collection_name={COLLECTION}" if mode == "single" else session_url, max_size=None)
+            await websocket.send(json.dumps({"question": question}))
+            async with asyncio.timeout(timeout):
+                while True:
+                    try:
+                        message = await websocket.recv()
+                    except websockets.exceptions.ConnectionClosedOK:
+                        break
+                    if isinstance(message, bytes):
+                        message = message.decode("utf-8", errors="replace")
+                    if mode == "session":
+                        frame = json.loads(message)
+                        if frame["type"] == "error":
+                            raise RuntimeError(frame.get("message"))
+                        if frame["type"] == "end":
+                            break
+                    elif message.startswith("Error:"):
+                        raise RuntimeError(message)
+                    if result["first_chunk"] is None:
+                        result["first_chunk"] = time.perf_counter() - start
+                    result["chunks"] += 1
+            result["latency"] = time.perf_counter() - start
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            if mode == "session" and websocket is not None:
+                # Nach einem Fehler mit neuer Verbindung weitermachen
+                await websocket.close()
+                websocket = None
+        finally:
+            if mode == "single" and websocket is not None:
+                await websocket.close()
+                websocket = None
+        results.append(result)
+    if websocket is not None:
+        await websocket.close()
+    return results
+
+
+async def run_level(url: str, concurrency: int, questions: List[str], requests_per_session: int, mode: str,
+                    timeout: float, ramp_up: float) -> dict:
+    async def session(index: int):
+        # Sitzungen gestaffelt starten und mit unterschiedlichen Fragen beginnen
+        await asyncio.sleep(ramp_up * index / max(concurrency, 1))
+        asked = [questions[(index + i) % len(questions)] for i in range(requests_per_session)]
+        return await run_session(url, asked, mode, timeout)
+
+    start = time.perf_counter()
+    sessions = await asyncio.gather(*(session(i) for i in range(concurrency)), return_exceptions=True)
+    seconds = time.perf_counter() - start
+
+    results, errors = [], Counter()
+    for session_results in sessions:
+        if isinstance(session_results, BaseException):
+            errors[f"{type(session_results).__name__}: {session_results}"[:200]] += requests_per_session
+            continue
+        results.extend(session_results)
+        errors.update(result["error"][:200] for result in session_results if result["error"])
+
+    ok = [result for result in results if not result["error"]]
+    total = concurrency * requests_per_session
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "completed": len(ok),
+        "errors": total - len(ok),
+        "error_rate": round((total - len(ok)) / total, 4) if total else 0.0,
+        "error_types": dict(errors.most_common(5)),
+        "seconds": round(seconds, 3),
+        "throughput_answers_per_second": round(len(ok) / seconds, 3),
+        "time_to_first_chunk_seconds": percentiles([result["first_chunk"] for result in ok if result["first_chunk"] is not None]),
+        "answer_seconds": percentiles([result["latency"] for result in ok]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Websocket URL of a running backend (default: start main.app in-process)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 10, 20, 50], help="Concurrent sessions per level")
+    parser.add_argument("--requests-per-session", type=int, default=3, help="Questions asked by every session")
+    parser.add_argument("--mode", default="single", choices=["single", "session"],
+                        help="'single': one connection per question, 'session': one multi-turn connection per session")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout per answer in seconds")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="Seconds over which the sessions of a level are started")
+    parser.add_argument("--questions", default=str(BENCHMARK_DIR / "questions.json"), help="Question set")
+    parser.add_argument("--corpus", default=None, help="Folder with the PDFs of the question set (default: slides of the repository)")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/load-<commit>-<time>.json)")
+    parser.add_argument("--vector-store", default="persistent", choices=["persistent", "flat"], help="In-process vector store")
+    parser.add_argument("--embeddings", default="model", choices=["model", "fake"], help="See benchmarks.run")
+    parser.add_argument("--first-token-latency", type=float, default=0.5, help="Latency of the stand-in LLM until the first token")
+    parser.add_argument("--token-latency", type=float, default=0.03, help="Latency of the stand-in LLM per token")
+    parser.add_argument("--asyncio-debug", action="store_true", help="Report callbacks that block the event loop (adds overhead)")
+    parser.add_argument("--block-threshold", type=float, default=0.05, help="Event loop lag in seconds counted as blocking")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        question_set = json.load(f)
+    questions = [item["question"] for item in question_set["questions"]]
+
+    with tempfile.TemporaryDirectory(prefix="chatbot-loadtest-") as data_dir:
+        server: Optional[InProcessServer] = None
+        slow_callbacks = SlowCallbackHandler()
+        url = args.url
+        if url is None:
+            configure_environment(args, data_dir)
+            os.environ["STARTUP_MODE"] = "eager"
+            server = InProcessServer(args)
+            logging.getLogger("asyncio").addHandler(slow_callbacks)
+            print("Starting backend ...", file=sys.stderr)
+            server.start()
+            print("Indexing corpus ...", file=sys.stderr)
+            server.index_corpus(find_documents(args.corpus, question_set["documents"]))
+            url = server.url
+
+        levels = []
+        try:
+            for concurrency in args.concurrency:
+                print(f"Concurrency {concurrency} ...", file=sys.stderr)
+                if server:
+                    server.monitor.reset()
+                    slow_callbacks.reset()
+                level = asyncio.run(run_level(url, concurrency, questions, args.requests_per_session, args.mode,
+                                              args.timeout, args.ramp_up))
+                if server:
+                    lags = server.monitor.reset()
+                    level["event_loop_lag_seconds"] = percentiles(lags)
+                    level["event_loop_blocked"] = sum(lag > args.block_threshold for lag in lags)
+                    if args.asyncio_debug:
+                        level["slow_callbacks"] = slow_callbacks.reset()
+                levels.append(level)
+                print(f"  p95 first chunk {level['time_to_first_chunk_seconds'].get('p95')}s, "
+                      f"p95 answer {level['answer_seconds'].get('p95')}s, errors {level['errors']}", file=sys.stderr)
+        finally:
+            if server:
+                server.stop()
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "url": args.url or "in-process",
+            "args": vars(args),
+        },
+        "levels": levels,
+    }
+    output = args.output or str(BENCHMARK_DIR / "results" / f"load-{results['meta']['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(json.dumps(levels, indent=2, ensure_ascii=False))
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Offline benchmark of ingestion, retrieval, chat and quiz generation of the CustomChatBot.
+
+The LLM is replaced by a stand-in with configurable latency and Chroma runs in-process, so no
+network or running containers are needed. The configuration of the chatbot (CHUNK_PROFILE,
+RETRIEVAL_MODE, RETRIEVAL_K, EMBEDDING_BACKEND, ...) is read from the environment as usual.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --output benchmarks/results/baseline.json
+    CHUNK_PROFILE=quiz python -m benchmarks.run --output benchmarks/results/quiz-profile.json
+    python -m benchmarks.compare benchmarks/results/baseline.json benchmarks/results/quiz-profile.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+COLLECTION = "benchmark"
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    samples = np.asarray(values, dtype=float)
+    return {
+        "mean": round(float(samples.mean()), 4),
+        "p50": round(float(np.percentile(samples, 50)), 4),
+        "p95": round(float(np.percentile(samples, 95)), 4),
+        "p99": round(float(np.percentile(samples, 99)), 4),
+        "max": round(float(samples.max()), 4),
+    }
+
+
+def _slides_in_repository() -> List[Path]:
+    for parent in BENCHMARK_DIR.parents:
+        slides = list(parent.glob("Introduction/*.pdf")) + list(parent.glob("Session_*/slides/*.pdf"))
+        if slides:
+            return slides
+    return []
+
+
+def find_documents(corpus_dir: str, names: List[str]) -> List[Path]:
+    """
+    Locate the PDFs of the question set, either in corpus_dir or in the slides folders of the repository.
+    """
+    candidates = list(Path(corpus_dir).rglob("*.pdf")) if corpus_dir else _slides_in_repository()
+    by_name = {path.name: path for path in candidates}
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise SystemExit(f"Benchmark documents not found: {missing}. Pass the folder with --corpus.")
+    return [by_name[name] for name in names]
+
+
+def configure_environment(args: argparse.Namespace, data_dir: str):
+    """
+    Point all stores of the chatbot to a fresh temporary directory. Must run before src.bot is imported.
+    """
+    os.environ["VECTOR_STORE_MODE"] = args.vector_store
+    os.environ["CHROMA_PATH"] = os.path.join(data_dir, "chroma")
+    os.environ["FLAT_STORE_PATH"] = os.path.join(data_dir, "flat_store")
+    os.environ["QUESTION_BANK_PATH"] = os.path.join(data_dir, "questions.sqlite")
+    os.environ["KEYWORD_INDEX_PATH"] = os.path.join(data_dir, "keyword_index.sqlite")
+    os.environ["CHUNK_PROFILE_PATH"] = os.path.join(data_dir, "chunk_profiles.sqlite")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embeddings.sqlite")
+    os.environ["SUMMARY_STORE_PATH"] = os.path.join(data_dir, "summary_store")
+    os.environ["UPLOAD_DIR"] = os.path.join(data_dir, "pdfs")
+    os.environ["ANSWER_CACHE"] = "0"
+    os.environ.setdefault("EMBEDDING_CACHE", "0")
+    # Nur lokal vorhandene Modelle verwenden
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+
+def benchmark_chatbot_class(embeddings: str, first_token_latency: float, token_latency: float):
+    """
+    Subclass of CustomChatBot that uses the stand-in LLM and optionally fake embeddings.
+    """
+    from benchmarks.fake_llm import create_fake_pool
+    from src.bot import LLM_ENDPOINT_MAX_IN_FLIGHT, CustomChatBot
+
+    class BenchmarkChatBot(CustomChatBot):
+        def _initialize_llm_pool(self):
+            return create_fake_pool(first_token_latency, token_latency, LLM_ENDPOINT_MAX_IN_FLIGHT)
+
+        def _initialize_embedding_function(self):
+            if embeddings == "fake":
+                from langchain_core.embeddings import DeterministicFakeEmbedding
+                return DeterministicFakeEmbedding(size=768)
+            return super()._initialize_embedding_function()
+
+    return BenchmarkChatBot
+
+
+def create_chatbot(args: argparse.Namespace):
+    return benchmark_chatbot_class(args.embeddings, args.first_token_latency, args.token_latency)()
+
+
+def benchmark_ingestion(chatbot, documents: List[Path]) -> dict:
+    from src.ingestion import IngestionJob
+
+    files = []
+    total_start = time.perf_counter()
+    for path in documents:
+        job = IngestionJob(filename=path.name, collection_name=COLLECTION)
+        start = time.perf_counter()
+        chatbot.index_file_to_vector_db(str(path), collection_name=COLLECTION, job=job)
+        seconds = time.perf_counter() - start
+        files.append({
+            "file": path.name,
+            "seconds": round(seconds, 4),
+            "pages": job.progress.pages_parsed,
+            "chunks": job.progress.chunks_written,
+            "embed_seconds": round(job.progress.embed_seconds, 4),
+        })
+    seconds = time.perf_counter() - total_start
+    chunks = sum(file["chunks"] for file in files)
+    pages = sum(file["pages"] for file in files)
+    return {
+        "seconds": round(seconds, 4),
+        "documents": len(files),
+        "pages": pages,
+        "chunks": chunks,
+        "pages_per_second": round(pages / seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 3),
+        "files": files,
+    }
+
+
+def _is_relevant(doc, relevant: List[dict]) -> bool:
+    source, page = doc.metadata.get("source"), doc.metadata.get("page")
+    return any(source == entry["source"] and page in entry["pages"] for entry in relevant)
+
+
+def benchmark_retrieval(chatbot, questions: List[dict], rounds: int) -> dict:
+    from src.bot import RETRIEVAL_K
+
+    vector_db = chatbot._get_collection_handle(COLLECTION).vector_db
+    retriever = chatbot._create_retriever(vector_db)
+    ks = sorted({1, 3, RETRIEVAL_K})
+
+    # Erster Durchlauf ohne Messung (Lazy Loading, Caches des Betriebssystems)
+    for item in questions:
+        retriever.invoke(item["question"])
+
+    latencies, hits, reciprocal_ranks = [], {k: 0 for k in ks}, []
+    for round_ in range(rounds):
+        for item in questions:
+            start = time.perf_counter()
+            docs = retriever.invoke(item["question"])
+            latencies.append(time.perf_counter() - start)
+            if round_ > 0:
+                continue
+
+            ranks = [i for i, doc in enumerate(docs) if _is_relevant(doc, item["relevant"])]
+            for k in ks:
+                hits[k] += bool(ranks and ranks[0] < k)
+            reciprocal_ranks.append(1.0 / (ranks[0] + 1) if ranks else 0.0)
+
+    return {
+        "questions": len(questions),
+        "rounds": rounds,
+        "latency_seconds": percentiles(latencies),
+        "recall": {f"@{k}": round(hits[k] / len(questions), 4) for k in ks},
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+    }
+
+
+async def benchmark_chat(chatbot, questions: List[dict]) -> dict:
+    first_chunk, total, tokens = [], [], 0
+    for item in questions:
+        start = time.perf_counter()
+        first = None
+        async for _ in chatbot.astream(item["question"], collection_name=COLLECTION):
+            if first is None:
+                first = time.perf_counter() - start
+            tokens += 1
+        total.append(time.perf_counter() - start)
+        first_chunk.append(first or total[-1])
+    return {
+        "questions": len(questions),
+        "time_to_first_chunk_seconds": percentiles(first_chunk),
+        "answer_seconds": percentiles(total),
+        "chunks_per_second": round(tokens / sum(total), 3),
+    }
+
+
+async def benchmark_quiz(chatbot, max_questions: int) -> dict:
+    chatbot.question_bank.delete_collection(COLLECTION)
+    start = time.perf_counter()
+    questions = await chatbot.generate_questions(COLLECTION, max_questions=max_questions)
+    seconds = time.perf_counter() - start
+
+    # Zweiter Aufruf wird aus der Fragenbank beantwortet
+    start = time.perf_counter()
+    await chatbot.generate_questions(COLLECTION, max_questions=max_questions)
+    cached_seconds = time.perf_counter() - start
+    return {
+        "questions": len(questions),
+        "seconds": round(seconds, 4),
+        "seconds_per_question": round(seconds / len(questions), 4) if questions else None,
+        "question_bank_seconds": round(cached_seconds, 4),
+        "stats": chatbot.get_quiz_stats(),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default=str(BENCHMARK_DIR / "questions.json"), help="Question set with relevant pages")
+    parser.add_argument("--corpus", default=None, help="Folder with the PDFs of the question set (default: slides of the repository)")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--vector-store", default="persistent", choices=["persistent", "flat"], help="In-process vector store")
+    parser.add_argument("--embeddings", default="model", choices=["model", "fake"],
+                        help="'model' uses the configured embedding model, 'fake' random vectors (recall is meaningless)")
+    parser.add_argument("--rounds", type=int, default=5, help="Repetitions of the retrieval latency measurement")
+    parser.add_argument("--first-token-latency", type=float, default=0.2, help="Latency of the stand-in LLM until the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Latency of the stand-in LLM per token")
+    parser.add_argument("--quiz-questions", type=int, default=10, help="Number of chunks used for the quiz benchmark")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["chat", "quiz"], help="Skip benchmark sections")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        question_set = json.load(f)
+    documents = find_documents(args.corpus, question_set["documents"])
+
+    with tempfile.TemporaryDirectory(prefix="chatbot-benchmark-") as data_dir:
+        configure_environment(args, data_dir)
+        start = time.perf_counter()
+        chatbot = create_chatbot(args)
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+                "config": {key: os.environ.get(key) for key in (
+                    "CHUNK_PROFILE", "CHUNK_MAX_TOKENS", "CHUNK_OVERLAP_TOKENS", "RETRIEVAL_MODE", "RETRIEVAL_K",
+                    "RETRIEVAL_FETCH_K", "RERANK_MODEL", "EMBEDDING_BACKEND", "EMBEDDING_CACHE", "INDEX_BATCH_SIZE",
+                    "CONTEXT_MAX_TOKENS", "QUIZ_CONCURRENCY")},
+                "init_seconds": round(time.perf_counter() - start, 4),
+            },
+        }
+
+        print("Ingestion ...", file=sys.stderr)
+        results["ingestion"] = benchmark_ingestion(chatbot, documents)
+        print("Retrieval ...", file=sys.stderr)
+        results["retrieval"] = benchmark_retrieval(chatbot, question_set["questions"], args.rounds)
+        if "chat" not in args.skip:
+            print("Chat ...", file=sys.stderr)
+            results["chat"] = asyncio.run(benchmark_chat(chatbot, question_set["questions"]))
+        if "quiz" not in args.skip:
+            print("Quiz ...", file=sys.stderr)
+            results["quiz"] = asyncio.run(benchmark_quiz(chatbot, args.quiz_questions))
+
+    output = args.output or str(BENCHMARK_DIR / "results" / f"{results['meta']['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(json.dumps({key: value for key, value in results.items() if key != "meta"}, indent=2, ensure_ascii=False))
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
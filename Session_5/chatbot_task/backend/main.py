@@ -1,32 +1,103 @@
+import asyncio
+import json
 import logging
 import os
+import shutil
+import tempfile
+import time
 import traceback
 from contextlib import asynccontextmanager
+from typing import Optional, Tuple
 
 import uvicorn
-from fastapi import (FastAPI, File, HTTPException, UploadFile, WebSocket,
-                     WebSocketDisconnect)
+from fastapi import (FastAPI, File, Form, HTTPException, Request, UploadFile,
+                     WebSocket, WebSocketDisconnect)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 from pydantic import BaseModel
-from src.bot import CustomChatBot
+from src.bot import DEFAULT_CHUNK_PROFILE, SUMMARIES, CollectionNotFound, CustomChatBot
+from src.bulk_import import (BulkImportError, assign_collections, extract_pdfs, find_pdfs, remove_staged, stage_files,
+                             staged_path)
+from src.chunking import PROFILE_PRESETS, resolve_profile
+from src.conversation import ConversationMemory
+from src.ingestion import IngestionJob, IngestionManager, IngestionQueueFull
+from src.llm_pool import LLMUnavailable
+from src.llm_scheduler import LLMOverloaded
+from src.metrics import RAG_STAGE_SECONDS, ChatbotStatsCollector
+from src.startup import StartupState, StartupStatus, initialize_chatbot
 
 # Set up logger
 logger = logging.getLogger("uvicorn")
 logger.setLevel(logging.INFO)
 
+# "eager": Chatbot vor dem Start des Servers initialisieren, "background": Server sofort starten und
+# den Chatbot im Hintergrund laden (Anfragen erhalten bis dahin 503)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager")
+# Embedding Modell und LLM vor der Bereitschaft einmal aufrufen
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "0") == "1"
+
+# Ablage der hochgeladenen PDFs, aus der Collections neu gechunkt werden können
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "pdfs")
+# Verzeichnis auf dem Server, unterhalb dessen Ordner per /import eingelesen werden dürfen
+IMPORT_ROOT = os.getenv("IMPORT_ROOT", "imports")
+# Maximale entpackte Größe aller PDFs eines ZIP Archivs in MB (0 = unbegrenzt)
+IMPORT_MAX_SIZE_MB = int(os.getenv("IMPORT_MAX_SIZE_MB", "2048"))
+
+# Abstand der Health Checks der LLM Endpunkte in Sekunden (0 = deaktiviert)
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "10"))
+
+# Pfade, die auch ohne initialisierten Chatbot erreichbar sind
+_ALWAYS_AVAILABLE_PATHS = ("/health", "/metrics", "/docs", "/openapi.json")
+
+
+def _start_llm_health_checks(app: FastAPI):
+    if LLM_HEALTH_CHECK_INTERVAL > 0:
+        app.state.llm_health_task = asyncio.create_task(app.state.chatbot.llm_pool.run_health_checks(LLM_HEALTH_CHECK_INTERVAL))
+
+
+async def _initialize_in_background(app: FastAPI):
+    chatbot = await asyncio.to_thread(initialize_chatbot, app.state.startup, CustomChatBot, STARTUP_WARMUP)
+    if chatbot is not None:
+        # Erst nach der Zuweisung bereit melden, sonst erreichen Anfragen einen fehlenden Chatbot
+        app.state.chatbot = chatbot
+        app.state.startup.mark_ready()
+        _start_llm_health_checks(app)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     FastAPI lifespan manager to ensure CustomChatBot is initialized and cleaned up correctly.
     """
-    logger.info("Creating instance of custom chatbot.")
-    app.state.chatbot = CustomChatBot()
+    logger.info(f"Creating instance of custom chatbot (startup mode: {STARTUP_MODE}).")
+    app.state.startup = StartupState()
+    # Ingestion Jobs starten die Zusammenfassungen aus ihrem Thread auf dem Event Loop
+    app.state.loop = asyncio.get_running_loop()
+    if STARTUP_MODE == "background":
+        app.state.startup_task = asyncio.create_task(_initialize_in_background(app))
+    else:
+        chatbot = initialize_chatbot(app.state.startup, CustomChatBot, STARTUP_WARMUP)
+        if chatbot is None:
+            raise RuntimeError(f"Chatbot initialization failed: {app.state.startup.error}")
+        app.state.chatbot = chatbot
+        app.state.startup.mark_ready()
+        _start_llm_health_checks(app)
+    app.state.ingestion = IngestionManager(
+        max_workers=int(os.getenv("INGESTION_WORKERS", "2")),
+        max_pending=int(os.getenv("INGESTION_MAX_PENDING", "32")),
+    )
     try:
         yield
     finally:
         logger.info("Cleaning up chatbot instance.")
-        del app.state.chatbot 
+        app.state.ingestion.shutdown()
+        if hasattr(app.state, "llm_health_task"):
+            app.state.llm_health_task.cancel()
+        if hasattr(app.state, "chatbot"):
+            app.state.chatbot.cancel_summaries()
+            del app.state.chatbot
 
 # Create FastAPI app and configure CORS
 app = FastAPI(lifespan=lifespan)
@@ -39,31 +110,255 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def require_ready(request: Request, call_next):
+    """
+    Answer requests with 503 until the chatbot is initialized (STARTUP_MODE=background).
+    """
+    if not app.state.startup.is_ready and not request.url.path.startswith(_ALWAYS_AVAILABLE_PATHS):
+        return JSONResponse(status_code=503, content={"message": "Backend startet noch", **app.state.startup.to_dict()},
+                            headers={"Retry-After": "5"})
+    return await call_next(request)
+
+
+# Cache Trefferquoten und Quiz Zähler werden beim Abruf von /metrics aus dem Chatbot gelesen
+REGISTRY.register(ChatbotStatsCollector(lambda: getattr(app.state, "chatbot", None)))
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics: stage latencies of chat, ingestion and quiz, LLM tokens/s, indexed chunks and cache hit rates.
+    """
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/health/live")
+def liveness():
+    """
+    Liveness probe: the process is running and the initialization has not failed.
+    """
+    startup = app.state.startup
+    if startup.status == StartupStatus.FAILED:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup.error})
+    return {"status": "alive", "startup": startup.status.value}
+
+
+@app.get("/health/ready")
+def readiness():
+    """
+    Readiness probe: the chatbot is initialized (and warmed up) and can serve requests.
+    Includes the initialization time per component.
+    """
+    startup = app.state.startup
+    return JSONResponse(status_code=200 if startup.is_ready else 503, content=startup.to_dict())
+
+
 class CollectionRequest(BaseModel):
     collection_name: str
 
+
+class ChunkProfileRequest(BaseModel):
+    """
+    Chunk profile of a collection: a preset, optionally with individual values changed.
+    """
+    preset: Optional[str] = None
+    max_tokens: Optional[int] = None
+    overlap_tokens: Optional[int] = None
+    min_tokens: Optional[int] = None
+    page_boundaries: Optional[bool] = None
+    headings: Optional[bool] = None
+    # Bereits indexierte Dokumente aus den gespeicherten PDFs neu chunken
+    rechunk: bool = True
+
+def _submit_index_job(chatbot: CustomChatBot, file_path: str, filename: str, collection_name: str) -> IngestionJob:
+    """
+    Index a stored PDF as background ingestion job. With SUMMARIES the summary pass of the collection
+    is started afterwards.
+    """
+    loop = app.state.loop
+
+    def index(job: IngestionJob):
+        chatbot.index_file_to_vector_db(file_path, collection_name=collection_name, job=job)
+        if SUMMARIES:
+            loop.call_soon_threadsafe(chatbot.schedule_summaries, collection_name)
+
+    return app.state.ingestion.submit(index, filename=filename, collection_name=collection_name)
+
 # Dateiupload
 @app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):    
-    upload_dir = "pdfs"
+async def upload_pdf(file: UploadFile = File(...), collection_name: Optional[str] = Form(None)):
+    """
+    Upload a PDF and index it in the background. Without collection_name the file gets its own
+    collection named after the file, otherwise it is added to the given (multi-document) collection.
+    """
     try:
-        os.makedirs(upload_dir, exist_ok=True)
+        filename = os.path.basename(file.filename or "default.pdf")
+        chatbot = app.state.chatbot
+        collection: str = chatbot._validate_and_adjust_collection_name(collection_name or filename)
 
-        filename = file.filename or "default.pdf"
-        file_path = os.path.join(upload_dir, filename)
+        file_path = staged_path(UPLOAD_DIR, collection, filename)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path, "wb") as f:
-            f.write(await file.read())
-        
-        app.state.chatbot.set_vector_db_collection(filename)
-
-        if True: #Kp was ich da noch implementieren wollte... 
-            logger.debug("Lade Datei in Vector DB...")
-            app.state.chatbot.index_file_to_vector_db(file_path)
-        return JSONResponse(content={"message": f"Datei '{filename}' erfolgreich hochgeladen!"})
-    
+            await run_in_threadpool(shutil.copyfileobj, file.file, f)
+
+        # Indexierung läuft im Hintergrund, damit der Event Loop (Websocket Chat) nicht blockiert
+        job = _submit_index_job(chatbot, file_path, filename, collection)
+        return JSONResponse(status_code=202, content={
+            "message": f"Datei '{filename}' erfolgreich hochgeladen, Indexierung gestartet!",
+            "job_id": job.job_id,
+            "collection_name": collection,
+        })
+
+    except IngestionQueueFull as e:
+        return JSONResponse(status_code=503, content={"message": "Zu viele laufende Uploads", "error": str(e)})
     except Exception as e:
          return JSONResponse(status_code=500, content={"message": "Fehler beim Hochladen", "error": str(e)})
-    
+
+
+def _resolve_import_directory(directory: str) -> str:
+    """
+    Path of a directory below IMPORT_ROOT. Other paths of the server cannot be imported.
+    """
+    root = os.path.realpath(IMPORT_ROOT)
+    path = os.path.realpath(os.path.join(root, directory))
+    if path != root and not path.startswith(root + os.sep):
+        raise HTTPException(status_code=400, detail=f"Ordner '{directory}' liegt außerhalb von IMPORT_ROOT")
+    if not os.path.isdir(path):
+        raise HTTPException(status_code=404, detail=f"Ordner '{directory}' nicht gefunden")
+    return path
+
+
+@app.post("/import")
+async def bulk_import(file: Optional[UploadFile] = File(None), directory: Optional[str] = Form(None),
+                      collection_name: Optional[str] = Form(None)):
+    """
+    Import many PDFs at once, either from an uploaded ZIP archive or from a directory below IMPORT_ROOT
+    on the server. Without collection_name every top-level folder becomes its own collection, PDFs
+    outside of folders get a collection named after the file like single uploads.
+
+    All files are indexed in one background job: parsed in parallel processes and embedded in shared
+    batches. Files that fail are listed in the "files" report of the job, the others are still indexed.
+    """
+    if (file is None) == (not directory):
+        raise HTTPException(status_code=400, detail="Entweder eine ZIP Datei oder ein Ordner muss angegeben werden")
+
+    chatbot = app.state.chatbot
+    target: Optional[str] = chatbot._validate_and_adjust_collection_name(collection_name) if collection_name else None
+
+    # Entweder das ZIP Archiv oder der Ordner auf dem Server ist gesetzt
+    archive: Optional[str] = None
+    source_directory = ""
+    if file is not None:
+        filename = os.path.basename(file.filename or "import.zip")
+        if not filename.lower().endswith(".zip"):
+            raise HTTPException(status_code=400, detail="Nur ZIP Archive werden unterstützt")
+        fd, archive = tempfile.mkstemp(suffix=".zip")
+        with os.fdopen(fd, "wb") as f:
+            await run_in_threadpool(shutil.copyfileobj, file.file, f)
+    elif directory:
+        source_directory = _resolve_import_directory(directory)
+        filename = os.path.basename(source_directory.rstrip(os.sep)) or directory
+    else:
+        raise HTTPException(status_code=400, detail="Entweder eine ZIP Datei oder ein Ordner muss angegeben werden")
+
+    loop = app.state.loop
+
+    def run_import(job: IngestionJob):
+        workdir = None
+        try:
+            if archive is not None:
+                workdir = tempfile.mkdtemp(prefix="import-")
+                paths = extract_pdfs(archive, workdir, max_bytes=IMPORT_MAX_SIZE_MB * 1024 * 1024)
+                root = workdir
+            else:
+                paths = find_pdfs(source_directory)
+                root = source_directory
+            assignments, errors = assign_collections(paths, root, target, chatbot._validate_and_adjust_collection_name)
+            job.progress.errors.extend(errors)
+            if not assignments:
+                raise BulkImportError("Keine PDF Dateien gefunden")
+
+            changed = chatbot.import_files(assignments, job=job)
+            # Erst nach dem Parsen wie Einzeluploads unter UPLOAD_DIR/<collection> ablegen,
+            # damit die Collections neu gechunkt werden können
+            stage_files(assignments, UPLOAD_DIR, move=archive is not None)
+            if SUMMARIES:
+                for name in changed:
+                    loop.call_soon_threadsafe(chatbot.schedule_summaries, name)
+        finally:
+            if archive is not None:
+                os.remove(archive)
+            if workdir is not None:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    try:
+        job = app.state.ingestion.submit(run_import, filename=filename, collection_name=target or "")
+    except IngestionQueueFull as e:
+        if archive is not None:
+            os.remove(archive)
+        return JSONResponse(status_code=503, content={"message": "Zu viele laufende Uploads", "error": str(e)})
+    return JSONResponse(status_code=202, content={
+        "message": f"Import von '{filename}' gestartet!",
+        "job_id": job.job_id,
+        "collection_name": target,
+    })
+
+
+@app.get("/ingestion_jobs")
+def list_ingestion_jobs():
+    return [job.to_dict() for job in app.state.ingestion.list_jobs()]
+
+
+@app.get("/ingestion_jobs/{job_id}")
+def get_ingestion_job(job_id: str):
+    job = app.state.ingestion.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} nicht gefunden")
+    return job.to_dict()
+
+
+@app.delete("/ingestion_jobs/{job_id}")
+def cancel_ingestion_job(job_id: str):
+    job = app.state.ingestion.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} nicht gefunden")
+    return job.to_dict()
+
+@app.get("/embedding_cache/stats")
+def embedding_cache_stats():
+    stats = app.state.chatbot.get_embedding_cache_stats()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Embedding Cache ist deaktiviert")
+    return stats
+
+
+@app.get("/embedding_engine/stats")
+def embedding_engine_stats():
+    stats = app.state.chatbot.get_embedding_engine_stats()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Kein Bulk Embedding Backend konfiguriert")
+    return stats
+
+
+@app.get("/llm_scheduler/stats")
+def llm_scheduler_stats():
+    return app.state.chatbot.get_llm_scheduler_stats()
+
+
+@app.get("/llm_endpoints")
+def llm_endpoints():
+    return app.state.chatbot.get_llm_pool_stats()
+
+
+@app.get("/answer_cache/stats")
+def answer_cache_stats():
+    stats = app.state.chatbot.get_answer_cache_stats()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Antwort Cache ist deaktiviert")
+    return stats
+
+
 @app.get("/get_collections")
 def get_collections():
     collections = app.state.chatbot.get_vector_db_collections()
@@ -79,26 +374,221 @@ def get_current_collection():
 @app.post("/set_collection")
 def set_collection(request: CollectionRequest):
     collection_name = request.collection_name
-    app.state.chatbot.set_vector_db_collection(collection_name)
+    try:
+        app.state.chatbot.set_vector_db_collection(collection_name)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
     return {"message": f"Collection {collection_name} ausgewählt"}
 
+@app.get("/collections/{collection_name}/documents")
+def list_documents(collection_name: str):
+    try:
+        return app.state.chatbot.list_documents(collection_name)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.delete("/collections/{collection_name}/documents/{source}")
+def delete_document(collection_name: str, source: str):
+    chatbot = app.state.chatbot
+    try:
+        removed = chatbot.delete_document(collection_name, source)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    remove_staged(UPLOAD_DIR, chatbot._validate_and_adjust_collection_name(collection_name), source)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Dokument {source} nicht in {collection_name} gefunden")
+    return {"message": f"Dokument {source} aus {collection_name} gelöscht", "chunks_removed": removed}
+
+
+@app.get("/chunk_profiles")
+def chunk_profiles():
+    return {"default": DEFAULT_CHUNK_PROFILE.model_dump(),
+            "presets": {name: profile.model_dump() for name, profile in PROFILE_PRESETS.items()}}
+
+
+@app.get("/collections/{collection_name}/chunk_profile")
+def get_chunk_profile(collection_name: str):
+    chatbot = app.state.chatbot
+    collection_name = chatbot._validate_and_adjust_collection_name(collection_name)
+    # Ein Profil kann schon vor dem ersten Upload gesetzt werden
+    if chatbot.chunk_profiles.get(collection_name) is None:
+        try:
+            chatbot._ensure_collection_exists(collection_name)
+        except CollectionNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    return chatbot.get_chunk_profile(collection_name).model_dump()
+
+
+@app.put("/collections/{collection_name}/chunk_profile")
+def set_chunk_profile(collection_name: str, request: ChunkProfileRequest):
+    """
+    Set the chunk profile of a collection. With rechunk (default) every document of the collection is
+    indexed again from the stored PDF in the background, unchanged chunks are not embedded again.
+    """
+    chatbot = app.state.chatbot
+    try:
+        profile = resolve_profile(**request.model_dump(exclude={"rechunk"}))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    collection_name = chatbot._validate_and_adjust_collection_name(collection_name)
+    chatbot.set_chunk_profile(collection_name, profile)
+    if not request.rechunk:
+        return {"collection_name": collection_name, "profile": profile.model_dump(), "jobs": [], "missing": []}
+
+    try:
+        sources = [document["source"] for document in chatbot.list_documents(collection_name)]
+    except CollectionNotFound:
+        # Collection existiert noch nicht, das Profil gilt für die ersten Uploads
+        sources = []
+    jobs, missing = [], []
+    for source in sources:
+        # Vor der Ablage pro Collection wurden alle PDFs direkt in UPLOAD_DIR gespeichert
+        candidates = [staged_path(UPLOAD_DIR, collection_name, source), os.path.join(UPLOAD_DIR, os.path.basename(source))]
+        file_path = next((path for path in candidates if os.path.isfile(path)), None)
+        if file_path is None:
+            missing.append(source)
+            continue
+        try:
+            jobs.append(_submit_index_job(chatbot, file_path, source, collection_name).job_id)
+        except IngestionQueueFull as e:
+            return JSONResponse(status_code=503, content={"message": "Zu viele laufende Uploads", "error": str(e),
+                                                          "jobs": jobs})
+    return JSONResponse(status_code=202, content={"collection_name": collection_name, "profile": profile.model_dump(),
+                                                  "jobs": jobs, "missing": missing})
+
+
+@app.get("/collections/{collection_name}/summaries")
+def get_summaries(collection_name: str):
+    """
+    Progress of the summary pass, whether retrieval uses the summaries and the document summaries.
+    """
+    return app.state.chatbot.get_summary_status(collection_name)
+
+
+@app.post("/collections/{collection_name}/summaries")
+async def summarize_collection(collection_name: str):
+    """
+    Start the summary pass of a collection, e.g. for collections indexed before SUMMARIES was enabled.
+    """
+    chatbot = app.state.chatbot
+    collection_name = chatbot._validate_and_adjust_collection_name(collection_name)
+    try:
+        await asyncio.to_thread(chatbot._ensure_collection_exists, collection_name)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    status = chatbot.schedule_summaries(collection_name)
+    return JSONResponse(status_code=202, content=status.to_dict())
+
+
 @app.put("/delete_collection")
 def delete_collection(request: CollectionRequest):
-    result = app.state.chatbot.delete_collection(request.collection_name)
+    chatbot = app.state.chatbot
+    result = chatbot.delete_collection(request.collection_name)
+    # Gespeicherte PDFs nur entfernen, wenn die Collection tatsächlich gelöscht wurde
+    collection_name = chatbot._validate_and_adjust_collection_name(request.collection_name)
+    if collection_name not in chatbot.get_vector_db_collections():
+        remove_staged(UPLOAD_DIR, collection_name)
     return result
 
 @app.post("/generate_questions")
-def generate_questions():
-    return app.state.chatbot.generate_questions()
+async def generate_questions(collection_name: Optional[str] = None, max_questions: Optional[int] = None, sample: bool = False):
+    try:
+        return await app.state.chatbot.generate_questions(collection_name, max_questions=max_questions, sample=sample)
+    except (LLMOverloaded, LLMUnavailable) as e:
+        return JSONResponse(status_code=503, content={"message": "LLM ist überlastet", "error": str(e)},
+                            headers={"Retry-After": "30"})
+
+
+@app.get("/generate_questions/stream")
+async def generate_questions_stream(collection_name: Optional[str] = None, max_questions: Optional[int] = None, sample: bool = False):
+    """
+    Server-Sent Events stream that sends every generated question as soon as it is ready.
+    """
+    async def events():
+        try:
+            async for i, question in app.state.chatbot.agenerate_questions(collection_name, max_questions=max_questions, sample=sample):
+                yield f"event: question\ndata: {json.dumps({'id': i, **question}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error(f"Error generating questions: {e}", exc_info=True)
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/generate_questions/stats")
+def generate_questions_stats():
+    return app.state.chatbot.get_quiz_stats()
+
+
+@app.get("/question_bank")
+def get_question_bank(collection_name: Optional[str] = None, offset: int = 0, limit: int = 20):
+    """
+    Page through the stored questions of a collection.
+    """
+    return app.state.chatbot.get_question_bank_page(collection_name, offset=offset, limit=min(limit, 100))
+
+
+def parse_chat_message(message: str, default_collection: Optional[str]) -> Tuple[str, Optional[str], Optional[dict]]:
+    """
+    Parse a websocket chat message. Clients can send the bare question as text or a JSON object
+    {"question": ..., "collection_name": ..., "filter": ...} to select the collection and a metadata
+    filter (e.g. {"source": "script.pdf"}) per message.
+    """
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        return message, default_collection, None
+    if not isinstance(data, dict) or "question" not in data:
+        return message, default_collection, None
+    return str(data["question"]), data.get("collection_name") or default_collection, data.get("filter") or None
+
+
+async def _handle_session_message(websocket: WebSocket, input_data: str, session_collection: Optional[str],
+                                  memory: ConversationMemory):
+    """
+    Answer one message of a multi-turn session. The answer is sent as JSON frames
+    {"type": "chunk", "content": ...} followed by {"type": "end"}.
+    """
+    try:
+        data = json.loads(input_data)
+    except json.JSONDecodeError:
+        data = None
+    if isinstance(data, dict) and data.get("reset"):
+        memory.clear()
+        await websocket.send_json({"type": "reset"})
+        return
+
+    question, collection_name, metadata_filter = parse_chat_message(input_data, session_collection)
+    send_seconds = 0.0
+    async for chunk in app.state.chatbot.astream(question, collection_name=collection_name, filter=metadata_filter, memory=memory):
+        send_start = time.perf_counter()
+        await websocket.send_json({"type": "chunk", "content": chunk})
+        send_seconds += time.perf_counter() - send_start
+    await websocket.send_json({"type": "end"})
+    RAG_STAGE_SECONDS.labels("websocket_send").observe(send_seconds)
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
     WebSocket endpoint that handles communication with the client.
+
+    By default the connection answers one message with plain text chunks and is closed afterwards.
+    With ?mode=session the connection stays open for a multi-turn conversation whose history is
+    kept in memory for the lifetime of the connection.
     """
     await websocket.accept()
-    logger.info('Client connected.')
+    if not app.state.startup.is_ready:
+        # 1013: "Try Again Later"
+        await websocket.close(code=1013, reason="Backend startet noch")
+        return
+    # Collection kann pro Verbindung (?collection_name=...) oder pro Nachricht gewählt werden
+    session_collection = websocket.query_params.get("collection_name")
+    session_mode = websocket.query_params.get("mode") == "session"
+    memory = app.state.chatbot.new_conversation_memory() if session_mode else None
+    logger.info(f'Client connected (collection: {session_collection or "default"}, mode: {"session" if session_mode else "single"}).')
 
     try:
         while True:
@@ -107,12 +597,22 @@ async def websocket_endpoint(websocket: WebSocket):
                 input_data = await websocket.receive_text()
                 logger.info(f"Received input: {input_data}")
 
+                if memory is not None:
+                    await _handle_session_message(websocket, input_data, session_collection, memory)
+                    continue
+
+                question, collection_name, metadata_filter = parse_chat_message(input_data, session_collection)
+
                 # Process the input using the chatbot's stream_answer method
-                async for chunk in app.state.chatbot.astream(input_data):
+                send_seconds = 0.0
+                async for chunk in app.state.chatbot.astream(question, collection_name=collection_name, filter=metadata_filter):
                     chain_result = chunk
                     logger.info(f"Sending chunk: {chain_result}")
                     # Send the response chunk back to the client
+                    send_start = time.perf_counter()
                     await websocket.send_text(chain_result)
+                    send_seconds += time.perf_counter() - send_start
+                RAG_STAGE_SECONDS.labels("websocket_send").observe(send_seconds)
 
                 logger.info("Ende des Streams")
                 await websocket.close()
@@ -127,6 +627,10 @@ async def websocket_endpoint(websocket: WebSocket):
                 # Handle unexpected errors during input processing
                 logger.error(f"Error processing chatbot response: {str(e)}")
                 logger.error(traceback.format_exc())
+                if session_mode:
+                    # Die Sitzung bleibt nach einem Fehler bei einer Nachricht offen
+                    await websocket.send_json({"type": "error", "message": str(e)})
+                    continue
                 await websocket.send_text(f"Error: {str(e)}")
                 break
 
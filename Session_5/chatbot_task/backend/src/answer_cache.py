@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+
+@dataclass
+class CachedAnswer:
+    collection: str
+    question: str
+    answer: str
+    embedding: Optional[np.ndarray] = None
+    created_at: float = field(default_factory=time.time)
+
+
+class AnswerCache:
+    """
+    Cache of generated RAG answers keyed by (collection, normalized question).
+
+    Optionally, a question that is not found exactly is compared by embedding similarity to the cached
+    questions of the same collection and the answer of the closest one is returned if the cosine
+    similarity is above the threshold. Entries expire after ttl_seconds and the least recently used
+    entries are evicted once max_entries is reached.
+
+    Every invalidation of a collection increments its generation. An answer that was generated before
+    the invalidation (generation captured before the lookup) is not stored.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, similarity_threshold: float = 0.0,
+                 embedding_function: Optional[Embeddings] = None) -> None:
+        """
+        Args:
+            max_entries (int): Maximum number of cached answers.
+            ttl_seconds (float): Lifetime of an entry in seconds.
+            similarity_threshold (float): Minimum cosine similarity for near-duplicate matches, 0 disables them.
+            embedding_function (Optional[Embeddings]): Embedding model for near-duplicate matches.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embedding_function = embedding_function
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[Tuple[str, str], CachedAnswer]" = OrderedDict()
+        self._generation: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold > 0 and self.embedding_function is not None
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Normalize a question so that differences in case, whitespace and trailing punctuation do not matter.
+        """
+        question = re.sub(r"\s+", " ", question.strip().lower())
+        return question.strip(" ?!.")
+
+    def generation(self, collection: str) -> int:
+        """
+        Current generation of a collection, to be passed to store for the answer generated afterwards.
+        """
+        with self._lock:
+            return self._generation.get(collection, 0)
+
+    def _is_expired(self, entry: CachedAnswer, now: float) -> bool:
+        return now - entry.created_at > self.ttl_seconds
+
+    def _lookup_exact(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._is_expired(entry, time.time()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.answer
+
+    def _lookup_similar(self, collection: str, question: str) -> Optional[str]:
+        if self.embedding_function is None:
+            return None
+        query = np.asarray(self.embedding_function.embed_query(question), dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+
+        best_key, best_score = None, self.similarity_threshold
+        now = time.time()
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry.collection != collection or entry.embedding is None or self._is_expired(entry, now):
+                    continue
+                score = float(entry.embedding @ query / ((np.linalg.norm(entry.embedding) or 1.0) * query_norm))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            logger.info(f"Answer cache: near-duplicate question (similarity {best_score:.3f}).")
+            return self._entries[best_key].answer
+
+    def lookup(self, collection: str, question: str) -> Optional[str]:
+        """
+        Return the cached answer for a question, or None.
+        """
+        normalized = self.normalize(question)
+        answer = self._lookup_exact((collection, normalized))
+        if answer is None and self.semantic_enabled:
+            answer = self._lookup_similar(collection, normalized)
+        if answer is None:
+            self.misses += 1
+        return answer
+
+    async def alookup(self, collection: str, question: str) -> Optional[str]:
+        """
+        Async variant of lookup. The embedding for near-duplicate matches is computed in a thread
+        so it does not block the event loop.
+        """
+        if self.semantic_enabled:
+            return await asyncio.to_thread(self.lookup, collection, question)
+        return self.lookup(collection, question)
+
+    def store(self, collection: str, question: str, answer: str, generation: Optional[int] = None):
+        """
+        Cache an answer. With a generation, the answer is dropped if the collection was invalidated since.
+        """
+        normalized = self.normalize(question)
+        embedding = None
+        if self.semantic_enabled and self.embedding_function is not None:
+            embedding = np.asarray(self.embedding_function.embed_query(normalized), dtype=np.float32)
+
+        with self._lock:
+            if generation is not None and self._generation.get(collection, 0) != generation:
+                logger.info(f"Answer cache: dropped answer, collection {collection} changed during generation.")
+                return
+            key = (collection, normalized)
+            self._entries[key] = CachedAnswer(collection, normalized, answer, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def astore(self, collection: str, question: str, answer: str, generation: Optional[int] = None):
+        if self.semantic_enabled:
+            await asyncio.to_thread(self.store, collection, question, answer, generation)
+        else:
+            self.store(collection, question, answer, generation)
+
+    def invalidate(self, collection: str):
+        """
+        Remove all answers of a collection, e.g. after it was re-indexed or deleted.
+        """
+        with self._lock:
+            self._generation[collection] = self._generation.get(collection, 0) + 1
+            keys = [key for key in self._entries if key[0] == collection]
+            for key in keys:
+                del self._entries[key]
+        if keys:
+            logger.info(f"Answer cache: invalidated {len(keys)} answers of collection {collection}.")
+
+    def stats(self) -> dict:
+        requests = self.hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / requests if requests else 0.0,
+        }
+
+
+def replay_answer(answer: str, chunk_size: int = 4) -> Iterator[str]:
+    """
+    Split a cached answer into small pieces (a few words each) so it can be streamed like a live answer.
+    """
+    words = re.findall(r"\S+\s*", answer)
+    for start in range(0, len(words), chunk_size):
+        yield "".join(words[start:start + chunk_size])
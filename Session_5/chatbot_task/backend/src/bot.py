@@ -1,9 +1,20 @@
+import asyncio
+import hashlib
 import json
 import logging
+import math
+import multiprocessing
 import os
+import random
 import re
-from typing import List
-from uuid import uuid4
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from itertools import islice
+from operator import itemgetter
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import chromadb
 from chromadb.api import ClientAPI
@@ -12,18 +23,200 @@ from langchain_chroma import Chroma
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
 from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompt_values import PromptValue
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableSerializable
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.messages import BaseMessageChunk
+from langchain_core.runnables import (Runnable, RunnableConfig, RunnableGenerator, RunnableLambda, RunnablePassthrough,
+                                      RunnableSerializable)
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_ollama import ChatOllama
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.answer_cache import AnswerCache, replay_answer
+from src.bulk_import import parse_pdf
+from src.chunking import ChunkProfile, ChunkProfileStore, Chunker, resolve_profile
+from src.context import ContextAssembler, estimate_tokens
+from src.conversation import ConversationMemory, ConversationTurn, format_turns
+from src.embedding_cache import CachedEmbeddings, create_cached_embeddings
+from src.embedding_engine import EmbeddingEngine, EmbeddingEngineConfig
+from src.flat_store import FlatClient
+from src.ingestion import IngestionJob, JobStatus
+from src.keyword_index import HybridRetriever, KeywordIndex
+from src.llm_pool import ROLE_CHAT, ROLE_QUIZ, LLMEndpoint, LLMPool, LLMUnavailable, is_endpoint_failure, parse_endpoints
+from src.llm_scheduler import LLMOverloaded, LLMScheduler, Priority
+from src.metrics import (CHUNKS_INDEXED, CHUNKS_SKIPPED, INGESTION_STAGE_SECONDS, QUIZ_STAGE_SECONDS, RAG_STAGE_SECONDS, mark,
+                         observe_generation, start_request_timings)
+from src.question_bank import STATUS_OK, QuestionBank, chunk_hash
+from src.quiz_parser import QuizGenerationStats, parse_quiz_output
+from src.summaries import (KIND_CHUNK, KIND_DOCUMENT, HierarchicalRetriever, SummaryIndex, SummaryStatus,
+                           document_summary_id)
 
 logger = logging.getLogger("uvicorn")
 logger.setLevel(logging.INFO)
 
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
+# Chunk Profil für Collections ohne eigenes Profil (retrieval, quiz oder large), optional mit
+# abweichender Größe und Überlappung in Tokens
+CHUNK_PROFILE = os.getenv("CHUNK_PROFILE", "retrieval")
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0")) or None
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "-1"))
+DEFAULT_CHUNK_PROFILE = resolve_profile(CHUNK_PROFILE, max_tokens=CHUNK_MAX_TOKENS,
+                                        overlap_tokens=CHUNK_OVERLAP_TOKENS if CHUNK_OVERLAP_TOKENS >= 0 else None)
+# Anzahl Chunks, die pro Embedding-/Schreibvorgang verarbeitet werden
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "64"))
+# PDFs seitenweise laden und chunken statt komplett in den Speicher zu laden
+INDEX_STREAMING = os.getenv("INDEX_STREAMING", "1") == "1"
+# Anzahl Prozesse, die beim Bulk Import PDFs parallel parsen und chunken
+IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+# Maximale Anzahl paralleler LLM Aufrufe bei der Generierung von Fragen
+QUIZ_CONCURRENCY = int(os.getenv("QUIZ_CONCURRENCY", "2"))
+
+# LLM Endpunkte: entweder ein Ollama Server (OLLAMA_BASE_URL) mit optional kleinerem Modell für das Quiz,
+# oder eine JSON Liste mehrerer Endpunkte in LLM_ENDPOINTS
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
+MODEL_NAME = os.getenv("MODEL_NAME", "llama3.2")
+QUIZ_MODEL_NAME = os.getenv("QUIZ_MODEL_NAME", MODEL_NAME)
+LLM_ENDPOINTS = os.getenv("LLM_ENDPOINTS", "")
+# Parallele Anfragen pro Endpunkt, falls in LLM_ENDPOINTS nicht angegeben
+LLM_ENDPOINT_MAX_IN_FLIGHT = int(os.getenv("LLM_ENDPOINT_MAX_IN_FLIGHT", "2"))
+# Sekunden, nach denen ein nicht erreichbarer Endpunkt (auch ohne Health Check) erneut versucht wird
+LLM_ENDPOINT_RETRY_AFTER = float(os.getenv("LLM_ENDPOINT_RETRY_AFTER", "30"))
+
+# Zulassungskontrolle für die LLM Endpunkte: maximale Anzahl paralleler LLM Anfragen (0 = Summe der
+# Endpunkt Limits), davon höchstens LLM_BATCH_MAX_IN_FLIGHT für Batch Jobs (0 = automatisch)
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "0"))
+LLM_BATCH_MAX_IN_FLIGHT = int(os.getenv("LLM_BATCH_MAX_IN_FLIGHT", "0"))
+# Maximale Anzahl wartender Anfragen und Wartezeit in Sekunden pro Priorität (0 = unbegrenzt)
+LLM_MAX_QUEUED_INTERACTIVE = int(os.getenv("LLM_MAX_QUEUED_INTERACTIVE", "32"))
+LLM_MAX_QUEUED_BATCH = int(os.getenv("LLM_MAX_QUEUED_BATCH", "256"))
+LLM_QUEUE_TIMEOUT_INTERACTIVE = float(os.getenv("LLM_QUEUE_TIMEOUT_INTERACTIVE", "30"))
+LLM_QUEUE_TIMEOUT_BATCH = float(os.getenv("LLM_QUEUE_TIMEOUT_BATCH", "0"))
+
+# "hybrid": Vektorsuche + BM25 Schlüsselwortsuche, "vector": nur Vektorsuche
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Anzahl Chunks im Kontext und Anzahl Kandidaten je Suchverfahren vor der Fusion
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+
+# "http": Chroma Server, "persistent": eingebettetes Chroma im Backend Prozess, "flat": NumPy Index ohne HNSW
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "http")
+# HNSW Parameter neuer Collections. Chroma übernimmt alle drei nur beim Anlegen in den Index
+HNSW_SETTINGS = {
+    key: int(os.environ[env])
+    for key, env in (("hnsw:M", "HNSW_M"), ("hnsw:construction_ef", "HNSW_EF_CONSTRUCTION"), ("hnsw:search_ef", "HNSW_EF_SEARCH"))
+    if os.getenv(env)
+}
+
+# Zusammenfassungen aller Chunks und Dokumente nach jeder Indexierung im Hintergrund erzeugen
+SUMMARIES = os.getenv("SUMMARIES", "0") == "1"
+# Suche über die Zusammenfassungen, sobald alle Chunks einer Collection eine Zusammenfassung haben
+SUMMARY_RETRIEVAL = os.getenv("SUMMARY_RETRIEVAL", "1" if SUMMARIES else "0") == "1"
+# Anzahl der besten Treffer, die als vollständiger Chunk statt als Zusammenfassung in den Kontext kommen
+SUMMARY_EXPAND_K = int(os.getenv("SUMMARY_EXPAND_K", "2"))
+# Maximale Kosinus-Distanz einer Dokument-Zusammenfassung zu einer Überblicksfrage
+SUMMARY_DOCUMENT_MAX_DISTANCE = float(os.getenv("SUMMARY_DOCUMENT_MAX_DISTANCE", "0.8"))
+# Länge einer Chunk-Zusammenfassung und Eingabebudget der Dokument-Zusammenfassung
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "50"))
+SUMMARY_DOCUMENT_INPUT_TOKENS = int(os.getenv("SUMMARY_DOCUMENT_INPUT_TOKENS", "3000"))
+# Maximale Anzahl paralleler LLM Aufrufe pro Zusammenfassungs-Lauf
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "2"))
+
+# Token Budgets des Gesprächsverlaufs im Websocket Session Modus
+CONVERSATION_HISTORY_TOKENS = int(os.getenv("CONVERSATION_HISTORY_TOKENS", "1000"))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "300"))
+# Folgefragen vor der Suche in eigenständige Suchanfragen umschreiben
+CONVERSATION_REWRITE = os.getenv("CONVERSATION_REWRITE", "1") == "1"
+
+REWRITE_PROMPT = """
+        Formuliere die letzte Frage des Nutzers so um, dass sie ohne den Gesprächsverlauf verständlich ist und als Suchanfrage
+        in den Unterlagen verwendet werden kann. Ersetze Pronomen und Bezüge durch die gemeinten Begriffe.
+        Gib nur die umformulierte Frage aus, ohne Erklärung. Ist die Frage bereits eigenständig, gib sie unverändert aus.
+        Gesprächsverlauf:
+        {history}
+        Letzte Frage:
+        {question}"""
+
+SUMMARY_PROMPT = """
+        Fasse das folgende Gespräch zwischen Nutzer und Assistent in höchstens {max_words} Wörtern zusammen.
+        Behalte die besprochenen Themen, Begriffe und wichtigen Fakten, lass Höflichkeiten weg.
+        Bisherige Zusammenfassung:
+        {summary}
+        Neue Gesprächsabschnitte:
+        {turns}"""
+
+CHUNK_SUMMARY_PROMPT = """
+        Fasse den folgenden Abschnitt aus Vorlesungsunterlagen in höchstens {max_words} Wörtern zusammen.
+        Nenne die wichtigsten Begriffe, Definitionen und Aussagen, damit der Abschnitt über die Zusammenfassung
+        gefunden werden kann. Gib nur die Zusammenfassung aus.
+        Überschrift: {heading}
+        Abschnitt:
+        {text}"""
+
+DOCUMENT_SUMMARY_PROMPT = """
+        Im Folgenden stehen die Zusammenfassungen aller Abschnitte des Dokuments {source} in ihrer Reihenfolge.
+        Beschreibe in höchstens {max_words} Wörtern, worum es in dem Dokument geht: Thema, Aufbau und die wichtigsten Inhalte.
+        Gib nur die Beschreibung aus.
+        Zusammenfassungen:
+        {summaries}"""
+
 # TODO: Implement the functions of the CustomChatBot Class. Use the knowledge and code from Session_4
 
+# "json": Ollama JSON Modus mit Validierung, "text": Freitext-Format "Frage: ... A) ..."
+QUIZ_OUTPUT_MODE = os.getenv("QUIZ_OUTPUT_MODE", "json")
+
+QUIZ_TEXT_PROMPT = """
+        Du bist ein Assistent, der Fragen und Single-Choice-Antworten basierend auf einem gegebenen Text erstellt.
+        Struktur:
+        1. Generiere eine Frage, die den Inhalt des Texts testet.
+        2. Gib drei mögliche Antworten (A, B, C), wobei nur eine korrekt ist.
+        3. Gib nur den Buchstaben der korrekten Antwort aus, z.B. A.
+        4. Erklärung: Warum die korrekte Antwort richtig ist (kurz und prägnant).
+        
+        Befolge das folgende Format exakt wie geschrieben, verwende keine zusätzliche Formatierung. 
+
+        Format:
+        Frage: [Deine generierte Frage]
+        A) [Antwort 1]
+        B) [Antwort 2]
+        C) [Antwort 3]
+        Korrekte Antwort: [hier nur den Buchstaben der korrekten Antwort einfügen]
+        Erklärung: [Erklärung hier]
+
+        Hier ist der gegebene Text:
+        {context}
+        """
+
+QUIZ_JSON_PROMPT = """
+        Du bist ein Assistent, der Fragen und Single-Choice-Antworten basierend auf einem gegebenen Text erstellt.
+        Struktur:
+        1. Generiere eine Frage, die den Inhalt des Texts testet.
+        2. Gib drei mögliche Antworten (A, B, C), wobei nur eine korrekt ist.
+        3. Gib nur den Buchstaben der korrekten Antwort aus, z.B. A.
+        4. Erklärung: Warum die korrekte Antwort richtig ist (kurz und prägnant).
+
+        Antworte ausschließlich mit einem JSON Objekt nach diesem Schema:
+        {{"Frage": "...", "Antworten": {{"A": "...", "B": "...", "C": "..."}}, "Korrekte_Antwort": "A", "Erklärung": "..."}}
+
+        Hier ist der gegebene Text:
+        {context}
+        """
+
+
+class CollectionNotFound(ValueError):
+    """
+    Raised when a request selects a collection that does not exist. Collections are only created by indexing.
+    """
+
+
+@dataclass
+class CollectionHandle:
+    """
+    Chroma handle and RAG chain of a single collection.
+    """
+    vector_db: Chroma
+    qa_rag_chain: RunnableSerializable
+
 
 class CustomChatBot:
     """
@@ -38,65 +231,304 @@ class CustomChatBot:
     def __init__(self) -> None:
         """
         Initialize the CustomChatBot class by setting up the ChromaDB client for document retrieval
-        and the ChatOllama language model for answer generation.
+        and the pool of ChatOllama language models for answer generation.
         """
-        # Initialize the embedding function for document retrieval
-        self.embedding_function = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-mpnet-base-v2", cache_folder="/embedding_model")
+        # Initialisierungsdauer pro Komponente in Sekunden
+        self.init_times: Dict[str, float] = {}
 
-        # Initialize the ChromaDB client
-        self.client = self._initialize_chroma_client()
+        # The embedding model, the ChromaDB client and the optional reranker are independent of each
+        # other and are initialized in parallel, so the slowest component determines the startup time
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="chatbot-init") as executor:
+            embedding_future = executor.submit(self._timed_init, "embedding_function", self._initialize_embedding_function)
+            client_future = executor.submit(self._timed_init, "chroma_client", self._initialize_chroma_client)
+            reranker_future = executor.submit(self._timed_init, "reranker", self._initialize_reranker)
 
-        # Get or create the document collection in ChromaDB
-        self.vector_db = self._initialize_vector_db()
+            # Initialize the store for generated quiz questions
+            self.question_bank = self._timed_init(
+                "question_bank", QuestionBank, os.getenv("QUESTION_BANK_PATH", "question_bank/questions.sqlite"))
 
-        # Initialize the document retriever
-        self.retriever = self.vector_db.as_retriever()
+            # Initialize the keyword index for hybrid retrieval
+            self.keyword_index = self._timed_init(
+                "keyword_index", KeywordIndex, os.getenv("KEYWORD_INDEX_PATH", "keyword_index/index.sqlite"))
 
-        # Initialize the large language model (LLM) from Ollama
-        self.llm = ChatOllama(model="llama3.2", base_url="http://ollama:11434")
+            # Initialize the store of the chunk profile per collection
+            self.chunk_profiles = self._timed_init(
+                "chunk_profiles", ChunkProfileStore, os.getenv("CHUNK_PROFILE_PATH", "chunk_profiles/profiles.sqlite"))
 
-        # Set up the retrieval-augmented generation (RAG) pipeline
-        self.qa_rag_chain = self._initialize_qa_rag_chain()
+            # Initialize the index of the chunk and document summaries for hierarchical retrieval
+            self.summary_index = self._timed_init(
+                "summary_index", SummaryIndex, os.getenv("SUMMARY_STORE_PATH", "summary_store"))
 
-    def _initialize_chroma_client(self) -> ClientAPI:
+            self.embedding_function = embedding_future.result()
+            self.client = client_future.result()
+            self.reranker = reranker_future.result()
+
+        # Initialize the cache for generated answers
+        self.answer_cache = self._initialize_answer_cache()
+
+        # Initialize the context assembly with a token budget for the prompt
+        self.context_assembler = self._initialize_context_assembler()
+
+        # Initialize the pool of large language model (LLM) endpoints from Ollama
+        self.llm_pool = self._initialize_llm_pool()
+        self.quiz_stats = QuizGenerationStats()
+
+        # Scheduler for all LLM requests, so quiz generation cannot starve the chat
+        self.llm_scheduler = self._initialize_llm_scheduler()
+
+        # Background summary passes per collection
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+        self._summary_status: Dict[str, SummaryStatus] = {}
+
+        # Pool of Chroma handles and RAG chains per collection, so requests for different
+        # collections can be served in parallel without rebuilding the chain
+        self._collection_pool: "OrderedDict[str, CollectionHandle]" = OrderedDict()
+        self._collection_pool_lock = threading.Lock()
+        self._collection_pool_size = int(os.getenv("COLLECTION_POOL_SIZE", "16"))
+
+        # Default collection for requests that do not name a collection
+        self.current_collection = "Collection"
+        self._get_or_create_collection(self.current_collection)
+        self._timed_init("default_collection", self._get_collection_handle, self.current_collection)
+
+    def _timed_init(self, component: str, initialize: Callable[..., Any], *args: Any) -> Any:
+        start = time.perf_counter()
+        result = initialize(*args)
+        self.init_times[component] = round(time.perf_counter() - start, 3)
+        logger.info(f"Initialized {component} in {self.init_times[component]:.2f}s.")
+        return result
+
+    def warm_up(self) -> Dict[str, Optional[str]]:
         """
-        Initialize and return a ChromaDB HTTP client for document retrieval.
+        Send one embedding request and one request per LLM endpoint, so the models are loaded before the first user request
+        (Ollama loads the model lazily on the first call).
 
         Returns:
-            chromadb.HttpClient: A client used to communicate with ChromaDB.
+            Dict[str, Optional[str]]: Error message per warm-up step, None if the step succeeded.
+        """
+        embedding_function = self.embedding_function
+        # Am Embedding Cache vorbei, sonst wird das Modell nach dem ersten Start nie aufgerufen
+        if isinstance(embedding_function, CachedEmbeddings):
+            embedding_function = embedding_function.embeddings
+        steps = {"warmup_embedding": lambda: embedding_function.embed_query("Warm-up")}
+        for endpoint in self.llm_pool.endpoints:
+            steps[f"warmup_llm_{endpoint.name}"] = lambda llm=endpoint.llm: llm.invoke("Antworte nur mit OK.")
+        errors = {}
+        for step, call in steps.items():
+            try:
+                self._timed_init(step, call)
+                errors[step] = None
+            except Exception as e:
+                logger.warning(f"Warm-up step {step} failed: {e}")
+                errors[step] = str(e)
+        return errors
+
+    def _initialize_llm_pool(self) -> LLMPool:
         """
-        logger.info("Initialize chroma db client.")
+        Create the LLM endpoints from LLM_ENDPOINTS, or a single Ollama server with the chat model
+        (and the quiz model, if QUIZ_MODEL_NAME differs).
+        """
+        if LLM_ENDPOINTS:
+            endpoints = parse_endpoints(LLM_ENDPOINTS, LLM_ENDPOINT_MAX_IN_FLIGHT)
+        elif QUIZ_MODEL_NAME != MODEL_NAME:
+            endpoints = [
+                LLMEndpoint.ollama(OLLAMA_BASE_URL, MODEL_NAME, roles=[ROLE_CHAT], max_in_flight=LLM_ENDPOINT_MAX_IN_FLIGHT),
+                LLMEndpoint.ollama(OLLAMA_BASE_URL, QUIZ_MODEL_NAME, roles=[ROLE_QUIZ], max_in_flight=LLM_ENDPOINT_MAX_IN_FLIGHT),
+            ]
+        else:
+            endpoints = [LLMEndpoint.ollama(OLLAMA_BASE_URL, MODEL_NAME, max_in_flight=LLM_ENDPOINT_MAX_IN_FLIGHT)]
+        for endpoint in endpoints:
+            logger.info(f"LLM endpoint {endpoint.name}: roles {endpoint.roles}, {endpoint.max_in_flight} parallel requests.")
+        return LLMPool(endpoints, retry_after=LLM_ENDPOINT_RETRY_AFTER)
+
+    def _initialize_llm_scheduler(self) -> LLMScheduler:
+        """
+        Create the scheduler with limits derived from the endpoint pool, unless they are configured.
+        """
+        max_in_flight = LLM_MAX_IN_FLIGHT or self.llm_pool.capacity()
+        batch_max_in_flight = LLM_BATCH_MAX_IN_FLIGHT or self.llm_pool.capacity(ROLE_QUIZ)
+        if not LLM_BATCH_MAX_IN_FLIGHT and self.llm_pool.shares_endpoints(ROLE_QUIZ, ROLE_CHAT):
+            # Auf gemeinsam genutzten Endpunkten einen Platz für den Chat freihalten
+            batch_max_in_flight = min(batch_max_in_flight, max_in_flight - 1)
+        return LLMScheduler(
+            max_in_flight=max_in_flight,
+            batch_max_in_flight=max(1, batch_max_in_flight),
+            max_queued={Priority.INTERACTIVE: LLM_MAX_QUEUED_INTERACTIVE, Priority.BATCH: LLM_MAX_QUEUED_BATCH},
+            queue_timeout={Priority.INTERACTIVE: LLM_QUEUE_TIMEOUT_INTERACTIVE, Priority.BATCH: LLM_QUEUE_TIMEOUT_BATCH},
+        )
+
+    def _initialize_embedding_function(self) -> Embeddings:
+        """
+        Initialize the embedding model, wrapped with a persistent embedding cache unless EMBEDDING_CACHE is set to 0.
+
+        EMBEDDING_BACKEND selects the default HuggingFaceEmbeddings ("huggingface") or the bulk
+        EmbeddingEngine with the "torch" or "onnx" backend.
+
+        Returns:
+            Embeddings: The embedding function used for indexing and retrieval.
+        """
+        logger.info("Initialize embedding function.")
+        backend = os.getenv("EMBEDDING_BACKEND", "huggingface")
+        if backend == "huggingface":
+            embedding_function = HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL_NAME, cache_folder="/embedding_model")
+            encoder_name = EMBEDDING_MODEL_NAME
+        else:
+            config = EmbeddingEngineConfig.from_env(EMBEDDING_MODEL_NAME, cache_folder="/embedding_model")
+            embedding_function = EmbeddingEngine(config)
+            encoder_name = config.encoder_name
+
+        if os.getenv("EMBEDDING_CACHE", "1") != "1":
+            return embedding_function
+        # Backend und Quantisierung gehören zum Schlüssel, sonst teilen sich int8 und fp32 Vektoren die Einträge
+        return create_cached_embeddings(embedding_function, model_name=encoder_name)
+
+    def get_embedding_cache_stats(self) -> Optional[dict]:
+        if isinstance(self.embedding_function, CachedEmbeddings):
+            return self.embedding_function.stats()
+        return None
+
+    def get_embedding_engine_stats(self) -> Optional[dict]:
+        embedding_function = self.embedding_function
+        if isinstance(embedding_function, CachedEmbeddings):
+            embedding_function = embedding_function.embeddings
+        if isinstance(embedding_function, EmbeddingEngine):
+            return embedding_function.stats()
+        return None
+
+    def _initialize_answer_cache(self) -> Optional[AnswerCache]:
+        """
+        Initialize the answer cache in front of the RAG chain unless ANSWER_CACHE is set to 0.
+
+        Returns:
+            Optional[AnswerCache]: The answer cache or None if it is disabled.
+        """
+        if os.getenv("ANSWER_CACHE", "1") != "1":
+            return None
+        return AnswerCache(
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+            similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")),
+            embedding_function=self.embedding_function,
+        )
+
+    def _initialize_reranker(self):
+        """
+        Load the cross-encoder configured in RERANK_MODEL, if any.
+        """
+        model_name = os.getenv("RERANK_MODEL")
+        if not model_name or RETRIEVAL_MODE != "hybrid":
+            return None
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Initialize reranker {model_name}.")
+        return CrossEncoder(model_name)
+
+    def _initialize_context_assembler(self) -> Optional[ContextAssembler]:
+        """
+        Initialize the context assembly unless CONTEXT_MAX_TOKENS is set to 0.
+        """
+        max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+        if max_tokens <= 0:
+            return None
+        return ContextAssembler(
+            max_tokens=max_tokens,
+            duplicate_threshold=float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8")),
+            extract_sentences=os.getenv("CONTEXT_EXTRACT_SENTENCES", "0") == "1",
+        )
+
+    def _initialize_chroma_client(self) -> Union[ClientAPI, FlatClient]:
+        """
+        Initialize and return the vector store client selected by VECTOR_STORE_MODE.
+
+        Returns:
+            Union[ClientAPI, FlatClient]: A ChromaDB HTTP client, an embedded ChromaDB client or a FlatClient.
+        """
+        logger.info(f"Initialize chroma db client (mode: {VECTOR_STORE_MODE}).")
+        settings = Settings(allow_reset=True, anonymized_telemetry=False)
+
+        if VECTOR_STORE_MODE == "persistent":
+            return chromadb.PersistentClient(
+                path=os.getenv("CHROMA_PATH", "chroma_data"),
+                settings=settings,
+                tenant=DEFAULT_TENANT,
+                database=DEFAULT_DATABASE,
+            )
+        if VECTOR_STORE_MODE == "flat":
+            return FlatClient(os.getenv("FLAT_STORE_PATH", "flat_store"))
+        if VECTOR_STORE_MODE != "http":
+            raise ValueError(f"Unbekannter VECTOR_STORE_MODE: {VECTOR_STORE_MODE}")
+
         client = chromadb.HttpClient(
-            host="chroma",
-            port=8000,
+            host=os.getenv("CHROMA_HOST", "chroma"),
+            port=int(os.getenv("CHROMA_PORT", "8000")),
             ssl=False,
             headers=None,
-            settings=Settings(allow_reset=True, anonymized_telemetry=False),
+            settings=settings,
             tenant=DEFAULT_TENANT,
             database=DEFAULT_DATABASE,
         )
 
         return client
 
-    def _initialize_vector_db(self) -> Chroma:
+    def _get_or_create_collection(self, collection: str):
         """
-        Initialize and return a Chroma vector database using the HTTP client.
+        Get or create a collection of the vector store. New collections get the configured HNSW settings.
+        """
+        # Metadaten bestehender Collections nicht überschreiben, der Index behält ohnehin seine Parameter
+        if not HNSW_SETTINGS or collection in self.get_vector_db_collections():
+            return self.client.get_or_create_collection(collection)
+        return self.client.get_or_create_collection(collection, metadata=HNSW_SETTINGS)
+
+    @property
+    def vector_db(self) -> Chroma:
+        """
+        Vector db of the default collection.
+        """
+        return self._get_collection_handle(self.current_collection).vector_db
+
+    @property
+    def qa_rag_chain(self) -> RunnableSerializable:
+        """
+        RAG chain of the default collection.
+        """
+        return self._get_collection_handle(self.current_collection).qa_rag_chain
+
+    def _get_collection_handle(self, collection: str) -> "CollectionHandle":
+        """
+        Return the Chroma handle and RAG chain of a collection from the pool, creating them on first use.
+
+        Args:
+            collection (str): Name of the (already validated) collection.
 
         Returns:
-            Chroma: A vector database instance connected to the document collection in ChromaDB.
+            CollectionHandle: The pooled vector db and RAG chain of the collection.
+
+        Raises:
+            CollectionNotFound: If the collection does not exist.
         """
-        logger.info("Initialize chroma vector db.")
+        with self._collection_pool_lock:
+            handle = self._collection_pool.get(collection)
+            if handle is not None:
+                self._collection_pool.move_to_end(collection)
+                return handle
 
-        collection_name = "Collection"
-        collection = self.client.get_or_create_collection(collection_name)
+        logger.info(f"Initialize chroma vector db and RAG chain for collection {collection}.")
+        vector_db = self._create_vector_db(collection)
+        handle = CollectionHandle(vector_db=vector_db, qa_rag_chain=self._initialize_qa_rag_chain(vector_db))
 
-        vector_db_from_client = Chroma(
-            client=self.client,
-            collection_name=collection_name,
-            embedding_function=self.embedding_function
-        )
-        return vector_db_from_client
+        with self._collection_pool_lock:
+            # Falls parallel bereits ein Handle erzeugt wurde, dieses weiterverwenden
+            handle = self._collection_pool.setdefault(collection, handle)
+            self._collection_pool.move_to_end(collection)
+            while len(self._collection_pool) > self._collection_pool_size:
+                self._collection_pool.popitem(last=False)
+        return handle
+
+    def _resolve_collection_name(self, collection: Optional[str]) -> str:
+        if collection:
+            return self._validate_and_adjust_collection_name(collection)
+        return self.current_collection
 
     # Collection Name anpassen falls ungültige Zeichen enthalten sind
     def _validate_and_adjust_collection_name(self, name: str) -> str:
@@ -113,41 +545,110 @@ class CustomChatBot:
             adjusted_name = adjusted_name[:63]
         return adjusted_name
 
-    def set_vector_db_collection(self, collection: str):
-
-        adjusted_collection_name = self._validate_and_adjust_collection_name(
-            collection)
-        logger.info(f"Setting new collection: {adjusted_collection_name}")
+    def _ensure_collection_exists(self, collection: str):
+        """
+        Raise CollectionNotFound if the (already validated) collection does not exist.
+        """
+        # Über die Namen prüfen, da der HTTP Client fehlende Collections nicht als ValueError meldet
+        if collection not in self.get_vector_db_collections():
+            raise CollectionNotFound(f"Collection {collection} existiert nicht")
 
-        self.client.get_or_create_collection(adjusted_collection_name)
+    def _create_vector_db(self, collection: str) -> Chroma:
+        """
+        Create a Chroma vector db handle for the given (already validated) collection name.
+        """
+        # Chroma legt unbekannte Collections selbst an, daher vorher prüfen
+        self._ensure_collection_exists(collection)
 
-        vector_db_from_client = Chroma(
+        return Chroma(
             client=self.client,
-            collection_name=adjusted_collection_name,
-            embedding_function=self.embedding_function
+            collection_name=collection,
+            embedding_function=self.embedding_function,
         )
 
-        self.vector_db = vector_db_from_client
+    def set_vector_db_collection(self, collection: str):
+        """
+        Set the default collection used by requests that do not name a collection.
+        """
+        adjusted_collection_name = self._validate_and_adjust_collection_name(
+            collection)
+        logger.info(f"Setting new default collection: {adjusted_collection_name}")
 
-        # RAG Chain neu initialisieren mit neuer Vector DB
-        self.qa_rag_chain = self._initialize_qa_rag_chain()
+        self._get_collection_handle(adjusted_collection_name)
+        self.current_collection = adjusted_collection_name
 
     def get_current_collection(self):
-        collection = self.vector_db._collection_name
-
-        # Andere Collection auswählen, da die aktuelle gelöscht wurde
-        new_collection = self.get_vector_db_collections()[0]
-        self.set_vector_db_collection(new_collection)
-        return collection
+        return self.current_collection
 
     def delete_collection(self, collection: str):
         try:
             self.client.delete_collection(name=collection)
+            with self._collection_pool_lock:
+                self._collection_pool.pop(collection, None)
+            if self.answer_cache:
+                self.answer_cache.invalidate(collection)
+            self.question_bank.delete_collection(collection)
+            self.keyword_index.delete_collection(collection)
+            self.chunk_profiles.delete(collection)
+            self.summary_index.delete_collection(collection)
+
+            # Andere Collection als Standard auswählen, da die aktuelle gelöscht wurde
+            if collection == self.current_collection:
+                remaining = self.get_vector_db_collections()
+                if not remaining:
+                    self._get_or_create_collection("Collection")
+                self.set_vector_db_collection(remaining[0] if remaining else "Collection")
             return f"Collection {collection} gelöscht"
         except Exception as e:
             logger.info("Collection existiert nicht")
             return f"Collection {collection} konnte nicht gelöscht werden: {e}"
 
+    def list_documents(self, collection_name: str) -> List[dict]:
+        """
+        List the documents (source files) of a collection with their number of chunks and pages.
+
+        Raises:
+            CollectionNotFound: If the collection does not exist.
+        """
+        collection_name = self._validate_and_adjust_collection_name(collection_name)
+        self._ensure_collection_exists(collection_name)
+        collection = self.client.get_collection(collection_name)
+        metadatas = collection.get(include=["metadatas"])["metadatas"] or []
+
+        documents = {}
+        for metadata in metadatas:
+            metadata = metadata or {}
+            source = metadata.get("source", "unbekannt")
+            document = documents.setdefault(source, {"source": source, "chunks": 0, "pages": set()})
+            document["chunks"] += 1
+            if "page" in metadata:
+                document["pages"].add(metadata["page"])
+        return [{**document, "pages": len(document["pages"])} for document in documents.values()]
+
+    def delete_document(self, collection_name: str, source: str) -> int:
+        """
+        Remove all chunks of a single document from a collection.
+
+        Returns:
+            int: Number of removed chunks.
+
+        Raises:
+            CollectionNotFound: If the collection does not exist.
+        """
+        collection_name = self._validate_and_adjust_collection_name(collection_name)
+        self._ensure_collection_exists(collection_name)
+        collection = self.client.get_collection(collection_name)
+        ids = collection.get(where={"source": source}, include=[])["ids"]
+        if ids:
+            collection.delete(ids=ids)
+            self.keyword_index.delete(collection_name, ids)
+            self.summary_index.delete(collection_name, where={"source": source})
+            self.summary_index.invalidate(collection_name)
+            if self.answer_cache:
+                self.answer_cache.invalidate(collection_name)
+        logger.info(f"Removed {len(ids)} chunks of {source} from {collection_name}.")
+        return len(ids)
+
     def get_vector_db_collections(self):
         collections = self.client.list_collections()
         collection_names = [collection.name for collection in collections]
@@ -161,116 +662,658 @@ class CustomChatBot:
         # text = re.sub(r'[^\x00-\x7F]+', '', text)
         return Document(page_content=text, metadata=chunk.metadata)
 
-    def index_file_to_vector_db(self, path: str):
+    def get_chunk_profile(self, collection_name: str) -> ChunkProfile:
+        """
+        Chunk profile of a collection, the default profile (CHUNK_PROFILE) if none was set.
+        """
+        return self.chunk_profiles.get(collection_name) or DEFAULT_CHUNK_PROFILE
+
+    def set_chunk_profile(self, collection_name: str, profile: ChunkProfile):
+        """
+        Store the chunk profile of a collection. It is used for all documents indexed afterwards,
+        already indexed documents keep their chunks until they are indexed again.
+        """
+        self.chunk_profiles.set(collection_name, profile)
+        logger.info(f"Chunk profile of {collection_name}: {profile.model_dump()}")
+
+    def _iter_chunks(self, path: str, streaming: bool, job: Optional[IngestionJob] = None,
+                     profile: ChunkProfile = DEFAULT_CHUNK_PROFILE) -> Iterator[Document]:
+        """
+        Yield cleaned chunks of a PDF file.
+
+        In streaming mode the pages are loaded lazily and chunked one by one, so only the current
+        page and chunk are held in memory. Otherwise the whole file is loaded and split at once.
+
+        Args:
+            path (str): Path of the PDF file.
+            streaming (bool): Load and split the file page by page.
+            job (Optional[IngestionJob]): Background job used to report progress.
+            profile (ChunkProfile): Chunk sizes and structure rules.
+
+        Yields:
+            Document: The cleaned chunks.
+        """
         loader = PyPDFLoader(file_path=path)
-        pages = loader.load()
-        pages_chunked = RecursiveCharacterTextSplitter(
-            chunk_size=3000,
-            chunk_overlap=300
-        ).split_documents(pages)
-        pages_chunked_cleaned = [self._clean_document_text(
-            chunk) for chunk in pages_chunked]
+        chunker = Chunker(profile)
+
+        def counted(pages: Iterable[Document]) -> Iterator[Document]:
+            for page in pages:
+                if job:
+                    job.progress.pages_parsed += 1
+                yield page
 
-        uuids = [str(uuid4()) for _ in range(len(pages_chunked_cleaned))]
-        self.vector_db.add_documents(documents=pages_chunked_cleaned, id=uuids)
+        pages = loader.lazy_load() if streaming else loader.load()
+        for chunk in chunker.split(counted(pages)):
+            chunk.metadata["chunk_profile"] = profile.name
+            yield self._clean_document_text(chunk)
 
-    def _qa_generation_chain(self, chunk: str):
+    def index_file_to_vector_db(self, path: str, collection_name: Optional[str] = None, job: Optional[IngestionJob] = None,
+                                streaming: Optional[bool] = None):
         """
-        Pipeline um Fragen auf Chunk eines Embeddings zu generieren. Frage muss richtig formatiert werden für die Auswertung
+        Load a PDF, split it into chunks, embed the chunks and write them to a collection.
+
+        Chunks are embedded and written in batches of INDEX_BATCH_SIZE, so memory usage is bounded
+        by the batch size (and a single page in streaming mode) instead of the document size.
+
+        Args:
+            path (str): Path of the PDF file.
+            collection_name (Optional[str]): Target collection. Defaults to the current collection.
+            job (Optional[IngestionJob]): Background job used to report progress and to check for cancellation.
+            streaming (Optional[bool]): Load the PDF page by page. Defaults to INDEX_STREAMING.
         """
-        promt_template = """
-        Du bist ein Assistent, der Fragen und Single-Choice-Antworten basierend auf einem gegebenen Text erstellt.
-        Struktur:
-        1. Generiere eine Frage, die den Inhalt des Texts testet.
-        2. Gib drei mögliche Antworten (A, B, C), wobei nur eine korrekt ist.
-        3. Gib nur den Buchstaben der korrekten Antwort aus, z.B. A.
-        4. Erklärung: Warum die korrekte Antwort richtig ist (kurz und prägnant).
-        
-        Befolge das folgende Format exakt wie geschrieben, verwende keine zusätzliche Formatierung. 
+        collection_name = self._resolve_collection_name(collection_name)
+        collection = self._get_or_create_collection(collection_name)
+        if streaming is None:
+            streaming = INDEX_STREAMING
 
-        Format:
-        Frage: [Deine generierte Frage]
-        A) [Antwort 1]
-        B) [Antwort 2]
-        C) [Antwort 3]
-        Korrekte Antwort: [hier nur den Buchstaben der korrekten Antwort einfügen]
-        Erklärung: [Erklärung hier]
+        index_start = time.perf_counter()
+        source = os.path.basename(path)
+        profile = self.get_chunk_profile(collection_name)
+        chunks = self._iter_chunks(path, streaming=streaming, job=job, profile=profile)
+        seen_ids = set()
+        written = 0
+        skipped = 0
+        embed_seconds = 0.0
 
-        Hier ist der gegebene Text:
-        {context}
+        # In Batches embedden und schreiben, damit Fortschritt und Abbruch möglich sind
+        while True:
+            if job:
+                job.check_cancelled()
+            with INGESTION_STAGE_SECONDS.labels("parse").time():
+                batch = list(islice(chunks, INDEX_BATCH_SIZE))
+            if not batch:
+                break
+
+            entries = self._identify_chunks(collection_name, source, batch, seen_ids)
+            batch_written, batch_skipped, batch_seconds = self._write_batch(
+                entries, {collection_name: collection}, job, duplicates=len(batch) - len(entries))
+            written += batch_written
+            skipped += batch_skipped
+            embed_seconds += batch_seconds
+
+        stale_ids = self._remove_stale_chunks(collection_name, collection, source, seen_ids)
+        self._invalidate_after_indexing(collection_name, changed=bool(written or stale_ids))
+
+        INGESTION_STAGE_SECONDS.labels("total").observe(time.perf_counter() - index_start)
+        throughput = written / embed_seconds if embed_seconds > 0 else 0.0
+        logger.info(f"Indexed {path} into {collection_name} (chunk profile {profile.name}): "
+                    f"{written} new, {skipped} unchanged, {len(stale_ids)} removed chunks "
+                    f"(embedding: {embed_seconds:.2f}s, {throughput:.1f} chunks/s).")
+
+    def _identify_chunks(self, collection_name: str, source: str, docs: List[Document],
+                         seen_ids: set) -> List[Tuple[str, str, Document]]:
+        """
+        Set the source of chunks and derive their ids from the content. Chunks that already occurred in
+        the same file (seen_ids) are dropped.
+
+        Returns:
+            List[Tuple[str, str, Document]]: Collection name, chunk id and chunk of every new chunk.
+        """
+        entries = []
+        for doc in docs:
+            doc.metadata["source"] = source
+            chunk_id = self._chunk_id(source, doc.page_content)
+            if chunk_id not in seen_ids:
+                seen_ids.add(chunk_id)
+                entries.append((collection_name, chunk_id, doc))
+        return entries
+
+    def _write_batch(self, entries: List[Tuple[str, str, Document]], collections: Dict[str, Any],
+                     job: Optional[IngestionJob] = None, duplicates: int = 0) -> Tuple[int, int, float]:
+        """
+        Embed and write a batch of chunks, which may belong to several collections. Chunks that already
+        exist in their collection are skipped, all others are embedded with a single call.
+
+        Args:
+            entries (List[Tuple[str, str, Document]]): Collection name, chunk id and chunk.
+            collections (Dict[str, Any]): Vector store collection per collection name.
+            job (Optional[IngestionJob]): Background job used to report progress.
+            duplicates (int): Chunks of the batch already dropped as duplicates, counted as skipped.
+
+        Returns:
+            Tuple[int, int, float]: Written and skipped chunks and the embedding time in seconds.
+        """
+        by_collection: Dict[str, Dict[str, Document]] = {}
+        for collection_name, chunk_id, doc in entries:
+            by_collection.setdefault(collection_name, {})[chunk_id] = doc
+
+        # Bereits vorhandene (unveränderte) Chunks nicht erneut embedden
+        new_docs: List[Tuple[str, str, Document]] = []
+        with INGESTION_STAGE_SECONDS.labels("dedup_lookup").time():
+            for collection_name, docs in by_collection.items():
+                existing_ids = set(collections[collection_name].get(ids=list(docs), include=[])["ids"])
+                new_docs.extend((collection_name, chunk_id, doc) for chunk_id, doc in docs.items() if chunk_id not in existing_ids)
+        skipped = duplicates + len(entries) - len(new_docs)
+        CHUNKS_SKIPPED.inc(skipped)
+        if job:
+            job.progress.chunks_skipped += skipped
+        if not new_docs:
+            return 0, skipped, 0.0
+
+        texts = [doc.page_content for _, _, doc in new_docs]
+        embed_start = time.perf_counter()
+        embeddings = self.embedding_function.embed_documents(texts)
+        embed_seconds = time.perf_counter() - embed_start
+        INGESTION_STAGE_SECONDS.labels("embed").observe(embed_seconds)
+        if job:
+            job.progress.chunks_embedded += len(new_docs)
+            job.progress.embed_seconds += embed_seconds
+
+        with INGESTION_STAGE_SECONDS.labels("write").time():
+            for collection_name in by_collection:
+                positions = [i for i, (name, _, _) in enumerate(new_docs) if name == collection_name]
+                if not positions:
+                    continue
+                ids = [new_docs[i][1] for i in positions]
+                collections[collection_name].upsert(
+                    ids=ids,
+                    embeddings=[embeddings[i] for i in positions],
+                    metadatas=[new_docs[i][2].metadata for i in positions],
+                    documents=[texts[i] for i in positions],
+                )
+                self.keyword_index.add(collection_name, ids, [texts[i] for i in positions])
+        CHUNKS_INDEXED.inc(len(new_docs))
+        if job:
+            job.progress.chunks_written += len(new_docs)
+        return len(new_docs), skipped, embed_seconds
+
+    def _remove_stale_chunks(self, collection_name: str, collection: Any, source: str, seen_ids: set) -> List[str]:
+        """
+        Remove the chunks of a file that no longer occur in its new version.
+        """
+        stale_ids = [chunk_id for chunk_id in collection.get(where={"source": source}, include=[])["ids"]
+                     if chunk_id not in seen_ids]
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+            self.keyword_index.delete(collection_name, stale_ids)
+        return stale_ids
+
+    def _invalidate_after_indexing(self, collection_name: str, changed: bool):
+        # Gecachte Antworten basieren auf dem alten Inhalt der Collection, neue Chunks haben noch keine Zusammenfassung
+        if not changed:
+            return
+        self.summary_index.invalidate(collection_name)
+        if self.answer_cache:
+            self.answer_cache.invalidate(collection_name)
+
+    def import_files(self, files: List[Tuple[str, str]], job: Optional[IngestionJob] = None,
+                     parse_workers: Optional[int] = None) -> List[str]:
+        """
+        Index many PDFs in a single pipeline. The files are parsed and chunked in parallel worker
+        processes, the chunks of all files are embedded in shared batches of INDEX_BATCH_SIZE and
+        written to their collections.
+
+        A file that cannot be parsed is reported in the job progress and skipped, the other files are
+        still indexed.
+
+        Args:
+            files (List[Tuple[str, str]]): Path and (already validated) target collection of every PDF.
+            job (Optional[IngestionJob]): Background job used to report progress and to check for cancellation.
+            parse_workers (Optional[int]): Number of parser processes. Defaults to IMPORT_PARSE_WORKERS.
+
+        Returns:
+            List[str]: The collections whose content changed.
+        """
+        import_start = time.perf_counter()
+        collections = {name: self._get_or_create_collection(name) for name in sorted({name for _, name in files})}
+        profiles = {name: self.get_chunk_profile(name) for name in collections}
+        if job:
+            job.progress.files_total = len(files)
+            job.progress.collections = list(collections)
+
+        seen: Dict[Tuple[str, str], set] = {}
+        pending: List[Tuple[str, str, Document]] = []
+        duplicates = 0
+        changed = set()
+        written = 0
+        embed_seconds = 0.0
+
+        def flush(batch: List[Tuple[str, str, Document]], batch_duplicates: int = 0):
+            nonlocal written, embed_seconds
+            batch_written, _, batch_seconds = self._write_batch(batch, collections, job, duplicates=batch_duplicates)
+            if batch_written:
+                changed.update(name for name, _, _ in batch)
+            written += batch_written
+            embed_seconds += batch_seconds
+
+        # "spawn", da PyPDF und torch nach einem fork in den Kindprozessen hängen bleiben können
+        executor = ProcessPoolExecutor(max_workers=max(1, min(parse_workers or IMPORT_PARSE_WORKERS, len(files))),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        futures = {executor.submit(parse_pdf, path, profiles[name]): (path, name) for path, name in files}
+        try:
+            for future in as_completed(futures):
+                if job:
+                    job.check_cancelled()
+                path, collection_name = futures[future]
+                source = os.path.basename(path)
+                try:
+                    pages, chunks = future.result()
+                except Exception as e:
+                    logger.warning(f"Parsing {path} failed: {e}")
+                    if job:
+                        job.progress.files_failed += 1
+                        job.progress.errors.append({"file": source, "collection_name": collection_name,
+                                                    "error": f"{type(e).__name__}: {e}"})
+                    continue
+
+                chunks = [self._clean_document_text(chunk) for chunk in chunks]
+                for chunk in chunks:
+                    chunk.metadata["chunk_profile"] = profiles[collection_name].name
+                entries = self._identify_chunks(collection_name, source, chunks, seen.setdefault((collection_name, source), set()))
+                pending.extend(entries)
+                duplicates += len(chunks) - len(entries)
+                if job:
+                    job.progress.pages_parsed += pages
+                    job.progress.files_parsed += 1
+
+                # Gemeinsame Batches über Dateigrenzen hinweg embedden
+                while len(pending) >= INDEX_BATCH_SIZE:
+                    flush(pending[:INDEX_BATCH_SIZE], duplicates)
+                    pending, duplicates = pending[INDEX_BATCH_SIZE:], 0
+            if pending or duplicates:
+                flush(pending, duplicates)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for (collection_name, source), seen_ids in seen.items():
+            if self._remove_stale_chunks(collection_name, collections[collection_name], source, seen_ids):
+                changed.add(collection_name)
+        for collection_name in changed:
+            self._invalidate_after_indexing(collection_name, changed=True)
+
+        seconds = time.perf_counter() - import_start
+        INGESTION_STAGE_SECONDS.labels("import_total").observe(seconds)
+        logger.info(f"Imported {len(seen)}/{len(files)} files into {len(collections)} collections: {written} new chunks "
+                    f"in {seconds:.1f}s (embedding: {embed_seconds:.2f}s).")
+        return sorted(changed)
+
+    @staticmethod
+    def _chunk_id(source: str, text: str) -> str:
+        """
+        Content-addressed id of a chunk. The same text of the same source file always gets the same id.
         """
+        return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()
+
+    async def _qa_generation_chain(self, chunk: str):
+        """
+        Pipeline um Fragen auf Chunk eines Embeddings zu generieren. Frage muss richtig formatiert werden für die Auswertung
+
+        Im JSON Modus (QUIZ_OUTPUT_MODE=json) wird Ollama auf JSON Ausgabe beschränkt.
+        """
+        promt_template = QUIZ_JSON_PROMPT if QUIZ_OUTPUT_MODE == "json" else QUIZ_TEXT_PROMPT
 
         promt = ChatPromptTemplate.from_template(promt_template)
 
         qa_chain = (
             {"context": RunnablePassthrough()}
             | promt
-            | self.llm
+            | self._scheduled(ROLE_QUIZ, Priority.BATCH, json_output=QUIZ_OUTPUT_MODE == "json")
             | StrOutputParser()
         )
 
-        output = qa_chain.invoke({"context": chunk})
+        output = await qa_chain.ainvoke({"context": chunk})
         return output
 
     def _parse_output(self, output):
-        pattern = r"Frage: (.*?)\nA\) (.*?)\nB\) (.*?)\nC\) (.*?)\nKorrekte Antwort: (.*?)\nErklärung: (.*?)$"
-
-        match = re.search(pattern, output, re.DOTALL)
-        if match:
-            return {
-                "Frage": match.group(1),
-                "Antworten": {
-                    "A": match.group(2),
-                    "B": match.group(3),
-                    "C": match.group(4),
-                },
-                "Korrekte_Antwort": match.group(5),
-                "Erklärung": match.group(6),
-            }
-
-    def generate_questions(self, collection_name=None):
-
-        # Laden der ausgewählten Collection
-        questions = {}
+        return parse_quiz_output(output)
 
-        curr_collection_name = collection_name or self.get_current_collection()
-        collection = self.client.get_collection(name=curr_collection_name)
-        docs = collection.get()['documents'] or []
-        # Durch jedes Embedding in der Collection iterieren und Frage erstellen
-        for i, doc in enumerate(docs):
-
-            logger.info(f"Generiere Frage {i}")
+    async def _generate_question(self, doc: str, semaphore: asyncio.Semaphore) -> Tuple[Optional[dict], int]:
+        wait_start = time.perf_counter()
+        async with semaphore:
+            QUIZ_STAGE_SECONDS.labels("queue_wait").observe(time.perf_counter() - wait_start)
             # 3 Versuche für die Generierung einer korrekt formatierten Frage
             for k in range(3):
-                result = self._qa_generation_chain(doc)
+                generation_start = time.perf_counter()
+                result = await self._qa_generation_chain(doc)
+                generation_seconds = time.perf_counter() - generation_start
+                QUIZ_STAGE_SECONDS.labels("llm_generation").observe(generation_seconds)
+                observe_generation("quiz", estimate_tokens(result), generation_seconds)
+                self.quiz_stats.generations += 1
+                if k > 0:
+                    self.quiz_stats.retries += 1
 
                 # Parsen der QA Chain Ausgabe in JSON
                 output = self._parse_output(result)
 
                 if output:
-                    questions.update({i: output})
-                    break   # Aus der For-Schleife herausspringen, wenn Frage ausgewertet werden konnte
+                    self.quiz_stats.questions += 1
+                    return output, k + 1
+
+                self.quiz_stats.parse_failures += 1
+                logger.info(f"Keine gültige Antwort erhalten, versuche erneut... ({k})")
+        self.quiz_stats.failed_chunks += 1
+        return None, 3
+
+    async def _generate_and_store_question(self, collection_name: str, question_id: str, doc: str,
+                                           semaphore: asyncio.Semaphore) -> Tuple[str, Optional[dict]]:
+        logger.info(f"Generiere Frage {question_id[:12]}")
+        output, attempts = await self._generate_question(doc, semaphore)
+        await asyncio.to_thread(self.question_bank.store, collection_name, question_id, output, attempts)
+        return question_id, output
+
+    async def agenerate_questions(self, collection_name: Optional[str] = None, max_questions: Optional[int] = None,
+                                  sample: bool = False, concurrency: Optional[int] = None) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Generate quiz questions for the chunks of a collection with a bounded number of parallel LLM calls.
+
+        Questions that are already in the question bank are yielded first without calling the LLM. Only
+        chunks that are new or failed before are generated, and those questions are yielded as soon as
+        they are ready, not in chunk order.
 
-                else:
-                    print(
-                        f"Keine gültige Antwort für Frage {i} erhalten, versuche erneut... ({k})")
+        Args:
+            collection_name (Optional[str]): Collection to generate questions for. Defaults to the current collection.
+            max_questions (Optional[int]): Only use this many chunks of the collection.
+            sample (bool): Pick the chunks randomly instead of taking the first ones.
+            concurrency (Optional[int]): Maximum number of parallel LLM calls. Defaults to QUIZ_CONCURRENCY.
+
+        Yields:
+            Tuple[str, dict]: Content hash of the chunk (id of the question) and the parsed question.
+        """
+        quiz_start = time.perf_counter()
+        # Laden der ausgewählten Collection
+        curr_collection_name = self._resolve_collection_name(collection_name)
+        collection = await asyncio.to_thread(self.client.get_collection, name=curr_collection_name)
+        docs = (await asyncio.to_thread(collection.get, include=["documents"]))['documents'] or []
+
+        # Fragen zu Chunks, die nicht mehr existieren, aus der Fragenbank entfernen
+        hashes = [chunk_hash(doc) for doc in docs]
+        await asyncio.to_thread(self.question_bank.prune, curr_collection_name, hashes)
+
+        indices = list(range(len(docs)))
+        if max_questions is not None and max_questions < len(indices):
+            indices = sorted(random.sample(indices, max_questions)) if sample else indices[:max_questions]
+
+        stored = await asyncio.to_thread(self.question_bank.get_many, curr_collection_name, [hashes[i] for i in indices])
+        missing = []
+        seen = set()
+        for i in indices:
+            # Identische Chunks nur einmal abfragen
+            if hashes[i] in seen:
+                continue
+            seen.add(hashes[i])
+
+            entry = stored.get(hashes[i])
+            if entry and entry["status"] == STATUS_OK:
+                yield hashes[i], entry["question"]
+            else:
+                missing.append(i)
+        logger.info(f"{len(indices) - len(missing)} Fragen aus der Fragenbank, {len(missing)} werden generiert.")
+        QUIZ_STAGE_SECONDS.labels("question_bank_lookup").observe(time.perf_counter() - quiz_start)
+
+        semaphore = asyncio.Semaphore(concurrency or QUIZ_CONCURRENCY)
+        tasks = [asyncio.create_task(self._generate_and_store_question(curr_collection_name, hashes[i], docs[i], semaphore))
+                 for i in missing]
+        try:
+            for task in asyncio.as_completed(tasks):
+                question_id, output = await task
+                if output:
+                    yield question_id, output
+            QUIZ_STAGE_SECONDS.labels("total").observe(time.perf_counter() - quiz_start)
+        finally:
+            # Bei Abbruch (z.B. Client getrennt) keine weiteren LLM Aufrufe ausführen
+            for task in tasks:
+                task.cancel()
+
+    async def generate_questions(self, collection_name: Optional[str] = None, max_questions: Optional[int] = None,
+                                 sample: bool = False) -> dict:
+        questions = {}
+        async for question_id, output in self.agenerate_questions(collection_name, max_questions=max_questions, sample=sample):
+            questions[question_id] = output
         return questions
 
-    def _initialize_qa_rag_chain(self) -> RunnableSerializable:
+    def get_quiz_stats(self) -> dict:
+        return {"output_mode": QUIZ_OUTPUT_MODE, **self.quiz_stats.to_dict()}
+
+    def get_question_bank_page(self, collection_name: Optional[str] = None, offset: int = 0, limit: int = 20) -> dict:
+        return self.question_bank.page(self._resolve_collection_name(collection_name), offset=offset, limit=limit)
+
+    def summaries_ready(self, collection_name: str) -> bool:
+        """
+        Whether every chunk of a collection has a summary, so retrieval can search the summaries.
+        """
+        def chunk_ids() -> List[str]:
+            try:
+                return self.client.get_collection(collection_name).get(include=[])["ids"]
+            except Exception:
+                return []
+
+        return self.summary_index.is_ready(collection_name, chunk_ids)
+
+    def schedule_summaries(self, collection_name: Optional[str] = None) -> SummaryStatus:
+        """
+        Start the summary pass of a collection as background task. Must be called from the event loop.
+        If a pass of the collection is already running, it runs once more afterwards, so chunks indexed
+        in the meantime are included.
+        """
+        collection_name = self._resolve_collection_name(collection_name)
+        task = self._summary_tasks.get(collection_name)
+        if task and not task.done():
+            self._summary_status[collection_name].rerun = True
+            return self._summary_status[collection_name]
+
+        status = SummaryStatus(collection_name)
+        self._summary_status[collection_name] = status
+        self._summary_tasks[collection_name] = asyncio.create_task(self._run_summaries(status))
+        return status
+
+    async def _run_summaries(self, status: SummaryStatus):
+        while True:
+            status.rerun = False
+            status.status = JobStatus.RUNNING
+            status.started_at = time.time()
+            status.error = None
+            try:
+                await self.asummarize_collection(status.collection_name, status)
+                status.status = JobStatus.COMPLETED
+            except asyncio.CancelledError:
+                status.status = JobStatus.CANCELLED
+                raise
+            except Exception as e:
+                logger.error(f"Summary pass of {status.collection_name} failed: {e}", exc_info=True)
+                status.status = JobStatus.FAILED
+                status.error = str(e)
+            finally:
+                status.finished_at = time.time()
+            if not status.rerun:
+                return
+
+    def get_summary_status(self, collection_name: Optional[str] = None) -> dict:
+        collection_name = self._resolve_collection_name(collection_name)
+        status = self._summary_status.get(collection_name)
+        documents = self.summary_index.document_summaries(collection_name)
+        return {
+            "collection_name": collection_name,
+            "ready": self.summaries_ready(collection_name),
+            "pass": status.to_dict() if status else None,
+            "documents": [{"source": doc.metadata.get("source"), "summary": doc.page_content} for doc in documents],
+        }
+
+    def cancel_summaries(self):
+        for task in self._summary_tasks.values():
+            task.cancel()
+
+    async def _summarize_chunk(self, text: str, metadata: dict, semaphore: asyncio.Semaphore) -> Optional[str]:
+        """
+        Summarize a chunk with a batch request on the quiz endpoints. Chunks that are already about as
+        short as a summary are used unchanged.
+
+        Raises:
+            LLMUnavailable, LLMOverloaded: If the LLM cannot be reached, which stops the pass.
+        """
+        heading = metadata.get("heading") or ""
+        if estimate_tokens(text) <= SUMMARY_MAX_WORDS * 2:
+            return text
+        async with semaphore:
+            prompt = CHUNK_SUMMARY_PROMPT.format(max_words=SUMMARY_MAX_WORDS, heading=heading or "-", text=text)
+            generation_start = time.perf_counter()
+            try:
+                summary = (await self._ainvoke_llm(prompt, Priority.BATCH, role=ROLE_QUIZ)).strip()
+            except (LLMUnavailable, LLMOverloaded):
+                raise
+            except Exception as e:
+                logger.warning(f"Summarizing a chunk failed: {e}")
+                return None
+            observe_generation("summary", estimate_tokens(summary), time.perf_counter() - generation_start)
+        if not summary:
+            return None
+        # Überschrift voranstellen, damit die Zusammenfassung auch über sie gefunden wird
+        return f"{heading}\n{summary}" if heading and not summary.startswith(heading) else summary
+
+    async def _summarize_document(self, source: str, summaries: List[Tuple[dict, str]]) -> Optional[str]:
+        """
+        Summarize a document from the summaries of its chunks in page order.
+        """
+        summaries = sorted(summaries, key=lambda item: item[0].get("page", 0))
+        texts = [summary for _, summary in summaries]
+        # Bei langen Dokumenten gleichmäßig verteilte Abschnitte verwenden
+        total_tokens = sum(estimate_tokens(text) for text in texts)
+        if total_tokens > SUMMARY_DOCUMENT_INPUT_TOKENS:
+            texts = texts[::math.ceil(total_tokens / SUMMARY_DOCUMENT_INPUT_TOKENS)]
+        prompt = DOCUMENT_SUMMARY_PROMPT.format(source=source, max_words=SUMMARY_MAX_WORDS * 3, summaries="\n\n".join(texts))
+        try:
+            summary = (await self._ainvoke_llm(prompt, Priority.BATCH, role=ROLE_QUIZ)).strip()
+        except (LLMUnavailable, LLMOverloaded):
+            raise
+        except Exception as e:
+            logger.warning(f"Summarizing document {source} failed: {e}")
+            return None
+        return summary or None
+
+    async def _store_summaries(self, collection_name: str, ids: List[str], summaries: List[str], metadatas: List[dict]):
+        embeddings = await asyncio.to_thread(self.embedding_function.embed_documents, summaries)
+        await asyncio.to_thread(self.summary_index.store, collection_name, ids, summaries, embeddings, metadatas)
+
+    async def asummarize_collection(self, collection_name: Optional[str] = None, status: Optional[SummaryStatus] = None):
+        """
+        Summarize every chunk of a collection that has no summary yet, then every document whose chunks
+        changed. Summaries and their embeddings are stored in the summary index, summaries of chunks
+        that no longer exist are removed.
+
+        LLM calls are batch requests on the quiz endpoints, so they never delay the chat.
+
+        Args:
+            collection_name (Optional[str]): Collection to summarize. Defaults to the current collection.
+            status (Optional[SummaryStatus]): Progress of the pass, updated while it runs.
         """
-        Set up the retrieval-augmented generation (RAG) pipeline for answering questions.
+        pass_start = time.perf_counter()
+        collection_name = self._resolve_collection_name(collection_name)
+        status = status or SummaryStatus(collection_name)
+        collection = await asyncio.to_thread(self.client.get_collection, name=collection_name)
+        result = await asyncio.to_thread(collection.get, include=["documents", "metadatas"])
+        chunks = {chunk_id: (text, metadata or {})
+                  for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])}
+
+        # Zusammenfassungen entfernter Chunks und Dokumente löschen
+        summarized = await asyncio.to_thread(self.summary_index.chunk_summaries, collection_name)
+        stale = [chunk_id for chunk_id in summarized if chunk_id not in chunks]
+        sources = {str(metadata["source"]) for _, metadata in chunks.values() if metadata.get("source")}
+        await asyncio.to_thread(self.summary_index.delete, collection_name, stale)
+        await asyncio.to_thread(self.summary_index.delete, collection_name,
+                                where={"$and": [{"kind": KIND_DOCUMENT}, {"source": {"$nin": list(sources)}}]})
+
+        missing = [chunk_id for chunk_id in chunks if chunk_id not in summarized]
+        documents = {doc.metadata.get("source") for doc in
+                     await asyncio.to_thread(self.summary_index.document_summaries, collection_name)}
+        changed_sources = sources & ({chunks[chunk_id][1].get("source") for chunk_id in missing}
+                                     | {summarized[chunk_id].get("source") for chunk_id in stale}
+                                     | (sources - documents))
+        status.chunks_total = len(chunks)
+        status.chunks_summarized = len(chunks) - len(missing)
+        status.chunks_failed = 0
+        status.documents_summarized = 0
+        logger.info(f"Summarizing {len(missing)} chunks and {len(changed_sources)} documents of {collection_name}.")
+
+        async def summarize(chunk_id: str) -> Tuple[str, Optional[str]]:
+            text, metadata = chunks[chunk_id]
+            return chunk_id, await self._summarize_chunk(text, metadata, semaphore)
+
+        async def store(pending: List[Tuple[str, str]]):
+            await self._store_summaries(
+                collection_name, [chunk_id for chunk_id, _ in pending], [summary for _, summary in pending],
+                [{**chunks[chunk_id][1], "kind": KIND_CHUNK} for chunk_id, _ in pending])
+            status.chunks_summarized += len(pending)
+
+        semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+        tasks = [asyncio.create_task(summarize(chunk_id)) for chunk_id in missing]
+        pending: List[Tuple[str, str]] = []
+        try:
+            for task in asyncio.as_completed(tasks):
+                chunk_id, summary = await task
+                if summary is None:
+                    status.chunks_failed += 1
+                    continue
+                pending.append((chunk_id, summary))
+                # In Batches embedden und schreiben, damit ein Abbruch die fertigen Zusammenfassungen behält
+                if len(pending) >= INDEX_BATCH_SIZE:
+                    await store(pending)
+                    pending = []
+            if pending:
+                await store(pending)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if changed_sources:
+            summaries = await asyncio.to_thread(self.summary_index.collection(collection_name).get,
+                                                where={"kind": KIND_CHUNK}, include=["documents", "metadatas"])
+            by_source: Dict[str, List[Tuple[dict, str]]] = {}
+            for text, metadata in zip(summaries["documents"], summaries["metadatas"]):
+                by_source.setdefault(metadata.get("source"), []).append((metadata, text))
+            for source in sorted(changed_sources):
+                summary = await self._summarize_document(source, by_source.get(source, []))
+                if summary is None:
+                    continue
+                await self._store_summaries(collection_name, [document_summary_id(source)], [summary],
+                                            [{"kind": KIND_DOCUMENT, "source": source, "chunks": len(by_source.get(source, []))}])
+                status.documents_summarized += 1
+
+        # Bereitschaft neu bestimmen, die Suche (und damit gecachte Antworten) kann sich ändern
+        self.summary_index.invalidate(collection_name)
+        if self.answer_cache and (missing or stale or status.documents_summarized):
+            self.answer_cache.invalidate(collection_name)
+        INGESTION_STAGE_SECONDS.labels("summaries").observe(time.perf_counter() - pass_start)
+        logger.info(f"Summarized {collection_name}: {status.chunks_summarized}/{status.chunks_total} chunks, "
+                    f"{status.chunks_failed} failed, {status.documents_summarized} documents "
+                    f"in {time.perf_counter() - pass_start:.1f}s.")
+
+    def _initialize_qa_rag_chain(self, vector_db: Chroma) -> RunnableSerializable:
+        """
+        Set up the retrieval-augmented generation (RAG) pipeline for answering questions on a collection.
 
         The pipeline consists of:
-        - Retrieving relevant documents from ChromaDB.
-        - Formatting the retrieved documents for input into the language model (LLM).
+        - Retrieving relevant documents from ChromaDB (and the keyword index in hybrid mode).
+        - Assembling the retrieved documents into a context within the token budget.
         - Using the LLM to generate concise answers.
 
+        Args:
+            vector_db (Chroma): Vector db of the collection used for retrieval.
+
         Returns:
             dict: The RAG pipeline configuration.
         """
         prompt_template = """
         Du bist ein Assistent um Fragen zu beantworten. Benutze die folgenden Informationen aus dem Kontext um die Frage zu beantworten. Wenn du dir nicht sicher bist, sag dass du es nicht weißt. Benutze eine angemessene Anzahl an Sätzen um die Frage zu beantorten, antworte detailiert.  
-        Kontext:
+        {history}Kontext:
         <context>
         {context}
         </context>
@@ -278,19 +1321,157 @@ class CustomChatBot:
         {question}"""
 
         rag_prompt = ChatPromptTemplate.from_template(prompt_template)
-        retriever = self.vector_db.as_retriever(
-            search_kwargs={"k": 5}
-        )
+        retriever = self._create_retriever(vector_db)
 
+        def retrieve(inputs: dict) -> List[Document]:
+            return retriever.invoke(inputs.get("query") or inputs["question"], filter=inputs.get("filter"))
+
+        # Eingabe der Chain: {"question": ..., "filter": optionaler Chroma Metadaten-Filter,
+        # "query": optionale eigenständige Suchanfrage, "history": optionaler Gesprächsverlauf}
         qa_rag_chain = (
-            {"context": retriever | self._format_docs,
-                "question": RunnablePassthrough()}
+            {"context": RunnableLambda(retrieve),
+                "question": itemgetter("question"),
+                "history": RunnableLambda(self._format_history)}
+            | RunnableLambda(self._assemble_context)
             | rag_prompt
-            | self.llm
+            | RunnableLambda(self._log_prompt_size)
+            | self._scheduled(ROLE_CHAT, Priority.INTERACTIVE)
             | StrOutputParser()
         )
         return qa_rag_chain
 
+    def _scheduled(self, role: str, priority: Priority, json_output: bool = False) -> Runnable:
+        """
+        Runnable that generates with the least-loaded LLM endpoint of a role. It holds a slot of the
+        LLM scheduler and of the endpoint while the model generates, and streams like the LLM itself.
+
+        If an endpoint fails with a connection error before the first token, it is marked unhealthy
+        and the request is retried on another endpoint of the role.
+        """
+        async def generate(prompts: AsyncIterator[PromptValue],
+                           config: Optional[RunnableConfig] = None) -> AsyncIterator[BaseMessageChunk]:
+            # Die Eingabe ist genau ein Prompt
+            prompt = None
+            async for prompt in prompts:
+                pass
+            if prompt is None:
+                raise ValueError("No prompt to generate from")
+            async with self.llm_scheduler.slot(priority):
+                mark("llm_start")
+                while True:
+                    async with self.llm_pool.endpoint(role) as endpoint:
+                        llm = endpoint.json_llm if json_output else endpoint.llm
+                        started = False
+                        try:
+                            async for chunk in llm.astream(prompt, config):
+                                started = True
+                                yield chunk
+                            return
+                        except Exception as e:
+                            if started or not is_endpoint_failure(e):
+                                raise
+                            self.llm_pool.mark_failed(endpoint, e)
+                    logger.warning(f"LLM endpoint {endpoint.name} failed, retrying on another endpoint.")
+
+        return RunnableGenerator(generate)
+
+    async def _ainvoke_llm(self, prompt: str, priority: Priority = Priority.INTERACTIVE, role: str = ROLE_CHAT) -> str:
+        return (await self._scheduled(role, priority).ainvoke(prompt)).content
+
+    def get_llm_scheduler_stats(self) -> dict:
+        return self.llm_scheduler.stats()
+
+    def get_llm_pool_stats(self) -> dict:
+        return self.llm_pool.stats()
+
+    def _create_retriever(self, vector_db: Chroma) -> BaseRetriever:
+        """
+        Create the retriever of a collection. In hybrid mode (RETRIEVAL_MODE=hybrid) vector and BM25 keyword
+        search are fused with reciprocal rank fusion, otherwise only the vector search is used. With
+        SUMMARY_RETRIEVAL the chunk summaries are searched instead, once every chunk has a summary.
+
+        Args:
+            vector_db (Chroma): Vector db of the collection.
+
+        Returns:
+            BaseRetriever: The retriever returning RETRIEVAL_K documents. It accepts a metadata filter per call.
+        """
+        collection_name = vector_db._collection_name
+        keyword_index = None
+        if RETRIEVAL_MODE == "hybrid":
+            self._ensure_keyword_index(collection_name)
+            keyword_index = self.keyword_index
+
+        retriever = HybridRetriever(
+            vector_db=vector_db,
+            keyword_index=keyword_index,
+            collection_name=collection_name,
+            k=RETRIEVAL_K,
+            fetch_k=RETRIEVAL_FETCH_K,
+            reranker=self.reranker,
+        )
+        if not SUMMARY_RETRIEVAL:
+            return retriever
+        return HierarchicalRetriever(
+            summary_index=self.summary_index,
+            vector_db=vector_db,
+            fallback=retriever,
+            is_ready=lambda: self.summaries_ready(collection_name),
+            keyword_index=keyword_index,
+            collection_name=collection_name,
+            k=RETRIEVAL_K,
+            expand_k=SUMMARY_EXPAND_K,
+            fetch_k=RETRIEVAL_FETCH_K,
+            document_max_distance=SUMMARY_DOCUMENT_MAX_DISTANCE,
+        )
+
+    def _ensure_keyword_index(self, collection_name: str):
+        """
+        Build the keyword index of a collection that was indexed before the keyword index existed.
+        """
+        collection = self.client.get_collection(collection_name)
+        if self.keyword_index.count(collection_name) > 0 or collection.count() == 0:
+            return
+
+        logger.info(f"Building keyword index for collection {collection_name}.")
+        offset = 0
+        while True:
+            result = collection.get(include=["documents"], limit=500, offset=offset)
+            if not result["ids"]:
+                break
+            self.keyword_index.add(collection_name, result["ids"], result["documents"])
+            offset += len(result["ids"])
+
+    def _assemble_context(self, inputs: dict) -> dict:
+        """
+        Turn the retrieved documents into the context string of the prompt. With a token budget
+        (CONTEXT_MAX_TOKENS > 0) overlapping and near-duplicate chunks are removed and the context is
+        cut to the budget, otherwise all documents are concatenated.
+        """
+        mark("retrieved")
+        question, docs = inputs["question"], inputs["context"]
+        if not self.context_assembler:
+            return {"context": self._format_docs(docs), "question": question, "history": inputs["history"]}
+
+        with RAG_STAGE_SECONDS.labels("context_assembly").time():
+            context, stats = self.context_assembler.assemble(question, docs)
+        logger.info(f"Context: {stats.documents_used}/{stats.documents_in} chunks, {stats.duplicates_dropped} duplicates dropped, "
+                    f"{stats.overlap_chars_removed} overlapping chars removed, ~{stats.tokens} tokens.")
+        return {"context": context, "question": question, "history": inputs["history"]}
+
+    @staticmethod
+    def _format_history(inputs: dict) -> str:
+        history = inputs.get("history")
+        if not history:
+            return ""
+        return f"Bisheriger Gesprächsverlauf:\n{history}\n\n"
+
+    def _log_prompt_size(self, prompt: PromptValue) -> PromptValue:
+        mark("prompt_ready")
+        text = prompt.to_string()
+        logger.info(f"Prompt size: {len(text)} chars, ~{estimate_tokens(text)} tokens.")
+        return prompt
+
     def _format_docs(self, docs: List[Document]) -> str:
         """
         Helper function to format the retrieved documents into a single string.
@@ -304,23 +1485,146 @@ class CustomChatBot:
 
         return "\n\n".join(doc.page_content for doc in docs)
 
-    async def astream(self, question: str):
+    def new_conversation_memory(self) -> ConversationMemory:
+        """
+        Create the history of a new multi-turn chat session with the configured token budgets.
+        """
+        return ConversationMemory(history_tokens=CONVERSATION_HISTORY_TOKENS, summary_tokens=CONVERSATION_SUMMARY_TOKENS)
+
+    async def _rewrite_question(self, question: str, memory: ConversationMemory) -> str:
+        """
+        Rewrite a follow-up question into a standalone retrieval query using the conversation history.
+        Falls back to the original question if the rewrite fails.
+        """
+        if not CONVERSATION_REWRITE or not memory:
+            return question
+        prompt = REWRITE_PROMPT.format(history=memory.format(), question=question)
+        try:
+            rewritten = (await self._ainvoke_llm(prompt)).strip().strip('"')
+        except Exception as e:
+            logger.warning(f"Rewriting the question failed: {e}")
+            return question
+        # Unbrauchbare (leere oder ausufernde) Umformulierungen verwerfen
+        if not rewritten or len(rewritten) > 3 * len(question) + 200:
+            return question
+        logger.info(f"Standalone query: {rewritten}")
+        return rewritten
+
+    async def _update_memory(self, memory: ConversationMemory, question: str, answer: str):
+        """
+        Add a turn to the history. The turns exceeding the token budget are rolled into the running summary
+        in a background task, so the answer is complete without waiting for the summary LLM call.
+        """
+        await memory.settle()
+        memory.add_turn(question, answer)
+        overflow = memory.pop_overflow()
+        if overflow:
+            memory.set_pending(asyncio.create_task(self._roll_into_summary(memory, overflow)))
+
+    async def _roll_into_summary(self, memory: ConversationMemory, overflow: List[ConversationTurn]):
+        """
+        Summarize the overflow turns together with the running summary of the memory.
+        """
+        prompt = SUMMARY_PROMPT.format(max_words=int(memory.summary_tokens * 0.6), summary=memory.summary or "-",
+                                       turns=format_turns(overflow))
+        try:
+            summary = await self._ainvoke_llm(prompt)
+        except Exception as e:
+            logger.warning(f"Summarizing the conversation failed: {e}")
+            # Ohne LLM die neuesten Abschnitte behalten
+            summary = f"{memory.summary} {format_turns(overflow)}"[-memory.summary_tokens * 4:]
+        memory.set_summary(summary)
+        logger.info(f"Rolled {len(overflow)} turns into the conversation summary (~{memory.tokens} tokens in memory).")
+
+    async def astream(self, question: str, collection_name: Optional[str] = None, filter: Optional[dict] = None,
+                      memory: Optional[ConversationMemory] = None):
         """
         Handle a user query asynchronously by running the question through the RAG pipeline and stream the answer.
 
+        Answers are served from the answer cache if the same (or a very similar) question was already
+        asked for the collection. With a conversation memory, follow-up questions are rewritten into a
+        standalone retrieval query, the history is added to the prompt and the turn is stored afterwards.
+
         Args:
             question (str): The user's question as a string.
+            collection_name (Optional[str]): Collection used as context. Defaults to the current collection.
+            filter (Optional[dict]): Chroma metadata filter for the retrieval, e.g. {"source": "script.pdf"}.
+            memory (Optional[ConversationMemory]): History of a multi-turn session.
 
         Yields:
             str: The generated answer from the model, streamed chunk by chunk.
         """
+        timings = start_request_timings()
+        if memory is not None:
+            # Zusammenfassung des vorherigen Turns abwarten, bevor der Verlauf gelesen wird
+            await memory.settle()
+        collection = self._resolve_collection_name(collection_name)
+        qa_rag_chain = (await asyncio.to_thread(self._get_collection_handle, collection)).qa_rag_chain
+        # Antworten mit Metadaten-Filter oder Gesprächsverlauf werden nicht gecacht
+        answer_cache = self.answer_cache if not filter and not memory else None
+        # Vor dem Lookup festhalten, damit eine während der Generierung invalidierte Antwort verworfen wird
+        cache_generation = answer_cache.generation(collection) if answer_cache is not None else None
+        if answer_cache is not None:
+            with RAG_STAGE_SECONDS.labels("answer_cache_lookup").time():
+                cached_answer = await answer_cache.alookup(collection, question)
+            if cached_answer is not None:
+                logger.info("Replaying cached answer.")
+                for chunk in replay_answer(cached_answer):
+                    yield chunk
+                if memory is not None:
+                    await self._update_memory(memory, question, cached_answer)
+                return
+
+        inputs = {"question": question, "filter": filter}
+        if memory:
+            with RAG_STAGE_SECONDS.labels("query_rewrite").time():
+                inputs["query"] = await self._rewrite_question(question, memory)
+            inputs["history"] = memory.format()
+
         logger.info("Streaming RAG chain response.")
+        answer = []
+        mark("chain_start")
         try:
-            async for chunk in self.qa_rag_chain.astream(question):
+            async for chunk in qa_rag_chain.astream(inputs):
                 logger.debug(f"Yielding chunk: {chunk}")
+                if not answer:
+                    mark("first_token")
+                answer.append(chunk)
                 yield chunk
         except Exception as e:
             logger.error(f"Error in stream_answer: {e}", exc_info=True)
             raise
         finally:
             logger.info("Stream complete")
+        mark("end")
+        self._observe_answer_timings(timings, tokens=len(answer))
+
+        if answer_cache is not None and answer:
+            await answer_cache.astore(collection, question, "".join(answer), generation=cache_generation)
+        if memory is not None and answer:
+            await self._update_memory(memory, question, "".join(answer))
+
+    @staticmethod
+    def _observe_answer_timings(timings: Dict[str, float], tokens: int):
+        """
+        Record the stage durations of a streamed answer from the time points set along the RAG chain.
+        """
+        # Ollama streamt einen Chunk pro Token
+        stages = {
+            "retrieval": ("chain_start", "retrieved"),
+            "llm_queue_wait": ("prompt_ready", "llm_start"),
+            "time_to_first_token": ("llm_start", "first_token"),
+            "generation": ("first_token", "end"),
+            "first_chunk": ("start", "first_token"),
+            "total": ("start", "end"),
+        }
+        for stage, (begin, end) in stages.items():
+            if begin in timings and end in timings:
+                RAG_STAGE_SECONDS.labels(stage).observe(timings[end] - timings[begin])
+        if "first_token" in timings:
+            observe_generation("chat", tokens, timings["end"] - timings["first_token"])
+
+    def get_answer_cache_stats(self) -> Optional[dict]:
+        if self.answer_cache:
+            return self.answer_cache.stats()
+        return None
@@ -0,0 +1,172 @@
+import logging
+import os
+import shutil
+import zipfile
+from pathlib import PurePosixPath
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from src.chunking import ChunkProfile, Chunker
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+
+class BulkImportError(ValueError):
+    """
+    Raised when an archive or directory cannot be imported at all (e.g. too large or no PDFs).
+    """
+
+
+def parse_pdf(path: str, profile: ChunkProfile) -> Tuple[int, List[Document]]:
+    """
+    Load and chunk a PDF. Runs in a worker process of the bulk import, so it must not depend on the chatbot.
+
+    Returns:
+        Tuple[int, List[Document]]: Number of pages and the chunks.
+    """
+    pages = 0
+
+    def counted(documents: Iterator[Document]) -> Iterator[Document]:
+        nonlocal pages
+        for page in documents:
+            pages += 1
+            yield page
+
+    chunks = list(Chunker(profile).split(counted(PyPDFLoader(file_path=path).lazy_load())))
+    return pages, chunks
+
+
+def _is_hidden(parts: Tuple[str, ...]) -> bool:
+    # Metadaten von macOS ("__MACOSX", "._datei.pdf") und versteckte Ordner überspringen
+    return any(part.startswith(".") or part == "__MACOSX" for part in parts)
+
+
+def extract_pdfs(archive: str, target: str, max_bytes: int = 0) -> List[str]:
+    """
+    Extract the PDFs of a ZIP archive into target, keeping the folder structure.
+
+    Args:
+        archive (str): Path of the ZIP archive.
+        target (str): Directory the PDFs are extracted to.
+        max_bytes (int): Maximum uncompressed size of all PDFs, 0 for no limit.
+
+    Returns:
+        List[str]: Paths of the extracted PDFs.
+    """
+    target = os.path.realpath(target)
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as e:
+        raise BulkImportError(f"Keine gültige ZIP Datei: {e}") from None
+
+    paths = []
+    with zip_file:
+        members = [info for info in zip_file.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith(".pdf")
+                   and not _is_hidden(PurePosixPath(info.filename).parts)]
+        size = sum(info.file_size for info in members)
+        if max_bytes and size > max_bytes:
+            raise BulkImportError(f"Archiv zu groß ({size / 1e6:.0f} MB entpackt, erlaubt {max_bytes / 1e6:.0f} MB)")
+
+        for info in members:
+            path = os.path.realpath(os.path.join(target, *PurePosixPath(info.filename).parts))
+            # Pfade außerhalb des Zielordners ("../") ignorieren
+            if not path.startswith(target + os.sep):
+                logger.warning(f"Skipping {info.filename} outside of the import directory.")
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with zip_file.open(info) as source, open(path, "wb") as destination:
+                shutil.copyfileobj(source, destination)
+            paths.append(path)
+    return paths
+
+
+def find_pdfs(directory: str) -> List[str]:
+    """
+    All PDFs below a directory, in a stable order.
+    """
+    paths = []
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(d for d in directories if not _is_hidden((d,)))
+        paths.extend(os.path.join(root, name) for name in sorted(files)
+                     if name.lower().endswith(".pdf") and not _is_hidden((name,)))
+    return paths
+
+
+def staged_path(upload_dir: str, collection: str, source: str) -> str:
+    """
+    Path of a stored PDF: one folder per collection, so files with the same name in different
+    collections do not overwrite each other.
+    """
+    return os.path.join(upload_dir, collection, os.path.basename(source))
+
+
+def remove_staged(upload_dir: str, collection: str, source: Optional[str] = None):
+    """
+    Remove the stored PDF of a deleted document, or the folder with all stored PDFs of a deleted collection.
+    """
+    directory = os.path.join(upload_dir, collection)
+    if source is None:
+        shutil.rmtree(directory, ignore_errors=True)
+        return
+    try:
+        os.remove(staged_path(upload_dir, collection, source))
+        # Leeren Ordner der Collection ebenfalls entfernen
+        if not os.listdir(directory):
+            os.rmdir(directory)
+    except OSError:
+        pass
+
+
+def stage_files(assignments: List[Tuple[str, str]], upload_dir: str, move: bool = False) -> List[Tuple[str, str]]:
+    """
+    Store the PDFs in the upload directory like single uploads, so their collections can be
+    re-chunked from there later.
+
+    Returns:
+        List[Tuple[str, str]]: (stored path, collection) per file.
+    """
+    staged = []
+    for path, collection in assignments:
+        stored = staged_path(upload_dir, collection, path)
+        os.makedirs(os.path.dirname(stored), exist_ok=True)
+        if os.path.realpath(stored) != os.path.realpath(path):
+            (shutil.move if move else shutil.copyfile)(path, stored)
+        staged.append((stored, collection))
+    return staged
+
+
+def assign_collections(paths: List[str], root: str, collection_name: Optional[str],
+                       normalize: Callable[[str], str]) -> Tuple[List[Tuple[str, str]], List[dict]]:
+    """
+    Choose the target collection of every PDF: collection_name if given, otherwise the top-level folder
+    below root (one collection per course), and for files directly in root the file name, like a
+    single upload. A single folder wrapping the whole import is ignored.
+
+    Chunks are identified by their file name, so a second file with the same name in the same
+    collection is reported as error instead of replacing the first one.
+
+    Returns:
+        Tuple[List[Tuple[str, str]], List[dict]]: (path, collection) per file and the errors.
+    """
+    relative = [os.path.relpath(path, root).split(os.sep) for path in paths]
+    tops = {parts[0] for parts in relative if len(parts) > 1}
+    if len(tops) == 1 and all(len(parts) > 1 for parts in relative):
+        relative = [parts[1:] for parts in relative]
+
+    assignments, errors, seen = [], [], set()
+    for path, parts in zip(paths, relative):
+        if collection_name:
+            collection = collection_name
+        else:
+            collection = normalize(parts[0] if len(parts) > 1 else parts[-1])
+        key = (collection, os.path.basename(path))
+        if key in seen:
+            errors.append({"file": os.path.join(*parts), "collection_name": collection,
+                           "error": "Dateiname kommt in der Collection mehrfach vor"})
+            continue
+        seen.add(key)
+        assignments.append((path, collection))
+    return assignments, errors
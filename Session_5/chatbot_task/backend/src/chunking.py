@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pydantic import BaseModel, Field, model_validator
+from src.context import estimate_tokens
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+# Nummerierte Überschriften ("2.3 Embeddings", "Kapitel 4") und Zeilen in Großbuchstaben
+_NUMBERED_HEADING = re.compile(r"^((\d+\.)*\d+\.?|Kapitel \d+|Chapter \d+|Session \d+)\s+\S")
+_BULLET = re.compile(r"^[•◦▪●■\-–*]\s")
+
+
+class ChunkProfile(BaseModel):
+    """
+    Settings of the chunking of a collection. Sizes are estimated tokens (about 4 characters each).
+    """
+    name: str = "custom"
+    max_tokens: int = Field(256, ge=32, le=4096)
+    overlap_tokens: int = Field(32, ge=0)
+    # Kleinere Abschnitte werden mit den folgenden zusammengefasst
+    min_tokens: int = Field(32, ge=0)
+    # Chunks nie über Seitengrenzen (Folien) hinweg bilden
+    page_boundaries: bool = True
+    # Bei Überschriften einen neuen Chunk beginnen und die Überschrift langen Abschnitten voranstellen
+    headings: bool = True
+
+    @model_validator(mode="after")
+    def _check_sizes(self) -> "ChunkProfile":
+        if self.overlap_tokens >= self.max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        if self.min_tokens > self.max_tokens:
+            raise ValueError("min_tokens must not be larger than max_tokens")
+        return self
+
+
+PROFILE_PRESETS: Dict[str, ChunkProfile] = {
+    # Kleine Chunks für präzise Suche und kurze Prompts, passen in das Limit des Embedding Modells (384 Tokens)
+    "retrieval": ChunkProfile(name="retrieval", max_tokens=256, overlap_tokens=32, min_tokens=32),
+    # Eine Frage pro Folie bzw. Abschnitt, ohne Überlappung (sonst doppelte Fragen)
+    "quiz": ChunkProfile(name="quiz", max_tokens=384, overlap_tokens=0, min_tokens=96),
+    # Große Chunks über Seitengrenzen hinweg für Fließtext (entspricht etwa 3000/300 Zeichen)
+    "large": ChunkProfile(name="large", max_tokens=750, overlap_tokens=75, min_tokens=64, page_boundaries=False),
+}
+
+
+def resolve_profile(preset: Optional[str] = None, **overrides) -> ChunkProfile:
+    """
+    Build a profile from a preset and individual overrides. Raises ValueError for unknown presets
+    and invalid values.
+    """
+    if preset is not None and preset not in PROFILE_PRESETS:
+        raise ValueError(f"Unknown chunk profile {preset}, expected one of {list(PROFILE_PRESETS)}")
+    base = PROFILE_PRESETS[preset or "retrieval"].model_dump()
+    overrides = {key: value for key, value in overrides.items() if value is not None}
+    if overrides:
+        base["name"] = f"{preset}+custom" if preset else "custom"
+    return ChunkProfile(**{**base, **overrides})
+
+
+@dataclass
+class _Piece:
+    text: str
+    tokens: int
+    page: int
+    heading: str
+    metadata: dict = field(default_factory=dict)
+
+
+class Chunker:
+    """
+    Structure-aware splitting of PDF pages into chunks.
+
+    Every page is divided into sections at headings (the first line of a page, i.e. the slide title,
+    numbered headings and lines in capitals). Sections that fit into max_tokens become one chunk,
+    longer ones are split recursively with overlap, each part starting with the section heading.
+    Sections smaller than min_tokens are merged with the following ones, within the page if
+    page_boundaries is set.
+    """
+
+    def __init__(self, profile: ChunkProfile, count_tokens: Callable[[str], int] = estimate_tokens) -> None:
+        self.profile = profile
+        self.count_tokens = count_tokens
+
+    def _splitter(self, max_tokens: int) -> RecursiveCharacterTextSplitter:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=max(max_tokens, 16),
+            chunk_overlap=min(self.profile.overlap_tokens, max(max_tokens, 16) // 2),
+            length_function=self.count_tokens,
+            separators=["\n\n", "\n", ". ", " ", ""],
+        )
+
+    def _is_heading(self, line: str, first: bool) -> bool:
+        if len(line) > 100 or len(line.split()) > 12 or _BULLET.match(line) or line[-1] in ".,;!?":
+            return False
+        if first:
+            return True
+        return bool(_NUMBERED_HEADING.match(line)) or (line.isupper() and len(line) > 3)
+
+    def _sections(self, text: str) -> List[tuple]:
+        lines = [line.strip() for line in text.splitlines()]
+        lines = [line for line in lines if line]
+        if not self.profile.headings:
+            return [("", "\n".join(lines))] if lines else []
+
+        sections, heading, body = [], "", []
+        for i, line in enumerate(lines):
+            if self._is_heading(line, first=i == 0):
+                if heading or body:
+                    sections.append((heading, "\n".join(body)))
+                heading, body = line, []
+            else:
+                body.append(line)
+        if heading or body:
+            sections.append((heading, "\n".join(body)))
+        return sections
+
+    def _pieces(self, page: Document) -> Iterator[_Piece]:
+        page_number = page.metadata.get("page", 0)
+        for heading, body in self._sections(page.page_content):
+            text = f"{heading}\n{body}".strip()
+            tokens = self.count_tokens(text)
+            if tokens <= self.profile.max_tokens:
+                yield _Piece(text, tokens, page_number, heading, dict(page.metadata))
+                continue
+            # Überschrift jedem Teil voranstellen, damit er für sich verständlich bleibt
+            prefix = f"{heading}\n" if heading else ""
+            for part in self._splitter(self.profile.max_tokens - self.count_tokens(prefix)).split_text(body):
+                part_text = f"{prefix}{part}"
+                yield _Piece(part_text, self.count_tokens(part_text), page_number, heading, dict(page.metadata))
+
+    def _merge(self, pieces: List[_Piece]) -> Document:
+        first = pieces[0]
+        metadata = {**first.metadata, "page": first.page}
+        if pieces[-1].page != first.page:
+            metadata["page_end"] = pieces[-1].page
+        if first.heading:
+            metadata["heading"] = first.heading[:200]
+        return Document(page_content="\n\n".join(piece.text for piece in pieces), metadata=metadata)
+
+    def split(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """
+        Split pages (e.g. lazily loaded by PyPDFLoader) into chunks. Only the pieces of the current
+        chunk are held in memory, so pages can be streamed.
+        """
+        buffer: List[_Piece] = []
+        buffer_tokens = 0
+        for page in pages:
+            if self.profile.page_boundaries and buffer:
+                yield self._merge(buffer)
+                buffer, buffer_tokens = [], 0
+            for piece in self._pieces(page):
+                # Kleine Abschnitte sammeln, bis min_tokens erreicht ist, ohne max_tokens zu überschreiten
+                if buffer and (buffer_tokens >= self.profile.min_tokens or buffer_tokens + piece.tokens > self.profile.max_tokens):
+                    yield self._merge(buffer)
+                    buffer, buffer_tokens = [], 0
+                buffer.append(piece)
+                buffer_tokens += piece.tokens
+        if buffer:
+            yield self._merge(buffer)
+
+
+class ChunkProfileStore:
+    """
+    SQLite store of the chunk profile of every collection.
+    """
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_profiles ("
+            "collection TEXT PRIMARY KEY, profile TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, collection: str) -> Optional[ChunkProfile]:
+        with self._lock:
+            row = self._conn.execute("SELECT profile FROM chunk_profiles WHERE collection = ?", (collection,)).fetchone()
+        return ChunkProfile(**json.loads(row[0])) if row else None
+
+    def set(self, collection: str, profile: ChunkProfile):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chunk_profiles (collection, profile, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(collection) DO UPDATE SET profile = excluded.profile, updated_at = excluded.updated_at",
+                (collection, profile.model_dump_json(), time.time()))
+            self._conn.commit()
+
+    def delete(self, collection: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_profiles WHERE collection = ?", (collection,))
+            self._conn.commit()
@@ -0,0 +1,128 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import List, Set, Tuple
+
+from langchain_core.documents import Document
+from src.keyword_index import tokenize
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of a text (about 4 characters per token for German and English text with llama tokenizers).
+    """
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class ContextStats:
+    documents_in: int = 0
+    documents_used: int = 0
+    duplicates_dropped: int = 0
+    overlap_chars_removed: int = 0
+    tokens: int = 0
+
+
+class ContextAssembler:
+    """
+    Builds the context string for the RAG prompt from the retrieved documents within a token budget.
+
+    The documents are expected in retrieval order (best first). Text that overlaps with an already
+    selected chunk (chunk_overlap of the splitter) is removed, near-duplicate chunks are dropped and
+    optionally only the sentences that share terms with the question are kept.
+    """
+
+    def __init__(self, max_tokens: int = 1500, duplicate_threshold: float = 0.8, extract_sentences: bool = False,
+                 min_overlap: int = 40) -> None:
+        """
+        Args:
+            max_tokens (int): Token budget of the context.
+            duplicate_threshold (float): Jaccard similarity of word shingles above which a chunk is dropped.
+            extract_sentences (bool): Keep only the sentences relevant to the question.
+            min_overlap (int): Minimum number of characters for an overlap between chunks to be removed.
+        """
+        self.max_tokens = max_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.extract_sentences = extract_sentences
+        self.min_overlap = min_overlap
+
+    @staticmethod
+    def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+        words = text.lower().split()
+        return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+    def _strip_overlap(self, text: str, selected: List[str]) -> str:
+        """
+        Remove the start of text if it repeats the end of a selected chunk (or the end if it repeats the start).
+        """
+        for previous in selected:
+            if text in previous:
+                return ""
+
+            head = text[:self.min_overlap]
+            position = previous.find(head)
+            if position != -1 and text.startswith(previous[position:]):
+                text = text[len(previous) - position:]
+
+            tail = text[-self.min_overlap:]
+            position = previous.find(tail)
+            if len(text) >= self.min_overlap and position != -1 and text.endswith(previous[:position + self.min_overlap]):
+                text = text[:len(text) - position - self.min_overlap]
+        return text.strip()
+
+    def _relevant_sentences(self, question: str, text: str) -> str:
+        question_terms = set(tokenize(question))
+        sentences = re.split(r"(?<=[.!?])\s+", text)
+        relevant = [sentence for sentence in sentences if question_terms & set(tokenize(sentence))]
+        return " ".join(relevant) if relevant else text
+
+    def assemble(self, question: str, docs: List[Document]) -> Tuple[str, ContextStats]:
+        """
+        Build the context for a question.
+
+        Returns:
+            Tuple[str, ContextStats]: The context string and statistics about the assembly.
+        """
+        stats = ContextStats(documents_in=len(docs))
+        selected: List[str] = []
+        selected_shingles: List[Set[Tuple[str, ...]]] = []
+        budget = self.max_tokens
+
+        for doc in docs:
+            text = doc.page_content.strip()
+            stripped = self._strip_overlap(text, selected)
+            stats.overlap_chars_removed += len(text) - len(stripped)
+            text = stripped
+            if not text:
+                stats.duplicates_dropped += 1
+                continue
+
+            shingles = self._shingles(text)
+            if any(len(shingles & other) / len(shingles | other) >= self.duplicate_threshold for other in selected_shingles):
+                stats.duplicates_dropped += 1
+                continue
+
+            if self.extract_sentences:
+                text = self._relevant_sentences(question, text)
+
+            tokens = estimate_tokens(text)
+            if tokens > budget:
+                if budget < 50:
+                    break
+                # Letzten Chunk auf das Restbudget kürzen, möglichst an einer Satzgrenze
+                text = text[:budget * 4]
+                cut = text.rfind(". ")
+                if cut > len(text) // 2:
+                    text = text[:cut + 1]
+                tokens = estimate_tokens(text)
+
+            selected.append(text)
+            selected_shingles.append(shingles)
+            budget -= tokens
+            if budget <= 0:
+                break
+
+        context = "\n\n".join(selected)
+        stats.documents_used = len(selected)
+        stats.tokens = estimate_tokens(context)
+        return context, stats
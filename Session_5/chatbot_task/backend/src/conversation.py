@@ -0,0 +1,110 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional
+
+from src.context import estimate_tokens
+
+
+@dataclass
+class ConversationTurn:
+    question: str
+    answer: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.question) + estimate_tokens(self.answer)
+
+
+class ConversationMemory:
+    """
+    In-memory history of a chat session with a fixed token budget.
+
+    The most recent turns are kept verbatim up to history_tokens. Older turns are handed out by
+    pop_overflow() so they can be rolled into the running summary, which itself is capped at
+    summary_tokens. A single turn is cut to max_turn_tokens so one long answer cannot evict the
+    whole history.
+
+    Rolling the overflow into the summary needs an LLM call. It runs as background task (set_pending),
+    so the answer is finished without waiting for it; settle() waits for it before the next turn reads
+    the memory.
+    """
+
+    def __init__(self, history_tokens: int = 1000, summary_tokens: int = 300, max_turn_tokens: int = 500) -> None:
+        """
+        Args:
+            history_tokens (int): Token budget of the verbatim turns.
+            summary_tokens (int): Token budget of the running summary of older turns.
+            max_turn_tokens (int): Maximum number of tokens stored per turn.
+        """
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.max_turn_tokens = max_turn_tokens
+        self.turns: Deque[ConversationTurn] = deque()
+        self.summary = ""
+        self._pending: Optional[asyncio.Task] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.turns or self.summary)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(turn.tokens for turn in self.turns)
+
+    def add_turn(self, question: str, answer: str):
+        max_chars = self.max_turn_tokens * 4
+        question = question[:max_chars // 2]
+        answer = answer[:max_chars - len(question)]
+        self.turns.append(ConversationTurn(question, answer))
+
+    def pop_overflow(self) -> List[ConversationTurn]:
+        """
+        Remove the oldest turns until the verbatim history fits into the budget (the latest turn is always kept).
+
+        Returns:
+            List[ConversationTurn]: The removed turns, oldest first.
+        """
+        overflow = []
+        while len(self.turns) > 1 and sum(turn.tokens for turn in self.turns) > self.history_tokens:
+            overflow.append(self.turns.popleft())
+        return overflow
+
+    def set_summary(self, summary: str):
+        self.summary = summary.strip()[:self.summary_tokens * 4]
+
+    def set_pending(self, task: asyncio.Task):
+        self._pending = task
+
+    async def settle(self):
+        """
+        Wait until a pending summary update is applied.
+        """
+        pending = self._pending
+        if pending is None:
+            return
+        # wait() bricht die Aufgabe nicht ab, wenn der Aufrufer abgebrochen wird, und wirft keine Fehler der Aufgabe
+        await asyncio.wait({pending})
+        if self._pending is pending:
+            self._pending = None
+
+    def clear(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        self.turns.clear()
+        self.summary = ""
+
+    def format(self) -> str:
+        """
+        Render summary and turns as text for the prompts.
+        """
+        parts = []
+        if self.summary:
+            parts.append(f"Zusammenfassung des bisherigen Gesprächs: {self.summary}")
+        if self.turns:
+            parts.append(format_turns(list(self.turns)))
+        return "\n\n".join(parts)
+
+
+def format_turns(turns: List[ConversationTurn]) -> str:
+    return "\n\n".join(f"Nutzer: {turn.question}\nAssistent: {turn.answer}" for turn in turns)
@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+
+class SQLiteEmbeddingCache:
+    """
+    Disk-backed key/value store for embedding vectors with LRU eviction.
+
+    Vectors are stored as float32 blobs in a single SQLite table. Every hit refreshes the access time
+    of the entry, and once more than max_entries are stored the least recently used entries are removed.
+    Access times of hits are buffered in memory and written before each eviction (put_many) or after
+    flush_interval seconds, so a lookup does not write to disk.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000, flush_interval: float = 60.0) -> None:
+        """
+        Args:
+            path (str): Location of the SQLite database file.
+            max_entries (int): Maximum number of cached vectors.
+            flush_interval (float): Maximum age in seconds of buffered access times.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.flush_interval = flush_interval
+        self._pending_access: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up vectors for the given keys and refresh their access time.
+
+        Returns:
+            Dict[str, List[float]]: The cached vectors of all keys that were found.
+        """
+        if not keys:
+            return {}
+
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # SQLite erlaubt nur eine begrenzte Anzahl an Parametern pro Query
+            for start in range(0, len(unique_keys), 500):
+                part = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._pending_access.update((key, now) for key in found)
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush_access()
+                    self._conn.commit()
+
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """
+        Store vectors and evict the least recently used entries if the cache is full.
+        """
+        if not items:
+            return
+
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._flush_access()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows)
+            self._evict()
+            self._conn.commit()
+
+    def _flush_access(self):
+        """
+        Write the buffered access times. Must be called with the lock held, the caller commits.
+        """
+        if self._pending_access:
+            self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?",
+                                   [(now, key) for key, now in self._pending_access.items()])
+            self._pending_access.clear()
+        self._last_flush = time.monotonic()
+
+    def _evict(self):
+        size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = size - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (overflow,))
+            self.evictions += overflow
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._pending_access.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": self.size(),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / requests if requests else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that looks up vectors in a persistent cache before calling the wrapped model.
+
+    Keys are the SHA-256 hash of the model name and the text, so switching the embedding model never
+    returns vectors of the old model.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: SQLiteEmbeddingCache, model_name: str) -> None:
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def _key(self, text: str, kind: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text, "document") for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Nur fehlende (und jeweils nur einmal) Texte durch das Modell schicken
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            cached.update(computed)
+
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text, "query")
+        cached = self.cache.get_many([key])
+        if key in cached:
+            return cached[key]
+
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        return {"model_name": self.model_name, **self.cache.stats()}
+
+
+def create_cached_embeddings(embeddings: Embeddings, model_name: str, path: Optional[str] = None,
+                             max_entries: Optional[int] = None) -> CachedEmbeddings:
+    """
+    Wrap an embedding model with the SQLite cache configured through EMBEDDING_CACHE_PATH and
+    EMBEDDING_CACHE_MAX_ENTRIES.
+    """
+    path = path or os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache/embeddings.sqlite")
+    max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+    logger.info(f"Using embedding cache at {path} (max {max_entries} entries).")
+    return CachedEmbeddings(embeddings, SQLiteEmbeddingCache(path, max_entries=max_entries), model_name)
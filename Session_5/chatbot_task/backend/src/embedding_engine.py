@@ -0,0 +1,278 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+# Werte von all-mpnet-base-v2, falls die sentence-transformers Konfiguration nicht lesbar ist
+DEFAULT_MAX_SEQ_LENGTH = 384
+DEFAULT_NORMALIZE = True
+
+
+@dataclass
+class EmbeddingRunStats:
+    """
+    Throughput of a single embed_documents call.
+    """
+    backend: str
+    texts: int
+    seconds: float
+    batch_size: int
+    num_workers: int
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.texts / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "chunks_per_second": self.chunks_per_second}
+
+
+@dataclass
+class EmbeddingEngineConfig:
+    """
+    Settings of the bulk embedding engine.
+
+    Attributes:
+        model_name (str): HuggingFace model id of the sentence transformer.
+        cache_folder (str): Download/cache folder of the model.
+        backend (str): "torch" (sentence-transformers) or "onnx" (onnxruntime).
+        batch_size (int): Number of texts per forward pass.
+        num_workers (int): Number of worker processes, 0 embeds in the calling process.
+        num_threads (Optional[int]): Intra-op threads per process, defaults to cpu_count / num_workers.
+        onnx_path (Optional[str]): Path of the exported ONNX model (backend "onnx").
+        quantize (bool): Use a dynamically int8-quantized copy of the ONNX model.
+    """
+    model_name: str
+    cache_folder: str
+    backend: str = "torch"
+    batch_size: int = 32
+    num_workers: int = 0
+    num_threads: Optional[int] = None
+    onnx_path: Optional[str] = None
+    quantize: bool = False
+
+    @classmethod
+    def from_env(cls, model_name: str, cache_folder: str) -> "EmbeddingEngineConfig":
+        num_threads = os.getenv("EMBEDDING_NUM_THREADS")
+        return cls(
+            model_name=model_name,
+            cache_folder=cache_folder,
+            backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+            num_workers=int(os.getenv("EMBEDDING_WORKERS", "0")),
+            num_threads=int(num_threads) if num_threads else None,
+            onnx_path=os.getenv("EMBEDDING_ONNX_PATH"),
+            quantize=os.getenv("EMBEDDING_QUANTIZE", "0") == "1",
+        )
+
+    @property
+    def encoder_name(self) -> str:
+        """
+        Name of the encoder that produces the vectors, e.g. for the keys of the embedding cache.
+        Backend and quantization are part of it, since they change the vectors of the same model.
+        """
+        name = f"{self.model_name}|{self.backend}"
+        if self.backend == "onnx" and self.quantize:
+            name += "|int8"
+        return name
+
+    def threads_per_worker(self) -> int:
+        if self.num_threads:
+            return self.num_threads
+        return max(1, (os.cpu_count() or 1) // max(1, self.num_workers))
+
+
+class _TorchEncoder:
+    def __init__(self, config: EmbeddingEngineConfig) -> None:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(config.threads_per_worker())
+        self.model = SentenceTransformer(config.model_name, cache_folder=config.cache_folder)
+        self.batch_size = config.batch_size
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False).tolist()
+
+
+def _sentence_transformer_settings(model_name: str, cache_folder: str) -> Tuple[int, bool]:
+    """
+    Maximum sequence length and whether the embeddings are L2-normalized, read from the
+    sentence-transformers configuration of the model (sentence_bert_config.json and modules.json).
+    """
+    def load(filename: str):
+        if os.path.isdir(model_name):
+            path = os.path.join(model_name, filename)
+        else:
+            from huggingface_hub import hf_hub_download
+            path = hf_hub_download(model_name, filename, cache_dir=cache_folder)
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    try:
+        max_seq_length = int(load("sentence_bert_config.json").get("max_seq_length") or DEFAULT_MAX_SEQ_LENGTH)
+        normalize = any(module.get("type", "").endswith(".Normalize") for module in load("modules.json"))
+    except Exception as e:
+        logger.warning(f"Could not read the sentence-transformers config of {model_name} ({e}), "
+                       f"using max_seq_length={DEFAULT_MAX_SEQ_LENGTH} and normalize={DEFAULT_NORMALIZE}.")
+        return DEFAULT_MAX_SEQ_LENGTH, DEFAULT_NORMALIZE
+    return max_seq_length, normalize
+
+
+def _mean_pooling(token_embeddings: np.ndarray, attention_mask: np.ndarray, normalize: bool) -> np.ndarray:
+    """
+    Mean of the token embeddings without padding tokens, optionally L2-normalized like the Normalize
+    module of sentence-transformers.
+    """
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled
+
+
+class _OnnxEncoder:
+    """
+    Runs an exported sentence transformer with onnxruntime, optionally on a dynamically int8-quantized
+    copy of the model. Truncation, mean pooling and normalization follow the sentence-transformers
+    configuration of the model, so the vectors match those of the torch backend.
+    """
+
+    def __init__(self, config: EmbeddingEngineConfig) -> None:
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        if not config.onnx_path:
+            raise ValueError("EMBEDDING_ONNX_PATH muss für das ONNX Backend gesetzt sein")
+
+        model_path = config.onnx_path
+        if config.quantize:
+            model_path = self._quantized_model(config.onnx_path)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = config.threads_per_worker()
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(config.model_name, cache_dir=config.cache_folder)
+        self.max_seq_length, self.normalize = _sentence_transformer_settings(config.model_name, config.cache_folder)
+        self.batch_size = config.batch_size
+
+    @staticmethod
+    def _quantized_model(onnx_path: str) -> str:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+        if not os.path.exists(quantized_path):
+            logger.info(f"Quantizing {onnx_path} to {quantized_path}.")
+            quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            tokens = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+            inputs = {name: value.astype(np.int64) for name, value in tokens.items() if name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+            vectors.extend(_mean_pooling(token_embeddings, tokens["attention_mask"], self.normalize).tolist())
+        return vectors
+
+
+def _create_encoder(config: EmbeddingEngineConfig):
+    if config.backend == "onnx":
+        return _OnnxEncoder(config)
+    if config.backend == "torch":
+        return _TorchEncoder(config)
+    raise ValueError(f"Unbekanntes Embedding Backend: {config.backend}")
+
+
+# Encoder der Worker-Prozesse, wird einmal pro Prozess im Initializer geladen
+_worker_encoder = None
+
+
+def _init_worker(config: EmbeddingEngineConfig):
+    global _worker_encoder
+    _worker_encoder = _create_encoder(config)
+
+
+def _worker_encode(texts: List[str]) -> List[List[float]]:
+    if _worker_encoder is None:
+        raise RuntimeError("Embedding Worker wurde nicht initialisiert")
+    return _worker_encoder.encode(texts)
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Embedding backend for bulk ingestion with tunable batch size, an optional process pool across
+    CPU cores and an optional ONNX / int8-quantized model. The throughput of every
+    embed_documents call is recorded and logged.
+    """
+
+    def __init__(self, config: EmbeddingEngineConfig, history: int = 50) -> None:
+        self.config = config
+        self.runs = deque(maxlen=history)
+        self._encoder = _create_encoder(config)
+        self._pool = None
+        if config.num_workers > 0:
+            # "spawn", da torch nach einem fork in den Kindprozessen hängen bleiben kann
+            self._pool = ProcessPoolExecutor(
+                max_workers=config.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(config,),
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        if self._pool and len(texts) > self.config.batch_size:
+            # Texte auf die Worker verteilen, Reihenfolge bleibt durch map erhalten
+            slices = [texts[i:i + self.config.batch_size] for i in range(0, len(texts), self.config.batch_size)]
+            vectors = [vector for part in self._pool.map(_worker_encode, slices) for vector in part]
+        else:
+            vectors = self._encoder.encode(texts)
+
+        stats = EmbeddingRunStats(
+            backend=self.config.backend,
+            texts=len(texts),
+            seconds=time.perf_counter() - start,
+            batch_size=self.config.batch_size,
+            num_workers=self.config.num_workers,
+        )
+        self.runs.append(stats)
+        logger.info(f"Embedded {stats.texts} chunks in {stats.seconds:.2f}s ({stats.chunks_per_second:.1f} chunks/s, "
+                    f"backend={stats.backend}, batch_size={stats.batch_size}, workers={stats.num_workers}).")
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encoder.encode([text])[0]
+
+    def stats(self) -> dict:
+        total_texts = sum(run.texts for run in self.runs)
+        total_seconds = sum(run.seconds for run in self.runs)
+        return {
+            "backend": self.config.backend,
+            "batch_size": self.config.batch_size,
+            "num_workers": self.config.num_workers,
+            "threads_per_worker": self.config.threads_per_worker(),
+            "quantized": self.config.backend == "onnx" and self.config.quantize,
+            "chunks_per_second": total_texts / total_seconds if total_seconds > 0 else 0.0,
+            "runs": [run.to_dict() for run in self.runs],
+        }
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,410 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+# Mindestanzahl Zeilen im Journal, bevor eine Collection in einen neuen Snapshot kompaktiert wird
+_COMPACT_MIN_ROWS = 4096
+
+
+def _matches(metadata: Optional[dict], where: Optional[dict]) -> bool:
+    """
+    Evaluate a Chroma style metadata filter ($and, $or, $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte).
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, part) for part in condition):
+                return False
+        else:
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            value = metadata.get(key)
+            for operator, expected in condition.items():
+                if operator == "$eq" and value != expected:
+                    return False
+                if operator == "$ne" and value == expected:
+                    return False
+                if operator == "$in" and value not in expected:
+                    return False
+                if operator == "$nin" and value in expected:
+                    return False
+                if operator in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if operator == "$gt" and not value > expected:
+                        return False
+                    if operator == "$gte" and not value >= expected:
+                        return False
+                    if operator == "$lt" and not value < expected:
+                        return False
+                    if operator == "$lte" and not value <= expected:
+                        return False
+    return True
+
+
+def _matches_document(document: Optional[str], where_document: Optional[dict]) -> bool:
+    if not where_document:
+        return True
+    document = document or ""
+    if "$contains" in where_document:
+        return where_document["$contains"] in document
+    if "$not_contains" in where_document:
+        return where_document["$not_contains"] not in document
+    if "$and" in where_document:
+        return all(_matches_document(document, part) for part in where_document["$and"])
+    if "$or" in where_document:
+        return any(_matches_document(document, part) for part in where_document["$or"])
+    return True
+
+
+class FlatCollection:
+    """
+    Collection of the flat vector store. Queries are exact (brute force) nearest neighbour searches,
+    which is fast enough for small collections and needs no index build.
+
+    Every collection is stored as a snapshot (ids, documents and metadatas as JSON, the vectors as
+    float32 .npy file that is memory-mapped when loaded) plus an append-only journal of the changes
+    since the snapshot. Writes only append to the journal, so ingesting in batches costs time
+    proportional to the batch and not to the collection size. Once the journal holds more rows than
+    the snapshot it is compacted into a new snapshot.
+
+    Implements the subset of the chromadb Collection API used by langchain_chroma and the chatbot.
+    """
+
+    def __init__(self, directory: str, name: str, metadata: Optional[dict] = None) -> None:
+        self.directory = directory
+        self.name = name
+        self.metadata = metadata
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[dict]] = []
+        # Vektoren der Collection: Memory-Map des Snapshots, nach dem ersten Schreiben ein wachsender Puffer
+        self._vectors: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self._buffer: Optional[np.ndarray] = None
+        self._generation = 0
+        self._snapshot_rows = 0
+        self._journal_rows = 0
+        self._load()
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self.directory, "records.json")
+
+    def _vectors_file(self, generation: int) -> str:
+        return "vectors.npy" if generation == 0 else f"vectors.{generation}.npy"
+
+    @property
+    def _journal_path(self) -> str:
+        return os.path.join(self.directory, f"journal.{self._generation}.jsonl")
+
+    @property
+    def _journal_vectors_path(self) -> str:
+        return os.path.join(self.directory, f"journal.{self._generation}.f32")
+
+    @property
+    def _dim(self) -> int:
+        return self._vectors.shape[1]
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._records_path):
+            with open(self._records_path, encoding="utf-8") as f:
+                records = json.load(f)
+            self.metadata = records.get("metadata") or self.metadata
+            self._ids = records["ids"]
+            self._documents = records["documents"]
+            self._metadatas = records["metadatas"]
+            self._generation = records.get("generation", 0)
+        vectors_path = os.path.join(self.directory, self._vectors_file(self._generation))
+        if os.path.exists(vectors_path):
+            self._vectors = np.load(vectors_path, mmap_mode="r")
+        self._index = {id_: i for i, id_ in enumerate(self._ids)}
+        self._snapshot_rows = len(self._ids)
+        self._replay_journal()
+
+    def _replay_journal(self):
+        if not os.path.exists(self._journal_path):
+            return
+        with open(self._journal_path, "rb+") as f:
+            valid = 0
+            for line in iter(f.readline, b""):
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    # Unvollständige letzte Zeile nach einem Absturz: der Schreibvorgang gilt als nicht erfolgt,
+                    # die Zeile wird abgeschnitten, damit neue Einträge nicht an sie angehängt werden
+                    logger.warning(f"Dropping incomplete journal entry of collection {self.name}.")
+                    f.truncate(valid)
+                    break
+                valid += len(line)
+                if entry["op"] == "upsert":
+                    vectors = np.fromfile(self._journal_vectors_path, dtype=np.float32, offset=entry["offset"],
+                                          count=len(entry["ids"]) * entry["dim"]).reshape(len(entry["ids"]), entry["dim"])
+                    self._apply_upsert(entry["ids"], vectors, entry["metadatas"], entry["documents"])
+                elif entry["op"] == "delete":
+                    self._apply_delete({self._index[id_] for id_ in entry["ids"] if id_ in self._index})
+                self._journal_rows += len(entry["ids"])
+
+    def _save(self):
+        """
+        Write a new snapshot of the collection and start an empty journal.
+        """
+        # Snapshot unter neuem Namen schreiben und erst mit records.json aktivieren, damit ein Absturz
+        # keine halbe Collection hinterlässt
+        old_files = [os.path.join(self.directory, self._vectors_file(self._generation)), self._journal_path,
+                     self._journal_vectors_path]
+        generation = self._generation + 1
+        if self._ids:
+            vectors_path = os.path.join(self.directory, self._vectors_file(generation))
+            with open(vectors_path + ".tmp", "wb") as f:
+                np.save(f, np.asarray(self._vectors, dtype=np.float32))
+            os.replace(vectors_path + ".tmp", vectors_path)
+        with open(self._records_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"name": self.name, "metadata": self.metadata, "generation": generation, "ids": self._ids,
+                       "documents": self._documents, "metadatas": self._metadatas}, f, ensure_ascii=False)
+        os.replace(self._records_path + ".tmp", self._records_path)
+
+        self._generation = generation
+        self._snapshot_rows = len(self._ids)
+        self._journal_rows = 0
+        for path in old_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _append_journal(self, entry: dict, vectors: Optional[np.ndarray] = None):
+        if vectors is not None:
+            # Erst die Vektoren, dann der Eintrag, der auf sie verweist
+            with open(self._journal_vectors_path, "ab") as f:
+                f.seek(0, os.SEEK_END)
+                entry["offset"] = f.tell()
+                entry["dim"] = vectors.shape[1]
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self._journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        self._journal_rows += len(entry["ids"])
+        # Kompaktieren, sobald das Journal größer als der Snapshot ist (amortisiert konstant pro Zeile)
+        if self._journal_rows > max(_COMPACT_MIN_ROWS, self._snapshot_rows):
+            self._save()
+
+    def _writable_vectors(self, rows: int, dim: int) -> np.ndarray:
+        """
+        Growable buffer with room for rows vectors. The capacity doubles, so appending is amortized O(1) per row.
+        """
+        if self._buffer is None or self._buffer.shape[0] < rows:
+            capacity = max(rows, 2 * (self._buffer.shape[0] if self._buffer is not None else len(self._ids)), 64)
+            buffer = np.zeros((capacity, dim), dtype=np.float32)
+            if self._ids:
+                buffer[:len(self._ids)] = self._vectors[:len(self._ids)]
+            self._buffer = buffer
+        return self._buffer
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def _apply_upsert(self, ids: List[str], vectors: np.ndarray, metadatas: List[Optional[dict]],
+                      documents: List[Optional[str]]):
+        if len(self._ids) and vectors.shape[1] != self._dim:
+            raise ValueError(f"Embedding Dimension {vectors.shape[1]} passt nicht zur Collection ({self._dim})")
+        new_ids = {id_ for id_ in ids if id_ not in self._index}
+        buffer = self._writable_vectors(len(self._ids) + len(new_ids), vectors.shape[1])
+        for id_, vector, metadata, document in zip(ids, vectors, metadatas, documents):
+            if id_ in self._index:
+                i = self._index[id_]
+                self._metadatas[i] = metadata
+                self._documents[i] = document
+            else:
+                i = len(self._ids)
+                self._index[id_] = i
+                self._ids.append(id_)
+                self._metadatas.append(metadata)
+                self._documents.append(document)
+            buffer[i] = vector
+        self._vectors = buffer[:len(self._ids)]
+
+    def _apply_delete(self, remove: Set[int]):
+        keep = [i for i in range(len(self._ids)) if i not in remove]
+        self._ids = [self._ids[i] for i in keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._buffer = np.asarray(self._vectors, dtype=np.float32)[keep]
+        self._vectors = self._buffer
+        self._index = {id_: i for i, id_ in enumerate(self._ids)}
+
+    def upsert(self, ids: List[str], embeddings: Optional[List[List[float]]] = None, metadatas: Optional[List[dict]] = None,
+               documents: Optional[List[str]] = None, **kwargs: Any):
+        if embeddings is None:
+            raise ValueError("Der Flat Vector Store benötigt vorberechnete Embeddings")
+        metadata_list: List[Optional[dict]] = list(metadatas) if metadatas else [None] * len(ids)
+        document_list: List[Optional[str]] = list(documents) if documents else [None] * len(ids)
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+
+        with self._lock:
+            self._apply_upsert(ids, vectors, metadata_list, document_list)
+            self._append_journal({"op": "upsert", "ids": ids, "documents": document_list, "metadatas": metadata_list},
+                                 vectors=vectors)
+
+    add = upsert
+
+    def _select(self, ids: Optional[List[str]], where: Optional[dict], where_document: Optional[dict]) -> List[int]:
+        if ids is not None:
+            positions = [self._index[id_] for id_ in ids if id_ in self._index]
+        else:
+            positions = list(range(len(self._ids)))
+        return [i for i in positions
+                if _matches(self._metadatas[i], where) and _matches_document(self._documents[i], where_document)]
+
+    def _result(self, positions: List[int], include: List[str]) -> Dict[str, Any]:
+        return {
+            "ids": [self._ids[i] for i in positions],
+            "documents": [self._documents[i] for i in positions] if "documents" in include else None,
+            "metadatas": [self._metadatas[i] for i in positions] if "metadatas" in include else None,
+            "embeddings": [self._vectors[i].tolist() for i in positions] if "embeddings" in include else None,
+            "included": include,
+        }
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, where_document: Optional[dict] = None,
+            include: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        include = ["metadatas", "documents"] if include is None else list(include)
+        if isinstance(ids, str):
+            ids = [ids]
+        with self._lock:
+            positions = self._select(ids, where, where_document)
+            positions = positions[offset or 0:]
+            if limit is not None:
+                positions = positions[:limit]
+            return self._result(positions, include)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, where_document: Optional[dict] = None, **kwargs: Any):
+        with self._lock:
+            remove = set(self._select(ids, where, where_document))
+            if not remove:
+                return
+            removed_ids = [self._ids[i] for i in sorted(remove)]
+            self._apply_delete(remove)
+            self._append_journal({"op": "delete", "ids": removed_ids})
+
+    def _distances(self, vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+        space = (self.metadata or {}).get("hnsw:space", "l2")
+        if space == "ip":
+            return 1.0 - vectors @ query
+        if space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+            return 1.0 - (vectors @ query) / np.where(norms == 0, 1.0, norms)
+        # Quadrierte euklidische Distanz wie bei Chroma
+        return np.sum((vectors - query) ** 2, axis=1)
+
+    def query(self, query_embeddings: Optional[List[List[float]]] = None, n_results: int = 10, where: Optional[dict] = None,
+              where_document: Optional[dict] = None, include: Optional[List[str]] = None, query_texts: Any = None,
+              **kwargs: Any) -> Dict[str, Any]:
+        if query_embeddings is None:
+            raise ValueError("Der Flat Vector Store benötigt Query Embeddings")
+        include = ["metadatas", "documents", "distances"] if include is None else list(include)
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": [], "included": include}
+        with self._lock:
+            positions = np.asarray(self._select(None, where, where_document), dtype=np.int64)
+            for query in np.asarray(query_embeddings, dtype=np.float32):
+                if len(positions) == 0:
+                    best, distances = [], []
+                else:
+                    distances = self._distances(np.asarray(self._vectors[positions]), query)
+                    k = min(n_results, len(positions))
+                    order = np.argpartition(distances, k - 1)[:k]
+                    order = order[np.argsort(distances[order])]
+                    best, distances = positions[order].tolist(), distances[order].tolist()
+
+                part = self._result(best, include)
+                result["ids"].append(part["ids"])
+                result["documents"].append(part["documents"])
+                result["metadatas"].append(part["metadatas"])
+                result["embeddings"].append(part["embeddings"])
+                result["distances"].append(distances)
+
+        for key in ("documents", "metadatas", "embeddings", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def modify(self, name: Optional[str] = None, metadata: Optional[dict] = None):
+        with self._lock:
+            if metadata is not None:
+                self.metadata = metadata
+                self._save()
+
+
+@dataclass
+class FlatCollectionInfo:
+    name: str
+
+
+class FlatClient:
+    """
+    Minimal in-process replacement for the chromadb client that stores every collection as a flat
+    (brute force) index in its own directory.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._collections: Dict[str, FlatCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _directory(self, name: str) -> str:
+        if not re.fullmatch(r"[a-zA-Z0-9_-]+", name):
+            raise ValueError(f"Ungültiger Collection Name: {name}")
+        return os.path.join(self.path, name)
+
+    def list_collections(self) -> List[FlatCollectionInfo]:
+        names = sorted(entry for entry in os.listdir(self.path)
+                       if os.path.exists(os.path.join(self.path, entry, "records.json")) or entry in self._collections)
+        return [FlatCollectionInfo(name) for name in names]
+
+    def get_collection(self, name: str, **kwargs: Any) -> FlatCollection:
+        with self._lock:
+            if name not in self._collections:
+                directory = self._directory(name)
+                if not os.path.exists(os.path.join(directory, "records.json")):
+                    raise ValueError(f"Collection {name} does not exist.")
+                self._collections[name] = FlatCollection(directory, name)
+            return self._collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: Optional[dict] = None, **kwargs: Any) -> FlatCollection:
+        with self._lock:
+            if name not in self._collections:
+                collection = FlatCollection(self._directory(name), name, metadata)
+                if not os.path.exists(collection._records_path):
+                    collection._save()
+                self._collections[name] = collection
+            return self._collections[name]
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            directory = self._directory(name)
+            if name not in self._collections and not os.path.exists(directory):
+                raise ValueError(f"Collection {name} does not exist.")
+            self._collections.pop(name, None)
+            shutil.rmtree(directory, ignore_errors=True)
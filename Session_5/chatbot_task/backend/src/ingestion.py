@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+from uuid import uuid4
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class IngestionCancelled(Exception):
+    """
+    Raised inside an ingestion task when the job was cancelled by the user.
+    """
+
+
+class IngestionQueueFull(Exception):
+    """
+    Raised when a new job is submitted while the pending queue is already full.
+    """
+
+
+@dataclass
+class IngestionProgress:
+    """
+    Progress counters of a single ingestion job. Updated by the indexing code while the job runs.
+    """
+    pages_parsed: int = 0
+    chunks_embedded: int = 0
+    chunks_written: int = 0
+    chunks_skipped: int = 0
+    embed_seconds: float = 0.0
+    # Nur bei Bulk Importen: Anzahl Dateien, Ziel-Collections und Fehler pro Datei
+    files_total: int = 0
+    files_parsed: int = 0
+    files_failed: int = 0
+    collections: List[str] = field(default_factory=list)
+    errors: List[dict] = field(default_factory=list)
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_embedded / self.embed_seconds if self.embed_seconds > 0 else 0.0
+
+
+@dataclass
+class IngestionJob:
+    """
+    A single background ingestion job (e.g. one uploaded PDF).
+    """
+    filename: str
+    collection_name: str
+    job_id: str = field(default_factory=lambda: str(uuid4()))
+    status: JobStatus = JobStatus.QUEUED
+    progress: IngestionProgress = field(default_factory=IngestionProgress)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+    def check_cancelled(self):
+        """
+        Raise IngestionCancelled if the job was cancelled. Called by the task between batches.
+        """
+        if self.cancel_event.is_set():
+            raise IngestionCancelled(f"Job {self.job_id} wurde abgebrochen")
+
+    def to_dict(self) -> dict:
+        report = {}
+        if self.progress.files_total:
+            report["files"] = {
+                "total": self.progress.files_total,
+                "parsed": self.progress.files_parsed,
+                "failed": self.progress.files_failed,
+                "collections": list(self.progress.collections),
+                "errors": list(self.progress.errors),
+            }
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "collection_name": self.collection_name,
+            "status": self.status.value,
+            "progress": {
+                "pages_parsed": self.progress.pages_parsed,
+                "chunks_embedded": self.progress.chunks_embedded,
+                "chunks_written": self.progress.chunks_written,
+                "chunks_skipped": self.progress.chunks_skipped,
+                "embed_seconds": self.progress.embed_seconds,
+                "chunks_per_second": self.progress.chunks_per_second,
+            },
+            **report,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionManager:
+    """
+    Runs ingestion tasks (PDF parsing, chunking, embedding, writing to ChromaDB) on a bounded
+    thread pool so the FastAPI event loop is never blocked by indexing.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, max_history: int = 100) -> None:
+        """
+        Args:
+            max_workers (int): Number of jobs that are processed in parallel.
+            max_pending (int): Maximum number of queued or running jobs before new jobs are rejected.
+            max_history (int): Number of finished jobs kept for the status API.
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, task: Callable[[IngestionJob], None], filename: str, collection_name: str) -> IngestionJob:
+        """
+        Queue a new ingestion task.
+
+        Args:
+            task (Callable[[IngestionJob], None]): Function doing the actual work. It receives the job
+                to report progress and to check for cancellation.
+            filename (str): Name of the uploaded file.
+            collection_name (str): Target collection of the job.
+
+        Returns:
+            IngestionJob: The queued job.
+        """
+        job = IngestionJob(filename=filename, collection_name=collection_name)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.is_finished)
+            if pending >= self.max_pending:
+                raise IngestionQueueFull(f"Zu viele laufende Uploads ({pending})")
+            self._prune_history()
+            self._jobs[job.job_id] = job
+
+        self._executor.submit(self._run, task, job)
+        logger.info(f"Ingestion job {job.job_id} for '{filename}' queued.")
+        return job
+
+    def _run(self, task: Callable[[IngestionJob], None], job: IngestionJob):
+        if job.cancel_event.is_set():
+            job.status = JobStatus.CANCELLED
+            job.finished_at = time.time()
+            return
+
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        try:
+            task(job)
+            job.status = JobStatus.COMPLETED
+        except IngestionCancelled:
+            logger.info(f"Ingestion job {job.job_id} cancelled.")
+            job.status = JobStatus.CANCELLED
+        except Exception as e:
+            logger.error(f"Ingestion job {job.job_id} failed: {e}", exc_info=True)
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def _prune_history(self):
+        finished = [j for j in self._jobs.values() if j.is_finished]
+        if len(finished) < self.max_history:
+            return
+        finished.sort(key=lambda j: j.finished_at or 0)
+        for job in finished[:len(finished) - self.max_history + 1]:
+            del self._jobs[job.job_id]
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[IngestionJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Request cancellation of a job. Queued jobs are skipped, running jobs stop at the next batch.
+
+        Returns:
+            Optional[IngestionJob]: The job or None if the id is unknown.
+        """
+        job = self.get(job_id)
+        if job and not job.is_finished:
+            job.cancel_event.set()
+        return job
+
+    def shutdown(self):
+        for job in self.list_jobs():
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
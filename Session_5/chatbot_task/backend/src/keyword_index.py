@@ -0,0 +1,260 @@
+import heapq
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import AbstractSet, Dict, Iterable, List, Optional, Protocol, Sequence, Tuple, runtime_checkable
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_chroma import Chroma
+from src.metrics import RAG_STAGE_SECONDS
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+_STOPWORDS = {
+    "der", "die", "das", "und", "oder", "ein", "eine", "einer", "eines", "einem", "einen", "ist", "sind", "war",
+    "wie", "was", "wer", "wo", "warum", "welche", "welcher", "welches", "mit", "von", "zu", "zum", "zur", "im", "in",
+    "an", "auf", "für", "fuer", "den", "dem", "des", "es", "sich", "nicht", "auch", "als", "bei", "aus", "kann",
+    "the", "a", "and", "or", "is", "are", "was", "what", "how", "why", "of", "to", "in", "on", "for", "with",
+}
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase, fold umlauts and split text into word tokens without stopwords.
+    """
+    tokens = re.findall(r"\w+", text.lower().translate(_UMLAUTS))
+    return [token for token in tokens if token not in _STOPWORDS and (len(token) > 1 or token.isdigit())]
+
+
+class KeywordIndex:
+    """
+    Persistent BM25 inverted index with one posting list per (collection, term), stored in SQLite.
+
+    Query terms without exact postings (e.g. the first part of German compound words) are expanded
+    to the indexed terms that start with them.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs (collection TEXT NOT NULL, chunk_id TEXT NOT NULL, length INTEGER NOT NULL, "
+            "PRIMARY KEY (collection, chunk_id));"
+            "CREATE TABLE IF NOT EXISTS postings (collection TEXT NOT NULL, term TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+            "tf INTEGER NOT NULL, PRIMARY KEY (collection, term, chunk_id));"
+            "CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (collection, chunk_id);"
+        )
+        self._conn.commit()
+
+    def add(self, collection: str, chunk_ids: List[str], texts: List[str]):
+        """
+        Add (or replace) chunks of a collection in the index.
+        """
+        docs, postings = [], []
+        for chunk_id, text in zip(chunk_ids, texts):
+            tokens = tokenize(text)
+            docs.append((collection, chunk_id, len(tokens)))
+            postings.extend((collection, term, chunk_id, tf) for term, tf in Counter(tokens).items())
+
+        with self._lock:
+            self._delete(collection, chunk_ids)
+            self._conn.executemany("INSERT INTO docs (collection, chunk_id, length) VALUES (?, ?, ?)", docs)
+            self._conn.executemany("INSERT INTO postings (collection, term, chunk_id, tf) VALUES (?, ?, ?, ?)", postings)
+            self._conn.commit()
+
+    def _delete(self, collection: str, chunk_ids: List[str]):
+        rows = [(collection, chunk_id) for chunk_id in chunk_ids]
+        self._conn.executemany("DELETE FROM docs WHERE collection = ? AND chunk_id = ?", rows)
+        self._conn.executemany("DELETE FROM postings WHERE collection = ? AND chunk_id = ?", rows)
+
+    def delete(self, collection: str, chunk_ids: List[str]):
+        with self._lock:
+            self._delete(collection, chunk_ids)
+            self._conn.commit()
+
+    def delete_collection(self, collection: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM docs WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM postings WHERE collection = ?", (collection,))
+            self._conn.commit()
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def _expand_terms(self, collection: str, terms: Iterable[str]) -> Dict[str, List[str]]:
+        expanded = {}
+        for term in terms:
+            exists = self._conn.execute(
+                "SELECT 1 FROM postings WHERE collection = ? AND term = ? LIMIT 1", (collection, term)).fetchone()
+            if exists or len(term) < 5:
+                expanded[term] = [term]
+                continue
+            # Komposita mit dem Begriff als Anfang (z.B. "regressionsanalyse") finden. Als Bereichsabfrage
+            # statt LIKE, damit der Index (collection, term) genutzt wird
+            upper = term[:-1] + chr(ord(term[-1]) + 1)
+            rows = self._conn.execute(
+                "SELECT DISTINCT term FROM postings WHERE collection = ? AND term >= ? AND term < ? LIMIT 20",
+                (collection, term, upper)).fetchall()
+            expanded[term] = [row[0] for row in rows]
+        return expanded
+
+    def search(self, collection: str, query: str, k: int = 20,
+               chunk_ids: Optional[AbstractSet[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Return the ids and BM25 scores of the k best matching chunks of a collection.
+
+        Args:
+            chunk_ids (Optional[AbstractSet[str]]): Only rank these chunks, e.g. the chunks matching a
+                metadata filter. The collection statistics (idf, average length) are not restricted.
+        """
+        if chunk_ids is not None and not chunk_ids:
+            return []
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+
+        scores: Dict[str, float] = defaultdict(float)
+        with self._lock:
+            n_docs, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM docs WHERE collection = ?", (collection,)).fetchone()
+            if not n_docs:
+                return []
+
+            for index_terms in self._expand_terms(collection, query_terms).values():
+                for term in index_terms:
+                    # Dokumentlängen nur für die Chunks der Posting-Liste laden (Primärschlüssel von docs)
+                    postings = self._conn.execute(
+                        "SELECT p.chunk_id, p.tf, d.length FROM postings p "
+                        "JOIN docs d ON d.collection = p.collection AND d.chunk_id = p.chunk_id "
+                        "WHERE p.collection = ? AND p.term = ?", (collection, term)).fetchall()
+                    if not postings:
+                        continue
+
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for chunk_id, tf, length in postings:
+                        if chunk_ids is not None and chunk_id not in chunk_ids:
+                            continue
+                        norm = self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+                        scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def filtered_chunk_ids(vector_db: Chroma, filter: Optional[dict]) -> Optional[AbstractSet[str]]:
+    """
+    Ids of the chunks matching a Chroma metadata filter, None without filter. Passed to KeywordIndex.search
+    so the keyword ranking is restricted before the top k is taken.
+    """
+    if not filter:
+        return None
+    return set(vector_db.get(where=filter, include=[])["ids"])
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several rankings of the same items with reciprocal rank fusion (sum of 1 / (rrf_k + rank)).
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] += 1.0 / (rrf_k + rank + 1)
+    return sorted(scores.items(), key=itemgetter(1), reverse=True)
+
+
+@runtime_checkable
+class Reranker(Protocol):
+    """
+    Scores (query, text) pairs, e.g. a sentence-transformers CrossEncoder.
+    """
+
+    def predict(self, sentences: List[Tuple[str, str]]) -> Sequence[float]:
+        ...
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that combines vector search in Chroma with BM25 keyword search and fuses both rankings
+    with reciprocal rank fusion. Optionally the fused candidates are reranked with a cross-encoder.
+
+    Without a keyword index only the vector search is used. A Chroma metadata filter
+    (e.g. {"source": "script.pdf"}) can be passed per call as keyword argument.
+    """
+
+    vector_db: Chroma
+    keyword_index: Optional[KeywordIndex] = None
+    collection_name: str
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+    reranker: Optional[Reranker] = None
+
+    def _keyword_documents(self, query: str, filter: Optional[dict] = None) -> List[Document]:
+        if self.keyword_index is None:
+            return []
+        hits = self.keyword_index.search(self.collection_name, query, k=self.fetch_k,
+                                         chunk_ids=filtered_chunk_ids(self.vector_db, filter))
+        if not hits:
+            return []
+        ids = [chunk_id for chunk_id, _ in hits]
+        result = self.vector_db.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: Document(page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        }
+        return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+    def _vector_documents(self, query: str, k: int, filter: Optional[dict] = None) -> List[Document]:
+        if self.vector_db.embeddings is None:
+            with RAG_STAGE_SECONDS.labels("vector_search").time():
+                return self.vector_db.similarity_search(query, k=k, filter=filter)
+
+        with RAG_STAGE_SECONDS.labels("query_embedding").time():
+            embedding = self.vector_db.embeddings.embed_query(query)
+        with RAG_STAGE_SECONDS.labels("vector_search").time():
+            return self.vector_db.similarity_search_by_vector(embedding, k=k, filter=filter)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                filter: Optional[dict] = None) -> List[Document]:
+        if self.keyword_index is None:
+            return self._vector_documents(query, k=self.k, filter=filter)
+
+        vector_docs = self._vector_documents(query, k=self.fetch_k, filter=filter)
+        with RAG_STAGE_SECONDS.labels("keyword_search").time():
+            keyword_docs = self._keyword_documents(query, filter=filter)
+
+        # Chunks werden über ihren Text identifiziert, da die Vektorsuche keine IDs liefert
+        documents = {doc.page_content: doc for doc in keyword_docs + vector_docs}
+        fused = reciprocal_rank_fusion([
+            [doc.page_content for doc in vector_docs],
+            [doc.page_content for doc in keyword_docs],
+        ], rrf_k=self.rrf_k)
+        candidates = [documents[text] for text, _ in fused]
+
+        if self.reranker is not None and candidates:
+            with RAG_STAGE_SECONDS.labels("rerank").time():
+                scores = self.reranker.predict([(query, doc.page_content) for doc in candidates[:self.fetch_k]])
+            candidates = [doc for _, doc in sorted(zip(scores, candidates[:self.fetch_k]), key=lambda pair: -pair[0])]
+
+        return candidates[:self.k]
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_ollama import ChatOllama
+from ollama import ResponseError
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+ROLE_CHAT = "chat"
+ROLE_QUIZ = "quiz"
+ROLES = (ROLE_CHAT, ROLE_QUIZ)
+
+
+class LLMUnavailable(Exception):
+    """
+    Raised when no healthy endpoint serves the requested role.
+    """
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """
+    Whether an error of an LLM call means the endpoint is down or misconfigured (and not that the
+    request itself was invalid).
+    """
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return True
+    # 404: Modell fehlt auf dem Endpunkt, 5xx: Ollama selbst fehlerhaft
+    return isinstance(error, ResponseError) and (error.status_code == 404 or error.status_code >= 500)
+
+
+@dataclass
+class LLMEndpoint:
+    """
+    One LLM backend (an Ollama server and model) of the pool with its own concurrency limit.
+    """
+    name: str
+    llm: BaseChatModel
+    # Variante mit JSON Ausgabe für die Quiz Generierung
+    json_llm: BaseChatModel
+    roles: List[str] = field(default_factory=lambda: list(ROLES))
+    max_in_flight: int = 2
+    base_url: Optional[str] = None
+    model: Optional[str] = None
+    healthy: bool = True
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
+    last_check: Optional[float] = None
+    # Zeitpunkt (time.monotonic) der letzten Markierung als nicht erreichbar
+    failed_at: Optional[float] = None
+
+    @classmethod
+    def ollama(cls, base_url: str, model: str, name: Optional[str] = None, roles: Optional[Iterable[str]] = None,
+               max_in_flight: int = 2) -> "LLMEndpoint":
+        return cls(
+            name=name or f"{model}@{base_url}",
+            llm=ChatOllama(model=model, base_url=base_url),
+            json_llm=ChatOllama(model=model, base_url=base_url, format="json"),
+            roles=list(roles or ROLES),
+            max_in_flight=max_in_flight,
+            base_url=base_url,
+            model=model,
+        )
+
+    @property
+    def load(self) -> float:
+        return self.in_flight / self.max_in_flight
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "model": self.model,
+            "roles": self.roles,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+        }
+
+
+def parse_endpoints(config: str, default_max_in_flight: int = 2) -> List[LLMEndpoint]:
+    """
+    Create Ollama endpoints from a JSON list like
+    [{"url": "http://ollama:11434", "model": "llama3.2", "roles": ["chat"], "max_in_flight": 2}].
+    "roles" defaults to all roles, "max_in_flight" to default_max_in_flight.
+    """
+    entries = json.loads(config)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("LLM_ENDPOINTS must be a non-empty JSON list")
+    endpoints = []
+    for entry in entries:
+        roles = entry.get("roles") or list(ROLES)
+        unknown = set(roles) - set(ROLES)
+        if unknown:
+            raise ValueError(f"Unknown LLM endpoint roles {sorted(unknown)}, expected {list(ROLES)}")
+        endpoints.append(LLMEndpoint.ollama(entry["url"], entry["model"], name=entry.get("name"), roles=roles,
+                                            max_in_flight=int(entry.get("max_in_flight", default_max_in_flight))))
+    return endpoints
+
+
+class LLMPool:
+    """
+    Pool of LLM endpoints. Every request is routed to the healthy endpoint of its role with the lowest
+    load (running requests relative to the limit of the endpoint). If all endpoints of the role are
+    busy, the request waits for the next free slot.
+
+    Endpoints are marked unhealthy when a call fails with a connection error and by the periodic
+    health check (run_health_checks), which also marks them healthy again once they respond. Without
+    health checks, an unhealthy endpoint is tried again by the next request after retry_after seconds.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, endpoints: List[LLMEndpoint], retry_after: float = 30.0) -> None:
+        """
+        Args:
+            endpoints (List[LLMEndpoint]): Endpoints of the pool, every role needs at least one.
+            retry_after (float): Seconds after which an unhealthy endpoint is tried again.
+        """
+        names = [endpoint.name for endpoint in endpoints]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate LLM endpoint names: {names}")
+        missing = [role for role in ROLES if not any(role in endpoint.roles for endpoint in endpoints)]
+        if missing:
+            raise ValueError(f"No LLM endpoint for the roles {missing}")
+        self.endpoints = endpoints
+        self.retry_after = retry_after
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {role: deque() for role in ROLES}
+
+    def for_role(self, role: str) -> List[LLMEndpoint]:
+        return [endpoint for endpoint in self.endpoints if role in endpoint.roles]
+
+    def capacity(self, role: Optional[str] = None) -> int:
+        endpoints = self.for_role(role) if role else self.endpoints
+        return sum(endpoint.max_in_flight for endpoint in endpoints)
+
+    def shares_endpoints(self, role: str, other: str) -> bool:
+        return any(other in endpoint.roles for endpoint in self.for_role(role))
+
+    def _is_available(self, endpoint: LLMEndpoint) -> bool:
+        """
+        Whether an endpoint is healthy. An unhealthy endpoint is re-admitted once retry_after has passed,
+        if the next request fails as well it is marked unhealthy again.
+        """
+        if not endpoint.healthy and endpoint.failed_at is not None \
+                and time.monotonic() - endpoint.failed_at >= self.retry_after:
+            logger.info(f"LLM endpoint {endpoint.name} is tried again after {self.retry_after:.0f}s.")
+            endpoint.healthy = True
+        return endpoint.healthy
+
+    def _select(self, role: str) -> Optional[LLMEndpoint]:
+        candidates = [endpoint for endpoint in self.for_role(role)
+                      if self._is_available(endpoint) and endpoint.in_flight < endpoint.max_in_flight]
+        if not candidates:
+            return None
+        # Geringste Auslastung, bei Gleichstand der Endpunkt mit den wenigsten Anfragen
+        return min(candidates, key=lambda endpoint: (endpoint.load, endpoint.requests))
+
+    @asynccontextmanager
+    async def endpoint(self, role: str) -> AsyncIterator[LLMEndpoint]:
+        """
+        Reserve a slot on the least-loaded healthy endpoint of a role while the body runs.
+
+        Raises:
+            LLMUnavailable: If no endpoint of the role is healthy.
+        """
+        endpoint = await self._acquire(role)
+        try:
+            yield endpoint
+        finally:
+            endpoint.in_flight -= 1
+            self._wake(endpoint.roles)
+
+    async def _acquire(self, role: str) -> LLMEndpoint:
+        waited = False
+        while True:
+            if not any([self._is_available(endpoint) for endpoint in self.for_role(role)]):
+                if waited:
+                    self._wake([role])
+                raise LLMUnavailable(f"Kein erreichbarer LLM Endpunkt für {role}")
+            # Ohne Wartezeit nur, wenn niemand vor dieser Anfrage wartet
+            endpoint = self._select(role) if waited or not self._waiters[role] else None
+            if endpoint is not None:
+                endpoint.in_flight += 1
+                endpoint.requests += 1
+                if waited:
+                    self._wake([role])
+                return endpoint
+
+            future = asyncio.get_running_loop().create_future()
+            # Nach dem Aufwecken bleibt die Anfrage vorne in der Warteschlange
+            if waited:
+                self._waiters[role].appendleft(future)
+            else:
+                self._waiters[role].append(future)
+            waited = True
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._wake([role])
+                raise
+            finally:
+                if future in self._waiters[role]:
+                    self._waiters[role].remove(future)
+
+    def _wake(self, roles: Iterable[str]):
+        # Den ältesten Wartenden jeder Rolle wecken, er prüft die Endpunkte erneut
+        for role in roles:
+            while self._waiters[role]:
+                future = self._waiters[role].popleft()
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+    def mark_failed(self, endpoint: LLMEndpoint, error: BaseException):
+        endpoint.failures += 1
+        endpoint.last_error = f"{type(error).__name__}: {error}"
+        if endpoint.healthy:
+            logger.warning(f"LLM endpoint {endpoint.name} marked unhealthy: {endpoint.last_error}")
+        endpoint.healthy = False
+        endpoint.failed_at = time.monotonic()
+        # Wartende Anfragen auf andere Endpunkte umleiten oder abbrechen
+        self._wake(endpoint.roles)
+
+    async def check_health(self, client: httpx.AsyncClient):
+        """
+        Check every Ollama endpoint: it must respond to /api/tags and serve its model.
+        """
+        async def check(endpoint: LLMEndpoint, base_url: str):
+            try:
+                response = await client.get(f"{base_url.rstrip('/')}/api/tags")
+                response.raise_for_status()
+                models = {model["name"] for model in response.json().get("models", [])}
+                if endpoint.model not in models and f"{endpoint.model}:latest" not in models:
+                    raise LookupError(f"Modell {endpoint.model} nicht vorhanden")
+            except Exception as e:
+                self.mark_failed(endpoint, e)
+            else:
+                if not endpoint.healthy:
+                    logger.info(f"LLM endpoint {endpoint.name} is healthy again.")
+                endpoint.healthy = True
+                self._wake(endpoint.roles)
+            endpoint.last_check = time.time()
+
+        await asyncio.gather(*(check(endpoint, endpoint.base_url) for endpoint in self.endpoints if endpoint.base_url))
+
+    async def run_health_checks(self, interval: float = 10.0, timeout: float = 5.0):
+        """
+        Check the health of all endpoints every interval seconds until cancelled.
+        """
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            while True:
+                await self.check_health(client)
+                await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "roles": {role: {"capacity": self.capacity(role),
+                             "healthy_endpoints": sum(endpoint.healthy for endpoint in self.for_role(role)),
+                             "waiting": len(self._waiters[role])} for role in ROLES},
+            "endpoints": [endpoint.to_dict() for endpoint in self.endpoints],
+        }
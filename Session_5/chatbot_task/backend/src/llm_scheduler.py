@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from src.metrics import LLM_QUEUE_WAIT_SECONDS, LLM_REQUESTS_REJECTED
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+
+class Priority(IntEnum):
+    """
+    Priority of an LLM request. Lower values are served first.
+    """
+    INTERACTIVE = 0
+    BATCH = 1
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+
+class LLMOverloaded(Exception):
+    """
+    Raised when the scheduler rejects an LLM request because its queue is full or the request
+    waited longer than the queue timeout.
+    """
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class _PriorityStats:
+    admitted: int = 0
+    rejected: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+class LLMScheduler:
+    """
+    Admission control for the shared LLM backend. At most max_in_flight requests run at the same
+    time, waiting requests are served strictly by priority (interactive chat before batch jobs like
+    the quiz generation) and in arrival order within a priority.
+
+    Running requests are not preempted, so batch requests can only use batch_max_in_flight slots.
+    The remaining slots stay free for interactive requests. When a queue is full or a request waited
+    longer than the queue timeout of its priority, the request is rejected with LLMOverloaded.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, max_in_flight: int = 2, batch_max_in_flight: Optional[int] = None,
+                 max_queued: Optional[Dict[Priority, int]] = None,
+                 queue_timeout: Optional[Dict[Priority, float]] = None) -> None:
+        """
+        Args:
+            max_in_flight (int): Maximum number of concurrent LLM requests.
+            batch_max_in_flight (Optional[int]): Maximum number of concurrent batch requests. Defaults to
+                max_in_flight - 1 (at least 1), so one slot stays free for interactive requests.
+            max_queued (Optional[Dict[Priority, int]]): Maximum number of waiting requests per priority,
+                0 for no limit.
+            queue_timeout (Optional[Dict[Priority, float]]): Maximum waiting time in seconds per priority,
+                0 for no limit.
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        if batch_max_in_flight is None:
+            batch_max_in_flight = max(1, self.max_in_flight - 1)
+        self.batch_max_in_flight = max(1, min(batch_max_in_flight, self.max_in_flight))
+        self.max_queued = {priority: (max_queued or {}).get(priority, 0) for priority in Priority}
+        self.queue_timeout = {priority: (queue_timeout or {}).get(priority, 0.0) for priority in Priority}
+
+        self._queues: Dict[Priority, Deque[_Waiter]] = {priority: deque() for priority in Priority}
+        self._in_flight: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self._stats: Dict[Priority, _PriorityStats] = {priority: _PriorityStats() for priority in Priority}
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority) -> AsyncIterator[None]:
+        """
+        Wait for a free slot and hold it while the body runs.
+
+        Raises:
+            LLMOverloaded: If the request was rejected.
+        """
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    async def acquire(self, priority: Priority):
+        start = time.perf_counter()
+        if self._can_start(priority) and not any(self._queues[p] for p in Priority if p <= priority):
+            self._start(priority, 0.0)
+            return
+
+        queue = self._queues[priority]
+        if self.max_queued[priority] and len(queue) >= self.max_queued[priority]:
+            self._reject(priority, "queue_full")
+            raise LLMOverloaded(f"Zu viele wartende LLM Anfragen ({priority.label}: {len(queue)})")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future())
+        queue.append(waiter)
+        timeout = self.queue_timeout[priority] or None
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            self._abandon(priority, waiter)
+            self._reject(priority, "timeout")
+            raise LLMOverloaded(f"LLM Anfrage hat {time.perf_counter() - start:.1f}s auf einen freien Platz gewartet "
+                                f"({priority.label})") from None
+        except asyncio.CancelledError:
+            self._abandon(priority, waiter)
+            raise
+
+    def release(self, priority: Priority):
+        self._in_flight[priority] -= 1
+        self._dispatch()
+
+    def _can_start(self, priority: Priority) -> bool:
+        if sum(self._in_flight.values()) >= self.max_in_flight:
+            return False
+        return priority != Priority.BATCH or self._in_flight[Priority.BATCH] < self.batch_max_in_flight
+
+    def _start(self, priority: Priority, wait_seconds: float):
+        self._in_flight[priority] += 1
+        stats = self._stats[priority]
+        stats.admitted += 1
+        stats.wait_seconds += wait_seconds
+        stats.max_wait_seconds = max(stats.max_wait_seconds, wait_seconds)
+        LLM_QUEUE_WAIT_SECONDS.labels(priority.label).observe(wait_seconds)
+
+    def _dispatch(self):
+        # Höhere Priorität zuerst; Batch Anfragen nur, solange ihr Limit nicht erreicht ist
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and self._can_start(priority):
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    continue
+                self._start(priority, time.perf_counter() - waiter.enqueued_at)
+                waiter.future.set_result(None)
+
+    def _abandon(self, priority: Priority, waiter: _Waiter):
+        """
+        Clean up after a waiting request timed out or was cancelled (e.g. the client disconnected).
+        """
+        if waiter in self._queues[priority]:
+            self._queues[priority].remove(waiter)
+        elif waiter.future.done() and not waiter.future.cancelled():
+            # Der Platz wurde gleichzeitig mit dem Abbruch vergeben
+            self.release(priority)
+
+    def _reject(self, priority: Priority, reason: str):
+        self._stats[priority].rejected += 1
+        LLM_REQUESTS_REJECTED.labels(priority.label, reason).inc()
+        logger.warning(f"Rejected {priority.label} LLM request ({reason}).")
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "batch_max_in_flight": self.batch_max_in_flight,
+            "priorities": {
+                priority.label: {
+                    "queued": len(self._queues[priority]),
+                    "in_flight": self._in_flight[priority],
+                    "admitted": stats.admitted,
+                    "rejected": stats.rejected,
+                    "mean_wait_seconds": round(stats.wait_seconds / stats.admitted, 4) if stats.admitted else 0.0,
+                    "max_wait_seconds": round(stats.max_wait_seconds, 4),
+                    "max_queued": self.max_queued[priority],
+                    "queue_timeout": self.queue_timeout[priority],
+                }
+                for priority, stats in self._stats.items()
+            },
+        }
@@ -0,0 +1,117 @@
+import contextvars
+import time
+from typing import Callable, Dict, Optional, Protocol
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# Buckets von 5 ms bis 2 min, passend für Suche (ms) bis LLM Generierung (s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+RAG_STAGE_SECONDS = Histogram(
+    "chatbot_rag_stage_seconds", "Duration of the stages of a chat answer", ["stage"], buckets=LATENCY_BUCKETS)
+INGESTION_STAGE_SECONDS = Histogram(
+    "chatbot_ingestion_stage_seconds", "Duration of the stages of indexing a PDF", ["stage"], buckets=LATENCY_BUCKETS)
+QUIZ_STAGE_SECONDS = Histogram(
+    "chatbot_quiz_stage_seconds", "Duration of the stages of the quiz generation", ["stage"], buckets=LATENCY_BUCKETS)
+
+LLM_TOKENS_PER_SECOND = Histogram(
+    "chatbot_llm_tokens_per_second", "Generation speed of the LLM per answer", ["pipeline"],
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 200))
+LLM_TOKENS = Counter("chatbot_llm_tokens", "Tokens generated by the LLM", ["pipeline"])
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "chatbot_llm_queue_wait_seconds", "Time LLM requests wait for a slot of the scheduler", ["priority"], buckets=LATENCY_BUCKETS)
+LLM_REQUESTS_REJECTED = Counter(
+    "chatbot_llm_requests_rejected", "LLM requests rejected by the scheduler because of overload", ["priority", "reason"])
+CHUNKS_INDEXED = Counter("chatbot_chunks_indexed", "Chunks embedded and written to the vector store")
+CHUNKS_SKIPPED = Counter("chatbot_chunks_skipped", "Chunks skipped during indexing because they were already indexed")
+
+# Zeitpunkte innerhalb einer Chat Anfrage, die von den Schritten der RAG Chain gesetzt werden
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> Dict[str, float]:
+    """
+    Start collecting time points of the current request. The dict is shared with the threads the
+    chain steps run in, because they run in a copy of the current context.
+    """
+    timings = {"start": time.perf_counter()}
+    _request_timings.set(timings)
+    return timings
+
+
+def mark(name: str):
+    """
+    Record a time point of the current request, if timings are collected.
+    """
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = time.perf_counter()
+
+
+def observe_generation(pipeline: str, tokens: int, seconds: float):
+    LLM_TOKENS.labels(pipeline).inc(tokens)
+    if seconds > 0 and tokens > 0:
+        LLM_TOKENS_PER_SECOND.labels(pipeline).observe(tokens / seconds)
+
+
+class ChatbotStats(Protocol):
+    """
+    Statistics of the chatbot read by ChatbotStatsCollector.
+    """
+
+    def get_answer_cache_stats(self) -> Optional[dict]: ...
+
+    def get_embedding_cache_stats(self) -> Optional[dict]: ...
+
+    def get_llm_scheduler_stats(self) -> dict: ...
+
+    def get_llm_pool_stats(self) -> dict: ...
+
+    def get_quiz_stats(self) -> dict: ...
+
+
+class ChatbotStatsCollector(Collector):
+    """
+    Export the counters of the caches, the LLM scheduler and endpoints and the quiz generation of the
+    chatbot as gauges at scrape time.
+    """
+
+    def __init__(self, get_chatbot: Callable[[], Optional[ChatbotStats]]) -> None:
+        self.get_chatbot = get_chatbot
+
+    def collect(self):
+        chatbot = self.get_chatbot()
+        if chatbot is None:
+            return
+
+        sources = {
+            "answer_cache": chatbot.get_answer_cache_stats(),
+            "embedding_cache": chatbot.get_embedding_cache_stats(),
+        }
+        for cache, stats in sources.items():
+            if not stats:
+                continue
+            for key in ("hits", "semantic_hits", "misses", "entries", "hit_rate"):
+                if key in stats:
+                    yield GaugeMetricFamily(f"chatbot_{cache}_{key}", f"{key} of the {cache.replace('_', ' ')}", value=stats[key])
+
+        scheduler = chatbot.get_llm_scheduler_stats()
+        for key in ("queued", "in_flight"):
+            gauge = GaugeMetricFamily(f"chatbot_llm_{key}", f"LLM requests {key.replace('_', ' ')} per priority", labels=["priority"])
+            for priority, stats in scheduler["priorities"].items():
+                gauge.add_metric([priority], stats[key])
+            yield gauge
+
+        endpoints = chatbot.get_llm_pool_stats()["endpoints"]
+        for key, description in (("healthy", "1 if the LLM endpoint is healthy"), ("in_flight", "Running requests per LLM endpoint"),
+                                 ("requests", "Requests routed to the LLM endpoint"), ("failures", "Failed requests per LLM endpoint")):
+            gauge = GaugeMetricFamily(f"chatbot_llm_endpoint_{key}", description, labels=["endpoint"])
+            for endpoint in endpoints:
+                gauge.add_metric([endpoint["name"]], float(endpoint[key]))
+            yield gauge
+
+        quiz = chatbot.get_quiz_stats()
+        for key in ("generations", "parse_failures", "retries", "questions", "failed_chunks", "parse_failure_rate"):
+            yield GaugeMetricFamily(f"chatbot_quiz_{key}", f"{key} of the quiz generation", value=quiz[key])
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+def chunk_hash(text: str) -> str:
+    """
+    Content hash of a chunk, used as stable id of the question generated for it.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class QuestionBank:
+    """
+    SQLite store of generated quiz questions, keyed by collection and chunk content hash.
+
+    For every chunk the bank remembers either the parsed question (status "ok") or that the generation
+    failed (status "failed"), so later quiz requests only have to generate questions for new or failed chunks.
+    """
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "collection TEXT NOT NULL, chunk_hash TEXT NOT NULL, status TEXT NOT NULL, question TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+            "PRIMARY KEY (collection, chunk_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, collection: str, chunk_hashes: Iterable[str]) -> Dict[str, dict]:
+        """
+        Look up the stored entries of the given chunks.
+
+        Returns:
+            Dict[str, dict]: Entry ({"status", "question", "attempts"}) per chunk hash that is in the bank.
+        """
+        chunk_hashes = list(chunk_hashes)
+        entries = {}
+        with self._lock:
+            for start in range(0, len(chunk_hashes), 500):
+                part = chunk_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT chunk_hash, status, question, attempts FROM questions "
+                    f"WHERE collection = ? AND chunk_hash IN ({placeholders})", [collection, *part]).fetchall()
+                for hash_, status, question, attempts in rows:
+                    entries[hash_] = {
+                        "status": status,
+                        "question": json.loads(question) if question else None,
+                        "attempts": attempts,
+                    }
+        return entries
+
+    def store(self, collection: str, chunk_hash: str, question: Optional[dict], attempts: int = 1):
+        """
+        Store a generated question, or mark the chunk as failed if question is None.
+        """
+        status = STATUS_OK if question else STATUS_FAILED
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO questions (collection, chunk_hash, status, question, attempts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (collection, chunk_hash) DO UPDATE SET "
+                "status = excluded.status, question = excluded.question, "
+                "attempts = questions.attempts + excluded.attempts, created_at = excluded.created_at",
+                (collection, chunk_hash, status, json.dumps(question, ensure_ascii=False) if question else None,
+                 attempts, time.time()))
+            self._conn.commit()
+
+    def page(self, collection: str, offset: int = 0, limit: int = 20) -> dict:
+        """
+        Return a page of the successfully generated questions of a collection.
+        """
+        with self._lock:
+            total = self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE collection = ? AND status = ?", (collection, STATUS_OK)).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT chunk_hash, question, created_at FROM questions WHERE collection = ? AND status = ? "
+                "ORDER BY created_at, chunk_hash LIMIT ? OFFSET ?", (collection, STATUS_OK, limit, offset)).fetchall()
+        return {
+            "collection_name": collection,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "items": [{"id": hash_, "question": json.loads(question), "created_at": created_at} for hash_, question, created_at in rows],
+        }
+
+    def prune(self, collection: str, keep_hashes: Iterable[str]) -> int:
+        """
+        Remove questions of chunks that no longer exist in the collection.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        keep = set(keep_hashes)
+        with self._lock:
+            stored = [row[0] for row in self._conn.execute(
+                "SELECT chunk_hash FROM questions WHERE collection = ?", (collection,)).fetchall()]
+            stale = [(collection, hash_) for hash_ in stored if hash_ not in keep]
+            if stale:
+                self._conn.executemany("DELETE FROM questions WHERE collection = ? AND chunk_hash = ?", stale)
+                self._conn.commit()
+        return len(stale)
+
+    def delete_collection(self, collection: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM questions WHERE collection = ?", (collection,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
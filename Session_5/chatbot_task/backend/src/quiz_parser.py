@@ -0,0 +1,138 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+
+class QuizAnswers(BaseModel):
+    A: str
+    B: str
+    C: str
+
+
+class QuizQuestion(BaseModel):
+    """
+    Schema of a generated single choice question. The aliases are the keys used by the frontend.
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    question: str = Field(alias="Frage", min_length=1)
+    answers: QuizAnswers = Field(alias="Antworten")
+    correct_answer: str = Field(alias="Korrekte_Antwort")
+    explanation: str = Field(alias="Erklärung")
+
+    @field_validator("correct_answer", mode="before")
+    @classmethod
+    def _normalize_correct_answer(cls, value: Any) -> str:
+        # Modelle antworten gerne mit "B) ..." oder "Antwort b" statt nur dem Buchstaben
+        match = re.search(r"\b([ABCabc])\b", str(value))
+        if not match:
+            raise ValueError(f"Keine gültige Antwort: {value}")
+        return match.group(1).upper()
+
+    def to_output(self) -> dict:
+        return self.model_dump(by_alias=True)
+
+
+# Mögliche Schlüssel, die kleine Modelle statt der vorgegebenen verwenden
+_KEY_ALIASES = {
+    "Frage": ("frage", "question"),
+    "Antworten": ("antworten", "answers", "optionen", "options", "antwortmöglichkeiten"),
+    "Korrekte_Antwort": ("korrekte_antwort", "korrekte antwort", "richtige_antwort", "richtige antwort", "correct_answer", "answer"),
+    "Erklärung": ("erklärung", "erklaerung", "explanation", "begründung"),
+}
+
+_TEXT_PATTERN = re.compile(
+    r"Frage\s*:\s*(?P<question>.*?)\s*\n"
+    r"\s*\(?A[).:]\s*(?P<A>.*?)\s*\n"
+    r"\s*\(?B[).:]\s*(?P<B>.*?)\s*\n"
+    r"\s*\(?C[).:]\s*(?P<C>.*?)\s*\n"
+    r"\s*(?:Korrekte|Richtige)\s+Antwort\s*:\s*(?P<correct>.*?)\s*\n"
+    r"\s*(?:Erklärung|Erklaerung|Begründung)\s*:\s*(?P<explanation>.*)",
+    re.DOTALL | re.IGNORECASE,
+)
+
+
+def _normalize_keys(data: Dict[str, Any]) -> Dict[str, Any]:
+    lowered = {str(key).strip().lower(): value for key, value in data.items()}
+    normalized = {}
+    for key, aliases in _KEY_ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                normalized[key] = lowered[alias]
+                break
+
+    answers = normalized.get("Antworten")
+    if isinstance(answers, list) and len(answers) == 3:
+        normalized["Antworten"] = dict(zip("ABC", answers))
+    elif isinstance(answers, dict):
+        normalized["Antworten"] = {str(key).strip(" )").upper(): value for key, value in answers.items()}
+    return normalized
+
+
+def _parse_json(output: str) -> Optional[dict]:
+    start, end = output.find("{"), output.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(output[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return QuizQuestion.model_validate(_normalize_keys(data)).to_output()
+
+
+def _parse_text(output: str) -> Optional[dict]:
+    # Markdown Formatierung (**Frage:**) entfernen
+    match = _TEXT_PATTERN.search(output.replace("**", ""))
+    if not match:
+        return None
+    return QuizQuestion.model_validate({
+        "Frage": match.group("question"),
+        "Antworten": {"A": match.group("A"), "B": match.group("B"), "C": match.group("C")},
+        "Korrekte_Antwort": match.group("correct"),
+        "Erklärung": match.group("explanation").strip(),
+    }).to_output()
+
+
+def parse_quiz_output(output: str) -> Optional[dict]:
+    """
+    Parse the output of the quiz generation chain, either JSON or the "Frage: ... A) ..." text format.
+
+    Returns:
+        Optional[dict]: The validated question in the frontend format or None if the output is unusable.
+    """
+    for parser in (_parse_json, _parse_text):
+        try:
+            question = parser(output)
+        except (ValidationError, ValueError):
+            question = None
+        if question:
+            return question
+    return None
+
+
+@dataclass
+class QuizGenerationStats:
+    """
+    Counters to monitor how many LLM generations are wasted on unparsable output.
+    """
+    generations: int = 0
+    parse_failures: int = 0
+    retries: int = 0
+    questions: int = 0
+    failed_chunks: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "generations": self.generations,
+            "parse_failures": self.parse_failures,
+            "retries": self.retries,
+            "questions": self.questions,
+            "failed_chunks": self.failed_chunks,
+            "parse_failure_rate": self.parse_failures / self.generations if self.generations else 0.0,
+            "retry_rate": self.retries / (self.questions + self.failed_chunks) if self.questions + self.failed_chunks else 0.0,
+        }
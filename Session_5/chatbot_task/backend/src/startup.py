@@ -0,0 +1,75 @@
+import logging
+import time
+import traceback
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+
+class StartupStatus(str, Enum):
+    STARTING = "starting"
+    WARMING_UP = "warming_up"
+    READY = "ready"
+    FAILED = "failed"
+
+
+@dataclass
+class StartupState:
+    """
+    Startup progress of the backend, reported by the readiness endpoint.
+    """
+    status: StartupStatus = StartupStatus.STARTING
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    ready_at: Optional[float] = None
+    init_times: Dict[str, float] = field(default_factory=dict)
+    warmup_errors: Dict[str, Optional[str]] = field(default_factory=dict)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status == StartupStatus.READY
+
+    def mark_ready(self):
+        """
+        Mark the backend as ready. Called once the chatbot is reachable by requests.
+        """
+        self.status = StartupStatus.READY
+        self.ready_at = time.time()
+        logger.info(f"Chatbot ready after {self.ready_at - self.started_at:.2f}s ({self.init_times}).")
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status.value,
+            "error": self.error,
+            "started_at": self.started_at,
+            "ready_at": self.ready_at,
+            "startup_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            "init_times": self.init_times,
+            "warmup_errors": self.warmup_errors,
+        }
+
+
+def initialize_chatbot(state: StartupState, create_chatbot: Callable[[], Any], warm_up: bool = False) -> Optional[Any]:
+    """
+    Create the chatbot and optionally warm up its models while updating the startup state. The state
+    is not marked ready here: the caller does that with mark_ready once requests can reach the chatbot.
+
+    Returns:
+        Optional[Any]: The chatbot or None if the initialization failed.
+    """
+    try:
+        chatbot = create_chatbot()
+        state.init_times = chatbot.init_times
+        if warm_up:
+            state.status = StartupStatus.WARMING_UP
+            state.warmup_errors = chatbot.warm_up()
+    except Exception as e:
+        logger.error(f"Chatbot initialization failed: {e}")
+        logger.error(traceback.format_exc())
+        state.status = StartupStatus.FAILED
+        state.error = str(e)
+        return None
+    return chatbot
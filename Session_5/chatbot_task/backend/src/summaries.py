@@ -0,0 +1,278 @@
+import hashlib
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_chroma import Chroma
+from src.flat_store import FlatClient, FlatCollection
+from src.ingestion import JobStatus
+from src.keyword_index import KeywordIndex, filtered_chunk_ids, reciprocal_rank_fusion
+from src.metrics import RAG_STAGE_SECONDS
+
+logger = logging.getLogger("uvicorn")
+logger.setLevel(logging.INFO)
+
+KIND_CHUNK = "chunk"
+KIND_DOCUMENT = "document"
+
+# Überblicksfragen, die aus den Dokument-Zusammenfassungen beantwortet werden. Die ganze Frage muss
+# einer dieser Formulierungen entsprechen, damit Detailfragen ("Worüber macht Satz 3 eine Aussage?")
+# weiter über die Chunks beantwortet werden
+_DOCUMENT = (r"(vorlesung(en)?|dokument(e|en)?|skript(e|en)?|folien|kurs(es)?|texte?|pdfs?|unterlagen|materialien|"
+             r"documents?|lectures?|slides|course|files?|scripts?|texts?|materials?)")
+_ARTICLE = r"((in|bei|von|über|ueber) )?(die|das|der|den|dem|des|diese[mnrs]?|meine[mnrs]?|unsere[mnrs]?)"
+_BROAD_QUESTION = re.compile(
+    rf"((bitte|please|kannst du|can you) )?("
+    rf"worum geht es( {_ARTICLE} {_DOCUMENT})?|"
+    rf"(wovon|worüber|worueber) (handel[nt]|geht|gehen|sprechen|spricht) {_ARTICLE} {_DOCUMENT}|"
+    rf"(fasse?|fassen sie) (mir )?{_ARTICLE} {_DOCUMENT} zusammen|"
+    rf"(gib mir |gib |geben sie mir )?(einen |ein )?(überblick|ueberblick) (über|ueber) {_ARTICLE} {_DOCUMENT}|"
+    rf"(eine )?zusammenfassung {_ARTICLE} {_DOCUMENT}|"
+    rf"(was sind |nenne )?(die )?hauptthemen( {_ARTICLE} {_DOCUMENT})?|"
+    rf"what (is|are) (this|these|the|my) {_DOCUMENT} about|"
+    rf"(give me )?an overview of (this|these|the|my) {_DOCUMENT}|"
+    rf"summari[sz]e (this|these|the|my) {_DOCUMENT}|"
+    rf"(what are )?the main topics( of (this|these|the|my) {_DOCUMENT})?"
+    rf")\s*[?.!]*")
+
+
+def is_broad_question(question: str) -> bool:
+    """
+    Whether a question asks for an overview of the documents instead of a specific detail.
+    """
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return bool(_BROAD_QUESTION.fullmatch(question))
+
+
+def document_summary_id(source: str) -> str:
+    return "doc-" + hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SummaryStatus:
+    """
+    Progress of the summary pass of a collection.
+    """
+    collection_name: str
+    status: JobStatus = JobStatus.QUEUED
+    chunks_total: int = 0
+    chunks_summarized: int = 0
+    chunks_failed: int = 0
+    documents_summarized: int = 0
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Während des Laufs wurden neue Chunks indexiert, danach erneut laufen
+    rerun: bool = field(default=False, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "collection_name": self.collection_name,
+            "status": self.status.value,
+            "chunks_total": self.chunks_total,
+            "chunks_summarized": self.chunks_summarized,
+            "chunks_failed": self.chunks_failed,
+            "documents_summarized": self.documents_summarized,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class SummaryIndex:
+    """
+    Summaries of the chunks and documents of every collection with their embeddings.
+
+    Every chunk collection has a collection of the same name in a separate flat vector store. Chunk
+    summaries use the id of their chunk, so a changed chunk (new content hash) has no summary until
+    the next summary pass. Document summaries use document_summary_id(source).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.client = FlatClient(path)
+        # Ob alle Chunks einer Collection eine Zusammenfassung haben, wird bei Bedarf neu bestimmt
+        self._ready: Dict[str, bool] = {}
+        self._generation: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, collection: str) -> FlatCollection:
+        return self.client.get_or_create_collection(collection, metadata={"hnsw:space": "cosine"})
+
+    def _existing(self, collection: str) -> Optional[FlatCollection]:
+        """
+        The summary collection if it exists. Read paths use this, so they do not create empty collections.
+        """
+        try:
+            return self.client.get_collection(collection)
+        except ValueError:
+            return None
+
+    def chunk_summaries(self, collection: str) -> Dict[str, dict]:
+        """
+        Metadata of all chunk summaries of a collection, keyed by chunk id.
+        """
+        summaries = self._existing(collection)
+        if summaries is None:
+            return {}
+        result = summaries.get(where={"kind": KIND_CHUNK}, include=["metadatas"])
+        return dict(zip(result["ids"], result["metadatas"]))
+
+    def chunk_summary_documents(self, collection: str, ids: List[str], where: Optional[dict] = None) -> Dict[str, Document]:
+        """
+        Chunk summaries with the given chunk ids that match the metadata filter, keyed by chunk id.
+        """
+        summaries = self._existing(collection)
+        if summaries is None or not ids:
+            return {}
+        where = {"$and": [{"kind": KIND_CHUNK}, where]} if where else {"kind": KIND_CHUNK}
+        result = summaries.get(ids=ids, where=where, include=["documents", "metadatas"])
+        return {chunk_id: Document(page_content=text, metadata={**metadata, "summary": True})
+                for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])}
+
+    def document_summaries(self, collection: str, where: Optional[dict] = None) -> List[Document]:
+        summaries = self._existing(collection)
+        if summaries is None:
+            return []
+        where = {"$and": [{"kind": KIND_DOCUMENT}, where]} if where else {"kind": KIND_DOCUMENT}
+        result = summaries.get(where=where, include=["documents", "metadatas"])
+        return [Document(page_content=text, metadata=metadata)
+                for text, metadata in zip(result["documents"], result["metadatas"])]
+
+    def search_documents(self, collection: str, embedding: List[float], k: int, max_distance: float,
+                         where: Optional[dict] = None) -> List[Document]:
+        """
+        The k document summaries most similar to the query embedding with a cosine distance of at most
+        max_distance, most similar first.
+        """
+        summaries = self._existing(collection)
+        if summaries is None:
+            return []
+        where = {"$and": [{"kind": KIND_DOCUMENT}, where]} if where else {"kind": KIND_DOCUMENT}
+        result = summaries.query(query_embeddings=[embedding], n_results=k, where=where,
+                                 include=["documents", "metadatas", "distances"])
+        return [Document(page_content=text, metadata=metadata)
+                for text, metadata, distance in zip(result["documents"][0], result["metadatas"][0], result["distances"][0])
+                if distance <= max_distance]
+
+    def store(self, collection: str, ids: List[str], summaries: List[str], embeddings: List[List[float]],
+              metadatas: List[dict]):
+        if ids:
+            self.collection(collection).upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=summaries)
+
+    def delete(self, collection: str, ids: Optional[List[str]] = None, where: Optional[dict] = None):
+        summaries = self._existing(collection)
+        if ids == [] or summaries is None:
+            return
+        summaries.delete(ids=ids, where=where)
+
+    def search(self, collection: str, embedding: List[float], k: int, where: Optional[dict] = None) -> List[str]:
+        """
+        Ids of the k chunks with the most similar summaries.
+        """
+        summaries = self._existing(collection)
+        if summaries is None:
+            return []
+        where = {"$and": [{"kind": KIND_CHUNK}, where]} if where else {"kind": KIND_CHUNK}
+        return summaries.query(query_embeddings=[embedding], n_results=k, where=where, include=[])["ids"][0]
+
+    def is_ready(self, collection: str, chunk_ids: Callable[[], Iterable[str]]) -> bool:
+        """
+        Whether every chunk of a collection has a summary. The result is cached until invalidate is called.
+
+        Args:
+            chunk_ids (Callable[[], Iterable[str]]): Returns the ids of all chunks of the collection.
+        """
+        with self._lock:
+            ready = self._ready.get(collection)
+            generation = self._generation.get(collection, 0)
+        if ready is None:
+            # Ohne Zusammenfassungen müssen die Chunk Ids nicht geladen werden
+            summarized = set(self.chunk_summaries(collection))
+            ids = set(chunk_ids()) if summarized else set()
+            ready = bool(ids) and ids <= summarized
+            with self._lock:
+                # Nicht speichern, wenn die Collection währenddessen geändert wurde
+                if self._generation.get(collection, 0) == generation:
+                    self._ready[collection] = ready
+        return ready
+
+    def invalidate(self, collection: str):
+        with self._lock:
+            self._ready.pop(collection, None)
+            self._generation[collection] = self._generation.get(collection, 0) + 1
+
+    def delete_collection(self, collection: str):
+        self.invalidate(collection)
+        try:
+            self.client.delete_collection(collection)
+        except ValueError:
+            pass
+
+
+class HierarchicalRetriever(BaseRetriever):
+    """
+    Retriever that searches the chunk summaries of a collection instead of the chunks. Only the best
+    expand_k hits are expanded to the full chunk, the other hits enter the context as summary, so the
+    prompt stays small. Overview questions ("Worum geht es in der Vorlesung?") are answered from the
+    document summaries within document_max_distance of the question, ranked by similarity. Without
+    such a summary they are answered from the chunk summaries like any other question.
+
+    With a keyword index the summary ranking is fused with the BM25 ranking of the chunks. As long as
+    not every chunk of the collection has a summary (is_ready), the fallback retriever is used.
+    """
+
+    summary_index: SummaryIndex
+    vector_db: Chroma
+    fallback: BaseRetriever
+    is_ready: Callable[[], bool]
+    keyword_index: Optional[KeywordIndex] = None
+    collection_name: str
+    k: int = 5
+    expand_k: int = 2
+    fetch_k: int = 20
+    document_max_distance: float = 0.8
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                filter: Optional[dict] = None) -> List[Document]:
+        # Ohne Embedding Funktion kann nicht in den Zusammenfassungen gesucht werden
+        embeddings = self.vector_db.embeddings
+        if not self.is_ready() or embeddings is None:
+            return self.fallback.invoke(query, config={"callbacks": run_manager.get_child()}, filter=filter)
+
+        with RAG_STAGE_SECONDS.labels("query_embedding").time():
+            embedding = embeddings.embed_query(query)
+
+        if is_broad_question(query):
+            with RAG_STAGE_SECONDS.labels("summary_search").time():
+                documents = self.summary_index.search_documents(
+                    self.collection_name, embedding, k=self.k, max_distance=self.document_max_distance, where=filter)
+            # Ohne passende Dokument-Zusammenfassung wie eine normale Frage über die Chunks beantworten
+            if documents:
+                return documents
+
+        with RAG_STAGE_SECONDS.labels("summary_search").time():
+            ranking = self.summary_index.search(self.collection_name, embedding, k=self.fetch_k, where=filter)
+        if self.keyword_index is not None:
+            with RAG_STAGE_SECONDS.labels("keyword_search").time():
+                hits = self.keyword_index.search(self.collection_name, query, k=self.fetch_k,
+                                                 chunk_ids=filtered_chunk_ids(self.vector_db, filter))
+            keyword_ranking = [chunk_id for chunk_id, _ in hits]
+            ranking = [chunk_id for chunk_id, _ in reciprocal_rank_fusion([ranking, keyword_ranking], rrf_k=self.rrf_k)]
+
+        # Zusammenfassungen der Treffer laden, dabei greift der Filter auch für die BM25 Treffer
+        by_id = self.summary_index.chunk_summary_documents(self.collection_name, ranking, where=filter)
+        top = [chunk_id for chunk_id in ranking if chunk_id in by_id][:self.k]
+
+        expand = top[:self.expand_k]
+        if expand:
+            with RAG_STAGE_SECONDS.labels("summary_expand").time():
+                chunks = self.vector_db.get(ids=expand, include=["documents", "metadatas"])
+            for chunk_id, text, metadata in zip(chunks["ids"], chunks["documents"], chunks["metadatas"]):
+                by_id[chunk_id] = Document(page_content=text, metadata=metadata or {})
+        return [by_id[chunk_id] for chunk_id in top]
@@ -0,0 +1,43 @@
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.bot import CustomChatBot
+from src.chunking import ChunkProfileStore
+from src.flat_store import FlatClient
+from src.keyword_index import KeywordIndex
+from src.summaries import SummaryIndex
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def chatbot(tmp_path):
+    # Nur die Stores, die die Indexierung braucht, ohne Modelle und LLM
+    chatbot = CustomChatBot.__new__(CustomChatBot)
+    chatbot.client = FlatClient(str(tmp_path / "flat_store"))
+    chatbot.keyword_index = KeywordIndex(str(tmp_path / "keyword_index.sqlite"))
+    chatbot.chunk_profiles = ChunkProfileStore(str(tmp_path / "chunk_profiles.sqlite"))
+    chatbot.summary_index = SummaryIndex(str(tmp_path / "summary_store"))
+    chatbot.answer_cache = None
+    chatbot.embedding_function = CountingEmbeddings(size=16, embedded=[])
+    return chatbot
+
+
+@pytest.fixture
+def index_chunks(chatbot, monkeypatch):
+    """
+    Index the given chunk texts as a PDF of the collection "kurs", without parsing a file.
+    """
+    def index(source: str, texts: List[str], collection_name: str = "kurs"):
+        chunks = [Document(page_content=text, metadata={"page": i}) for i, text in enumerate(texts)]
+        monkeypatch.setattr(chatbot, "_iter_chunks", lambda path, streaming, job, profile: iter(chunks))
+        chatbot.index_file_to_vector_db(f"/uploads/{source}", collection_name=collection_name)
+    return index
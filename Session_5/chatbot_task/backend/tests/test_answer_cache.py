@@ -0,0 +1,33 @@
+from src.answer_cache import AnswerCache
+
+
+def test_store_and_lookup_normalized_question():
+    cache = AnswerCache()
+    cache.store("kurs", "Was ist RAG?", "Retrieval Augmented Generation")
+
+    assert cache.lookup("kurs", "  was ist rag ") == "Retrieval Augmented Generation"
+    assert cache.lookup("andere", "Was ist RAG?") is None
+
+
+def test_invalidate_removes_answers_of_collection():
+    cache = AnswerCache()
+    cache.store("kurs", "Was ist RAG?", "alt")
+    cache.store("andere", "Was ist RAG?", "bleibt")
+
+    cache.invalidate("kurs")
+
+    assert cache.lookup("kurs", "Was ist RAG?") is None
+    assert cache.lookup("andere", "Was ist RAG?") == "bleibt"
+
+
+def test_answer_generated_before_invalidation_is_dropped():
+    cache = AnswerCache()
+    generation = cache.generation("kurs")
+    # Die Collection wird neu indexiert, während die Antwort noch gestreamt wird
+    cache.invalidate("kurs")
+    cache.store("kurs", "Was ist RAG?", "veraltet", generation=generation)
+
+    assert cache.lookup("kurs", "Was ist RAG?") is None
+
+    cache.store("kurs", "Was ist RAG?", "aktuell", generation=cache.generation("kurs"))
+    assert cache.lookup("kurs", "Was ist RAG?") == "aktuell"
@@ -0,0 +1,107 @@
+import os
+import zipfile
+
+import pytest
+from src.bulk_import import BulkImportError, assign_collections, extract_pdfs, find_pdfs, remove_staged, stage_files
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w") as zip_file:
+        for name, content in members.items():
+            zip_file.writestr(name, content)
+    return str(path)
+
+
+def normalize(name: str) -> str:
+    return os.path.splitext(name)[0]
+
+
+def test_extract_pdfs_keeps_folders_and_skips_other_files(tmp_path):
+    archive = make_zip(tmp_path / "import.zip", {
+        "KursA/a.pdf": b"%PDF a", "KursA/notes.txt": b"text", "__MACOSX/KursA/._a.pdf": b"meta", ".hidden/b.pdf": b"%PDF b",
+    })
+
+    paths = extract_pdfs(archive, str(tmp_path / "out"))
+
+    assert paths == [os.path.join(os.path.realpath(tmp_path / "out"), "KursA", "a.pdf")]
+
+
+@pytest.mark.parametrize("member", ["../evil.pdf", "../out-evil/evil.pdf", "KursA/../../evil.pdf", "/tmp/evil.pdf"])
+def test_extract_pdfs_rejects_members_outside_of_target(tmp_path, member):
+    archive = make_zip(tmp_path / "import.zip", {member: b"%PDF evil", "KursA/a.pdf": b"%PDF a"})
+    (tmp_path / "out").mkdir()
+
+    paths = extract_pdfs(archive, str(tmp_path / "out"))
+
+    assert [os.path.basename(path) for path in paths] == ["a.pdf"]
+    assert not (tmp_path / "evil.pdf").exists()
+    assert not (tmp_path / "out-evil").exists()
+
+
+def test_extract_pdfs_rejects_oversized_archives(tmp_path):
+    # Stark komprimierbarer Inhalt: das Archiv ist klein, entpackt aber zu groß
+    archive = make_zip(tmp_path / "import.zip", {"a.pdf": b"0" * 2048, "b.pdf": b"0" * 2048})
+
+    with pytest.raises(BulkImportError):
+        extract_pdfs(archive, str(tmp_path / "out"), max_bytes=3000)
+    assert not (tmp_path / "out").exists()
+
+
+def test_extract_pdfs_rejects_invalid_archives(tmp_path):
+    archive = tmp_path / "import.zip"
+    archive.write_bytes(b"kein zip")
+
+    with pytest.raises(BulkImportError):
+        extract_pdfs(str(archive), str(tmp_path / "out"))
+
+
+def test_assign_collections_by_top_level_folder(tmp_path):
+    root = str(tmp_path)
+    paths = [os.path.join(root, *parts) for parts in (("KursA", "a.pdf"), ("KursA", "sub", "b.pdf"), ("KursB", "a.pdf"), ("c.pdf",))]
+
+    assignments, errors = assign_collections(paths, root, None, normalize)
+
+    assert [collection for _, collection in assignments] == ["KursA", "KursA", "KursB", "c"]
+    assert errors == []
+
+
+def test_assign_collections_ignores_a_wrapping_folder_and_reports_duplicates(tmp_path):
+    root = str(tmp_path)
+    paths = [os.path.join(root, "Semester", "KursA", "a.pdf"), os.path.join(root, "Semester", "KursB", "a.pdf")]
+
+    assert [collection for _, collection in assign_collections(paths, root, None, normalize)[0]] == ["KursA", "KursB"]
+
+    assignments, errors = assign_collections(paths, root, "kurs", normalize)
+    assert assignments == [(paths[0], "kurs")]
+    assert [error["collection_name"] for error in errors] == ["kurs"]
+
+
+def test_stage_files_keeps_files_of_different_collections_apart(tmp_path):
+    for folder in ("KursA", "KursB"):
+        (tmp_path / "import" / folder).mkdir(parents=True)
+        (tmp_path / "import" / folder / "a.pdf").write_bytes(folder.encode())
+    paths = find_pdfs(str(tmp_path / "import"))
+
+    staged = stage_files(list(zip(paths, ["KursA", "KursB"])), str(tmp_path / "pdfs"))
+
+    assert [(os.path.relpath(path, tmp_path / "pdfs"), collection) for path, collection in staged] == [
+        (os.path.join("KursA", "a.pdf"), "KursA"), (os.path.join("KursB", "a.pdf"), "KursB")]
+    assert (tmp_path / "pdfs" / "KursB" / "a.pdf").read_bytes() == b"KursB"
+    assert all(os.path.exists(path) for path in paths)
+
+
+def test_remove_staged_deletes_a_document_or_the_whole_collection(tmp_path):
+    for folder, name in (("KursA", "a.pdf"), ("KursA", "b.pdf"), ("KursB", "a.pdf")):
+        (tmp_path / folder).mkdir(exist_ok=True)
+        (tmp_path / folder / name).write_bytes(b"pdf")
+
+    remove_staged(str(tmp_path), "KursA", "a.pdf")
+    assert sorted(os.listdir(tmp_path / "KursA")) == ["b.pdf"]
+
+    # Das letzte Dokument entfernt auch den leeren Ordner
+    remove_staged(str(tmp_path), "KursA", "b.pdf")
+    assert not (tmp_path / "KursA").exists()
+
+    remove_staged(str(tmp_path), "KursB")
+    remove_staged(str(tmp_path), "KursC")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,91 @@
+import pytest
+from langchain_core.documents import Document
+from src.chunking import ChunkProfile, Chunker, resolve_profile
+
+
+def page(number: int, text: str) -> Document:
+    return Document(page_content=text, metadata={"source": "slides.pdf", "page": number})
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def test_new_chunk_starts_at_each_heading():
+    profile = ChunkProfile(max_tokens=64, overlap_tokens=0, min_tokens=0)
+    text = "Einleitung\nText der Einleitung\n2.1 Embeddings\nText über Embeddings\nVEKTORDATENBANKEN\nText über Chroma"
+
+    chunks = list(Chunker(profile).split([page(0, text)]))
+
+    assert [chunk.metadata["heading"] for chunk in chunks] == ["Einleitung", "2.1 Embeddings", "VEKTORDATENBANKEN"]
+    assert chunks[1].page_content == "2.1 Embeddings\nText über Embeddings"
+
+
+def test_headings_disabled_keeps_page_as_one_section():
+    profile = ChunkProfile(max_tokens=64, overlap_tokens=0, min_tokens=0, headings=False)
+
+    chunks = list(Chunker(profile).split([page(0, "Einleitung\nText\n2.1 Embeddings\nMehr Text")]))
+
+    assert len(chunks) == 1
+    assert "heading" not in chunks[0].metadata
+
+
+def test_chunks_do_not_cross_page_boundaries():
+    profile = ChunkProfile(max_tokens=256, overlap_tokens=0, min_tokens=200)
+
+    chunks = list(Chunker(profile).split([page(0, "Folie eins\nkurz"), page(1, "Folie zwei\nauch kurz")]))
+
+    assert [chunk.metadata["page"] for chunk in chunks] == [0, 1]
+    assert all("page_end" not in chunk.metadata for chunk in chunks)
+
+
+def test_small_sections_are_merged_across_pages_without_page_boundaries():
+    profile = ChunkProfile(max_tokens=256, overlap_tokens=0, min_tokens=200, page_boundaries=False)
+
+    chunks = list(Chunker(profile).split([page(0, "Folie eins\nkurz"), page(1, "Folie zwei\nauch kurz")]))
+
+    assert len(chunks) == 1
+    assert chunks[0].metadata["page"] == 0
+    assert chunks[0].metadata["page_end"] == 1
+    assert chunks[0].page_content == "Folie eins\nkurz\n\nFolie zwei\nauch kurz"
+
+
+def test_long_section_is_split_with_heading_prefix():
+    profile = ChunkProfile(max_tokens=32, overlap_tokens=4, min_tokens=0)
+    body = " ".join(f"wort{i}" for i in range(100))
+
+    chunks = list(Chunker(profile, count_tokens=count_words).split([page(3, f"Titel\n{body}")]))
+
+    assert len(chunks) > 1
+    assert all(chunk.page_content.startswith("Titel\n") for chunk in chunks)
+    assert all(count_words(chunk.page_content) <= profile.max_tokens for chunk in chunks)
+    assert all(chunk.metadata["page"] == 3 for chunk in chunks)
+
+
+def test_split_consumes_pages_lazily():
+    consumed = []
+
+    def pages():
+        for number in range(3):
+            consumed.append(number)
+            yield page(number, f"Folie {number}\nText")
+
+    chunks = Chunker(ChunkProfile(max_tokens=64, overlap_tokens=0, min_tokens=0)).split(pages())
+
+    # Der letzte Chunk einer Seite wird erst mit der nächsten Seite ausgegeben
+    next(chunks)
+    assert consumed == [0, 1]
+
+
+def test_resolve_profile_applies_overrides():
+    profile = resolve_profile("quiz", max_tokens=512)
+
+    assert profile.name == "quiz+custom"
+    assert profile.max_tokens == 512
+    assert profile.overlap_tokens == 0
+
+
+@pytest.mark.parametrize("preset, overrides", [("unknown", {}), ("retrieval", {"overlap_tokens": 256})])
+def test_resolve_profile_rejects_invalid_settings(preset, overrides):
+    with pytest.raises(ValueError):
+        resolve_profile(preset, **overrides)
@@ -0,0 +1,48 @@
+import asyncio
+
+from src.conversation import ConversationMemory
+
+
+def test_summary_update_runs_after_the_turn_and_is_awaited_by_the_next_turn(chatbot, monkeypatch):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def summarize(prompt, *args, **kwargs):
+            await release.wait()
+            return "Es ging um Embeddings."
+
+        monkeypatch.setattr(chatbot, "_ainvoke_llm", summarize, raising=False)
+        memory = ConversationMemory(history_tokens=10, summary_tokens=50)
+        memory.add_turn("Was sind Embeddings?", "Vektoren, die die Bedeutung eines Textes abbilden.")
+
+        # Kehrt zurück, ohne auf den LLM Aufruf der Zusammenfassung zu warten
+        await asyncio.wait_for(chatbot._update_memory(memory, "Und Chroma?", "Eine Vektordatenbank."), timeout=1)
+        assert memory.summary == ""
+        assert [turn.question for turn in memory.turns] == ["Und Chroma?"]
+
+        settled = asyncio.create_task(memory.settle())
+        await asyncio.sleep(0)
+        assert not settled.done()
+
+        release.set()
+        await asyncio.wait_for(settled, timeout=1)
+        assert memory.summary == "Es ging um Embeddings."
+
+    asyncio.run(scenario())
+
+
+def test_clear_cancels_a_pending_summary_update():
+    async def scenario():
+        memory = ConversationMemory()
+        memory.add_turn("Frage", "Antwort")
+        pending = asyncio.create_task(asyncio.sleep(10))
+        memory.set_pending(pending)
+
+        memory.clear()
+        await memory.settle()
+
+        assert not memory
+        await asyncio.sleep(0)
+        assert pending.cancelled()
+
+    asyncio.run(scenario())
@@ -0,0 +1,92 @@
+import chromadb
+import pytest
+from src.bot import CollectionNotFound
+from src.flat_store import FlatClient
+
+
+def test_list_documents_of_a_collection(chatbot, index_chunks):
+    index_chunks("a.pdf", ["Einleitung", "Embeddings", "Chroma"])
+    index_chunks("b.pdf", ["Quiz"])
+
+    documents = sorted(chatbot.list_documents("kurs"), key=lambda document: document["source"])
+
+    assert documents == [{"source": "a.pdf", "chunks": 3, "pages": 3}, {"source": "b.pdf", "chunks": 1, "pages": 1}]
+
+
+def test_delete_document_keeps_other_documents(chatbot, index_chunks):
+    index_chunks("a.pdf", ["Einleitung", "Embeddings"])
+    index_chunks("b.pdf", ["Chroma"])
+
+    assert chatbot.delete_document("kurs", "a.pdf") == 2
+
+    assert [document["source"] for document in chatbot.list_documents("kurs")] == ["b.pdf"]
+    assert chatbot.keyword_index.search("kurs", "Embeddings", k=5) == []
+    assert chatbot.delete_document("kurs", "a.pdf") == 0
+
+
+def test_similarity_search_applies_metadata_filter(chatbot, index_chunks):
+    index_chunks("a.pdf", ["Einleitung", "Embeddings"])
+    index_chunks("b.pdf", ["Chroma", "FAISS"])
+
+    documents = chatbot._create_vector_db("kurs").similarity_search("Embeddings", k=4, filter={"source": "b.pdf"})
+
+    assert sorted(doc.page_content for doc in documents) == ["Chroma", "FAISS"]
+
+
+@pytest.mark.parametrize("where, expected", [
+    ({"source": "a.pdf"}, ["1", "2"]),
+    ({"source": {"$ne": "a.pdf"}}, ["3", "4"]),
+    ({"page": {"$in": [0, 2]}}, ["1", "3"]),
+    ({"page": {"$nin": [0, 2]}}, ["2", "4"]),
+    ({"$and": [{"source": "a.pdf"}, {"page": {"$gte": 1}}]}, ["2"]),
+    ({"$or": [{"source": "c.pdf"}, {"page": {"$lt": 1}}]}, ["1", "4"]),
+    ({"heading": "Agenda"}, []),
+])
+def test_flat_store_metadata_filters(tmp_path, where, expected):
+    collection = FlatClient(str(tmp_path)).get_or_create_collection("kurs")
+    collection.upsert(ids=["1", "2", "3", "4"], embeddings=[[1.0, 0.0]] * 4, documents=["a", "b", "c", "d"],
+                      metadatas=[{"source": "a.pdf", "page": 0}, {"source": "a.pdf", "page": 1},
+                                 {"source": "b.pdf", "page": 2}, {"source": "c.pdf", "page": 3}])
+
+    assert sorted(collection.get(where=where, include=[])["ids"]) == expected
+    assert sorted(collection.query(query_embeddings=[[1.0, 0.0]], n_results=4, where=where, include=[])["ids"][0]) == expected
+
+
+class HttpLikeClient:
+    """
+    Reports a missing collection like the chromadb HTTP client, with an exception that is not a ValueError.
+    """
+
+    def __init__(self, names):
+        self.names = names
+
+    def list_collections(self):
+        return [type("Collection", (), {"name": name})() for name in self.names]
+
+    def get_collection(self, name, **kwargs):
+        raise Exception(f'{{"error":"InvalidCollection","message":"Collection {name} does not exist."}}')
+
+
+@pytest.mark.parametrize("client", [
+    lambda tmp_path: FlatClient(str(tmp_path / "flat_store")),
+    lambda tmp_path: chromadb.EphemeralClient(),
+    lambda tmp_path: HttpLikeClient(["andere"]),
+])
+def test_unknown_collection_raises_collection_not_found(chatbot, tmp_path, client):
+    chatbot.client = client(tmp_path)
+
+    with pytest.raises(CollectionNotFound):
+        chatbot._ensure_collection_exists("fehlt")
+
+
+def test_existing_collection_is_found_by_name(chatbot):
+    chatbot.client = HttpLikeClient(["kurs"])
+
+    chatbot._ensure_collection_exists("kurs")
+
+
+def test_documents_of_unknown_collection_raise_collection_not_found(chatbot):
+    with pytest.raises(CollectionNotFound):
+        chatbot.list_documents("fehlt")
+    with pytest.raises(CollectionNotFound):
+        chatbot.delete_document("fehlt", "a.pdf")
@@ -0,0 +1,50 @@
+import itertools
+
+import pytest
+from src.embedding_cache import SQLiteEmbeddingCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SQLiteEmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_entries=2)
+    yield cache
+    cache.close()
+
+
+def last_access(cache: SQLiteEmbeddingCache, key: str) -> float:
+    return cache._conn.execute("SELECT last_access FROM embeddings WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_hits_do_not_write_until_flush(cache):
+    cache.put_many({"a": [1.0, 2.0]})
+    stored = last_access(cache, "a")
+
+    assert cache.get_many(["a", "b"]) == {"a": [1.0, 2.0]}
+    assert last_access(cache, "a") == stored
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_eviction_uses_buffered_access_times(cache, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr("src.embedding_cache.time.time", lambda: float(next(clock)))
+    cache.put_many({"a": [1.0]})
+    cache.put_many({"b": [2.0]})
+    cache.get_many(["a"])
+
+    # "b" wurde zuletzt geschrieben, "a" aber zuletzt gelesen
+    cache.put_many({"c": [3.0]})
+
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.evictions == 1
+
+
+def test_access_times_are_flushed_after_the_interval(tmp_path):
+    cache = SQLiteEmbeddingCache(str(tmp_path / "embeddings.sqlite"), flush_interval=0)
+    cache.put_many({"a": [1.0]})
+    stored = last_access(cache, "a")
+
+    cache.get_many(["a"])
+
+    assert last_access(cache, "a") >= stored
+    assert cache._pending_access == {}
+    cache.close()
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pytest
+from src.embedding_engine import (DEFAULT_MAX_SEQ_LENGTH, DEFAULT_NORMALIZE, EmbeddingEngine, EmbeddingEngineConfig,
+                                  _mean_pooling, _sentence_transformer_settings)
+
+# Kleines Modell mit der gleichen Pipeline (Mean Pooling + Normalize) wie all-mpnet-base-v2
+PARITY_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SENTENCES = [
+    "Retrieval Augmented Generation ergänzt den Prompt um passende Chunks.",
+    "Chroma speichert die Embeddings der Vorlesungsfolien.",
+    "Kurz",
+    # Länger als max_seq_length, prüft die Kürzung
+    " ".join(["Vektordatenbanken und Embeddings"] * 200),
+]
+
+
+def test_mean_pooling_ignores_padding_and_normalizes():
+    token_embeddings = np.array([[[1.0, 0.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+    attention_mask = np.array([[1, 1, 0]])
+
+    pooled = _mean_pooling(token_embeddings, attention_mask, normalize=False)
+    normalized = _mean_pooling(token_embeddings, attention_mask, normalize=True)
+
+    np.testing.assert_allclose(pooled, [[2.0, 2.0]])
+    np.testing.assert_allclose(normalized, [[2 ** -0.5, 2 ** -0.5]], rtol=1e-6)
+
+
+def test_sentence_transformer_settings_from_model_folder(tmp_path):
+    (tmp_path / "sentence_bert_config.json").write_text(json.dumps({"max_seq_length": 256, "do_lower_case": False}))
+    (tmp_path / "modules.json").write_text(json.dumps([
+        {"idx": 0, "name": "0", "path": "", "type": "sentence_transformers.models.Transformer"},
+        {"idx": 1, "name": "1", "path": "1_Pooling", "type": "sentence_transformers.models.Pooling"},
+        {"idx": 2, "name": "2", "path": "2_Normalize", "type": "sentence_transformers.models.Normalize"},
+    ]))
+
+    assert _sentence_transformer_settings(str(tmp_path), str(tmp_path)) == (256, True)
+
+
+def test_sentence_transformer_settings_fall_back_to_defaults(tmp_path):
+    assert _sentence_transformer_settings(str(tmp_path), str(tmp_path)) == (DEFAULT_MAX_SEQ_LENGTH, DEFAULT_NORMALIZE)
+
+
+@pytest.fixture(scope="module")
+def exported_model(tmp_path_factory):
+    torch = pytest.importorskip("torch")
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("transformers")
+
+    cache_folder = str(tmp_path_factory.mktemp("embedding_model"))
+    try:
+        model = sentence_transformers.SentenceTransformer(PARITY_MODEL, cache_folder=cache_folder)
+    except OSError as e:
+        pytest.skip(f"{PARITY_MODEL} not available: {e}")
+
+    onnx_path = str(tmp_path_factory.mktemp("onnx") / "model.onnx")
+    tokens = model.tokenizer(SENTENCES[:2], padding=True, return_tensors="pt")
+    input_names = ["input_ids", "attention_mask"]
+    torch.onnx.export(model[0].auto_model, tuple(tokens[name] for name in input_names), onnx_path,
+                      input_names=input_names, output_names=["last_hidden_state"],
+                      dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+                      opset_version=14)
+    return cache_folder, onnx_path
+
+
+def test_onnx_encoder_matches_torch_encoder(exported_model):
+    cache_folder, onnx_path = exported_model
+    torch_engine = EmbeddingEngine(EmbeddingEngineConfig(PARITY_MODEL, cache_folder, backend="torch", batch_size=2))
+    onnx_engine = EmbeddingEngine(EmbeddingEngineConfig(PARITY_MODEL, cache_folder, backend="onnx", batch_size=2,
+                                                        onnx_path=onnx_path))
+
+    expected = np.array(torch_engine.embed_documents(SENTENCES))
+    actual = np.array(onnx_engine.embed_documents(SENTENCES))
+
+    np.testing.assert_allclose(np.linalg.norm(actual, axis=1), 1.0, atol=1e-5)
+    np.testing.assert_allclose(actual, expected, atol=1e-4)
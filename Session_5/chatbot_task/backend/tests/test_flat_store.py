@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pytest
+from src.flat_store import FlatClient
+
+
+def reopen(tmp_path, name: str = "kurs"):
+    # Neuer Client, damit die Collection von der Festplatte geladen wird
+    return FlatClient(str(tmp_path)).get_collection(name)
+
+
+def snapshot(collection) -> dict:
+    result = collection.get(include=["documents", "metadatas", "embeddings"])
+    return {id_: (document, metadata, embedding) for id_, document, metadata, embedding
+            in zip(result["ids"], result["documents"], result["metadatas"], result["embeddings"])}
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = FlatClient(str(tmp_path)).get_or_create_collection("kurs", metadata={"hnsw:space": "cosine"})
+    collection.upsert(ids=["a", "b", "c"], embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+                      documents=["A", "B", "C"], metadatas=[{"page": 0}, {"page": 1}, {"page": 2}])
+    return collection
+
+
+def test_journal_is_replayed_on_load(tmp_path, collection):
+    collection.upsert(ids=["b", "d"], embeddings=[[0.0, 2.0], [2.0, 0.0]], documents=["B2", "D"],
+                      metadatas=[{"page": 1}, {"page": 3}])
+    collection.delete(ids=["a"])
+
+    loaded = reopen(tmp_path)
+
+    assert snapshot(loaded) == snapshot(collection)
+    assert loaded.get(ids=["b"], include=["documents"])["documents"] == ["B2"]
+    assert loaded.metadata == {"hnsw:space": "cosine"}
+
+
+def test_incomplete_journal_line_is_truncated(tmp_path, collection):
+    journal_path = collection._journal_path
+    size = os.path.getsize(journal_path)
+    # Absturz während des Schreibens des nächsten Eintrags
+    with open(journal_path, "ab") as f:
+        f.write(b'{"op": "upsert", "ids": ["x"')
+
+    loaded = reopen(tmp_path)
+
+    assert loaded.get(include=[])["ids"] == ["a", "b", "c"]
+    assert os.path.getsize(journal_path) == size
+
+    loaded.upsert(ids=["d"], embeddings=[[2.0, 0.0]], documents=["D"])
+    assert reopen(tmp_path).get(include=[])["ids"] == ["a", "b", "c", "d"]
+
+
+def test_journal_is_compacted_into_a_new_snapshot(tmp_path, collection, monkeypatch):
+    monkeypatch.setattr("src.flat_store._COMPACT_MIN_ROWS", 4)
+    old_journal = collection._journal_path
+    generation = collection._generation
+
+    collection.upsert(ids=["d", "e"], embeddings=[[2.0, 0.0], [0.0, 2.0]], documents=["D", "E"])
+
+    assert collection._generation == generation + 1
+    assert collection._journal_rows == 0
+    assert not os.path.exists(old_journal)
+    assert snapshot(reopen(tmp_path)) == snapshot(collection)
+
+
+def test_writes_after_loading_a_memory_mapped_snapshot(tmp_path, collection, monkeypatch):
+    monkeypatch.setattr("src.flat_store._COMPACT_MIN_ROWS", 0)
+    collection.upsert(ids=["d"], embeddings=[[2.0, 0.0]], documents=["D"])
+
+    loaded = reopen(tmp_path)
+    assert isinstance(loaded._vectors, np.memmap)
+    monkeypatch.setattr("src.flat_store._COMPACT_MIN_ROWS", 4096)
+
+    loaded.upsert(ids=["a", "e"], embeddings=[[0.5, 0.5], [0.0, 3.0]], documents=["A2", "E"])
+    loaded.delete(where={"page": 1})
+
+    expected = {"a": [0.5, 0.5], "c": [1.0, 1.0], "d": [2.0, 0.0], "e": [0.0, 3.0]}
+    for current in (loaded, reopen(tmp_path)):
+        result = current.get(include=["embeddings"])
+        assert dict(zip(result["ids"], result["embeddings"])) == expected
+
+
+def test_query_returns_nearest_neighbours(collection):
+    result = collection.query(query_embeddings=[[1.0, 0.1]], n_results=2, include=["documents", "distances"])
+
+    assert result["ids"] == [["a", "c"]]
+    assert result["distances"][0][0] == pytest.approx(1 - 1 / np.sqrt(1.01), abs=1e-6)
@@ -0,0 +1,130 @@
+from typing import List, Optional
+
+import chromadb
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.keyword_index import HybridRetriever, KeywordIndex, reciprocal_rank_fusion, tokenize
+
+CHUNKS = {
+    "intro": ("Einleitung in Retrieval Augmented Generation", "a.pdf"),
+    "vectors": ("Vektordatenbanken speichern Embeddings", "a.pdf"),
+    "bm25": ("BM25 bewertet seltene Begriffe höher", "a.pdf"),
+    "chroma": ("Chroma ist eine Vektordatenbank", "b.pdf"),
+}
+
+
+@pytest.fixture
+def keyword_index(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keyword_index.sqlite"))
+    index.add("kurs", list(CHUNKS), [text for text, _ in CHUNKS.values()])
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def vector_db(tmp_path):
+    vector_db = Chroma(client=chromadb.PersistentClient(path=str(tmp_path / "chroma")), collection_name="kurs",
+                       embedding_function=DeterministicFakeEmbedding(size=16))
+    vector_db.add_texts([text for text, _ in CHUNKS.values()], metadatas=[{"source": source} for _, source in CHUNKS.values()],
+                        ids=list(CHUNKS))
+    return vector_db
+
+
+class FixedVectorRetriever(HybridRetriever):
+    """
+    Hybrid retriever with a given vector ranking instead of the (random) fake embeddings.
+    """
+    vector_ranking: List[str] = []
+
+    def _vector_documents(self, query: str, k: int, filter: Optional[dict] = None) -> List[Document]:
+        return [Document(page_content=CHUNKS[chunk_id][0], metadata={"source": CHUNKS[chunk_id][1]})
+                for chunk_id in self.vector_ranking[:k]]
+
+
+class ReverseReranker:
+    def predict(self, sentences):
+        return [-len(text) for _, text in sentences]
+
+
+def test_tokenize_folds_umlauts_and_drops_stopwords():
+    assert tokenize("Was ist der Überblick über BM25?") == ["ueberblick", "ueber", "bm25"]
+
+
+def test_reciprocal_rank_fusion_prefers_items_in_both_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], rrf_k=60)
+
+    # Gleichstand (b, d) in der Reihenfolge des ersten Auftretens
+    assert [key for key, _ in fused] == ["c", "a", "b", "d"]
+    assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_search_ranks_matching_chunks_by_bm25(keyword_index):
+    hits = keyword_index.search("kurs", "seltene Begriffe", k=5)
+
+    assert [chunk_id for chunk_id, _ in hits] == ["bm25"]
+
+
+def test_search_expands_prefixes_of_compound_words(keyword_index):
+    hits = keyword_index.search("kurs", "Vektor", k=5)
+
+    assert {chunk_id for chunk_id, _ in hits} == {"vectors", "chroma"}
+
+
+def test_search_is_limited_to_the_collection_and_forgets_deleted_chunks(keyword_index):
+    keyword_index.add("andere", ["other"], ["Chroma und FAISS"])
+    keyword_index.delete("kurs", ["chroma"])
+
+    assert keyword_index.search("kurs", "Chroma", k=5) == []
+    assert [chunk_id for chunk_id, _ in keyword_index.search("andere", "Chroma", k=5)] == ["other"]
+
+
+def test_search_ranks_only_the_given_chunk_ids(keyword_index):
+    hits = keyword_index.search("kurs", "Vektor", k=1, chunk_ids={"vectors", "bm25"})
+
+    assert [chunk_id for chunk_id, _ in hits] == ["vectors"]
+    assert keyword_index.search("kurs", "Vektor", k=5, chunk_ids=set()) == []
+
+
+def test_hybrid_retriever_fuses_vector_and_keyword_rankings(vector_db, keyword_index):
+    retriever = FixedVectorRetriever(vector_db=vector_db, keyword_index=keyword_index, collection_name="kurs",
+                                     vector_ranking=["vectors", "intro", "chroma"], k=3)
+
+    documents = retriever.invoke("Vektor")
+
+    # "chroma" ist der beste Keyword Treffer und überholt "intro", das nur in der Vektorsuche vorkommt
+    assert [doc.page_content for doc in documents] == [CHUNKS["vectors"][0], CHUNKS["chroma"][0], CHUNKS["intro"][0]]
+
+
+def test_hybrid_retriever_applies_metadata_filter_to_keyword_hits(vector_db, keyword_index):
+    retriever = HybridRetriever(vector_db=vector_db, keyword_index=keyword_index, collection_name="kurs", k=4)
+
+    documents = retriever.invoke("Vektordatenbank", filter={"source": "a.pdf"})
+
+    assert documents
+    assert all(doc.metadata["source"] == "a.pdf" for doc in documents)
+
+
+def test_hybrid_retriever_filters_keyword_hits_before_the_top_k(vector_db, keyword_index):
+    retriever = HybridRetriever(vector_db=vector_db, keyword_index=keyword_index, collection_name="kurs", fetch_k=1)
+
+    # Der beste Keyword Treffer "chroma" liegt in b.pdf, der Treffer in a.pdf darf nicht verloren gehen
+    documents = retriever._keyword_documents("Vektor", filter={"source": "a.pdf"})
+
+    assert [doc.page_content for doc in documents] == [CHUNKS["vectors"][0]]
+
+
+def test_hybrid_retriever_reranks_fused_candidates(vector_db, keyword_index):
+    retriever = FixedVectorRetriever(vector_db=vector_db, keyword_index=keyword_index, collection_name="kurs",
+                                     vector_ranking=["intro", "bm25"], reranker=ReverseReranker(), k=2)
+
+    documents = retriever.invoke("Einleitung")
+
+    assert [doc.page_content for doc in documents] == [CHUNKS["bm25"][0], CHUNKS["intro"][0]]
+
+
+def test_hybrid_retriever_without_keyword_index_uses_vector_search(vector_db):
+    retriever = FixedVectorRetriever(vector_db=vector_db, collection_name="kurs", vector_ranking=["bm25", "intro"], k=1)
+
+    assert [doc.page_content for doc in retriever.invoke("Einleitung")] == [CHUNKS["bm25"][0]]
@@ -0,0 +1,160 @@
+import asyncio
+from typing import Any, AsyncIterator, List, Optional
+
+import httpx
+import pytest
+from benchmarks.fake_llm import CHAT_ANSWER, FakeStreamingChatModel
+from benchmarks.fake_ollama import create_app
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+from src.bot import CustomChatBot
+from src.llm_pool import ROLE_CHAT, ROLE_QUIZ, LLMEndpoint, LLMPool, LLMUnavailable
+from src.llm_scheduler import LLMScheduler
+
+
+class UnreachableChatModel(FakeStreamingChatModel):
+    """
+    Fails like ChatOllama against a stopped server, optionally after some tokens.
+    """
+    tokens_before_failure: int = 0
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for token in self._tokens()[:self.tokens_before_failure]:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        raise httpx.ConnectError("Connection refused")
+
+
+def fake_endpoint(name: str, roles: Optional[List[str]] = None, max_in_flight: int = 1,
+                  llm: Optional[FakeStreamingChatModel] = None, base_url: Optional[str] = None) -> LLMEndpoint:
+    llm = llm or FakeStreamingChatModel(responses=[CHAT_ANSWER], first_token_latency=0, token_latency=0)
+    return LLMEndpoint(name, llm=llm, json_llm=llm, roles=roles or [ROLE_CHAT, ROLE_QUIZ], max_in_flight=max_in_flight,
+                       base_url=base_url, model="llama3.2" if base_url else None)
+
+
+def scheduled_chatbot(pool: LLMPool) -> CustomChatBot:
+    # Nur Scheduler und Pool, ohne Modelle und Vektordatenbank
+    chatbot = CustomChatBot.__new__(CustomChatBot)
+    chatbot.llm_pool = pool
+    chatbot.llm_scheduler = LLMScheduler(max_in_flight=pool.capacity())
+    return chatbot
+
+
+def test_requests_go_to_the_least_loaded_endpoint():
+    async def scenario():
+        small, large = fake_endpoint("small", max_in_flight=2), fake_endpoint("large", max_in_flight=4)
+        pool = LLMPool([small, large])
+        routed = []
+        for _ in range(4):
+            routed.append((await pool._acquire(ROLE_CHAT)).name)
+        return routed
+
+    # Gleichstand bei Last 0 und 0.5 wird über die Anzahl der bisherigen Anfragen entschieden
+    assert asyncio.run(scenario()) == ["small", "large", "large", "small"]
+
+
+def test_requests_only_use_endpoints_of_their_role():
+    async def scenario():
+        pool = LLMPool([fake_endpoint("chat", roles=[ROLE_CHAT]), fake_endpoint("quiz", roles=[ROLE_QUIZ])])
+        async with pool.endpoint(ROLE_QUIZ) as quiz_endpoint:
+            async with pool.endpoint(ROLE_CHAT) as chat_endpoint:
+                return quiz_endpoint.name, chat_endpoint.name
+
+    assert asyncio.run(scenario()) == ("quiz", "chat")
+
+
+def test_waiting_request_is_woken_when_a_slot_is_released():
+    async def scenario():
+        pool = LLMPool([fake_endpoint("only")])
+        first = await pool._acquire(ROLE_CHAT)
+        waiter = asyncio.create_task(pool._acquire(ROLE_CHAT))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        assert pool.stats()["roles"][ROLE_CHAT]["waiting"] == 1
+
+        first.in_flight -= 1
+        pool._wake(first.roles)
+        assert (await asyncio.wait_for(waiter, timeout=1)) is first
+        assert first.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_waiting_request_fails_when_the_last_endpoint_fails():
+    async def scenario():
+        only = fake_endpoint("only")
+        pool = LLMPool([only])
+        await pool._acquire(ROLE_CHAT)
+        waiter = asyncio.create_task(pool._acquire(ROLE_CHAT))
+        await asyncio.sleep(0)
+
+        pool.mark_failed(only, httpx.ConnectError("Connection refused"))
+        with pytest.raises(LLMUnavailable):
+            await asyncio.wait_for(waiter, timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_failed_endpoint_before_the_first_token_is_retried_on_another_endpoint():
+    async def scenario():
+        down = fake_endpoint("down", llm=UnreachableChatModel(responses=[CHAT_ANSWER], first_token_latency=0, token_latency=0))
+        up = fake_endpoint("up")
+        chatbot = scheduled_chatbot(LLMPool([down, up]))
+
+        answer = await chatbot._ainvoke_llm("Was ist RAG?")
+        return answer, down, up
+
+    answer, down, up = asyncio.run(scenario())
+    assert answer.strip() == CHAT_ANSWER
+    assert (down.healthy, down.failures, up.requests) == (False, 1, 1)
+
+
+def test_failure_after_the_first_token_is_not_retried():
+    async def scenario():
+        llm = UnreachableChatModel(responses=[CHAT_ANSWER], first_token_latency=0, token_latency=0, tokens_before_failure=2)
+        broken, other = fake_endpoint("broken", llm=llm), fake_endpoint("other")
+        chatbot = scheduled_chatbot(LLMPool([broken, other]))
+
+        with pytest.raises(httpx.ConnectError):
+            await chatbot._ainvoke_llm("Was ist RAG?")
+        return broken, other
+
+    broken, other = asyncio.run(scenario())
+    assert broken.healthy and other.requests == 0
+
+
+def test_failed_endpoint_is_tried_again_after_the_backoff():
+    async def scenario():
+        only = fake_endpoint("only")
+        pool = LLMPool([only], retry_after=30)
+        pool.mark_failed(only, httpx.ConnectError("Connection refused"))
+
+        with pytest.raises(LLMUnavailable):
+            await pool._acquire(ROLE_CHAT)
+
+        only.failed_at -= 30
+        assert (await pool._acquire(ROLE_CHAT)) is only
+        assert only.healthy
+
+    asyncio.run(scenario())
+
+
+def test_health_check_marks_endpoints_healthy_again():
+    async def scenario():
+        served, missing = (fake_endpoint("served", base_url="http://ollama-a"),
+                           fake_endpoint("missing", base_url="http://ollama-b"))
+        missing.model = "llama3.1"
+        pool = LLMPool([served, missing], retry_after=3600)
+        pool.mark_failed(served, httpx.ConnectError("Connection refused"))
+
+        transport = httpx.ASGITransport(app=create_app(["llama3.2"], first_token_latency=0, token_latency=0, parallel=1))
+        async with httpx.AsyncClient(transport=transport) as client:
+            await pool.check_health(client)
+        return served, missing
+
+    served, missing = asyncio.run(scenario())
+    assert served.healthy and served.last_check is not None
+    # Das Modell fehlt auf dem Server
+    assert not missing.healthy and "llama3.1" in missing.last_error
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from src.llm_scheduler import LLMOverloaded, LLMScheduler, Priority
+
+
+def in_flight(scheduler: LLMScheduler, priority: Priority) -> int:
+    return scheduler.stats()["priorities"][priority.label]["in_flight"]
+
+
+def test_waiting_requests_are_served_by_priority():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1)
+        await scheduler.acquire(Priority.BATCH)
+        admitted = []
+
+        async def request(name: str, priority: Priority):
+            async with scheduler.slot(priority):
+                admitted.append(name)
+
+        tasks = [asyncio.create_task(request("batch", Priority.BATCH))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(request("chat 1", Priority.INTERACTIVE)),
+                  asyncio.create_task(request("chat 2", Priority.INTERACTIVE))]
+        await asyncio.sleep(0)
+
+        scheduler.release(Priority.BATCH)
+        await asyncio.gather(*tasks)
+        return admitted
+
+    # Der Chat überholt die früher eingereihte Batch Anfrage, innerhalb einer Priorität in Ankunftsreihenfolge
+    assert asyncio.run(scenario()) == ["chat 1", "chat 2", "batch"]
+
+
+def test_batch_requests_leave_a_slot_for_interactive_requests():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=2)
+        await scheduler.acquire(Priority.BATCH)
+        second_batch = asyncio.create_task(scheduler.acquire(Priority.BATCH))
+        await asyncio.sleep(0)
+
+        assert not second_batch.done()
+        await asyncio.wait_for(scheduler.acquire(Priority.INTERACTIVE), timeout=1)
+        assert (in_flight(scheduler, Priority.BATCH), in_flight(scheduler, Priority.INTERACTIVE)) == (1, 1)
+
+        scheduler.release(Priority.INTERACTIVE)
+        await asyncio.sleep(0)
+        # Ein Platz ist frei, aber das Batch Limit (max_in_flight - 1) ist erreicht
+        assert not second_batch.done()
+
+        scheduler.release(Priority.BATCH)
+        await asyncio.wait_for(second_batch, timeout=1)
+        assert in_flight(scheduler, Priority.BATCH) == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1, max_queued={Priority.BATCH: 1})
+        await scheduler.acquire(Priority.INTERACTIVE)
+        queued = asyncio.create_task(scheduler.acquire(Priority.BATCH))
+        await asyncio.sleep(0)
+
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(Priority.BATCH)
+
+        stats = scheduler.stats()["priorities"]["batch"]
+        assert (stats["queued"], stats["rejected"]) == (1, 1)
+        queued.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_request_is_rejected_after_the_queue_timeout():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1, queue_timeout={Priority.INTERACTIVE: 0.05})
+        await scheduler.acquire(Priority.BATCH)
+
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(Priority.INTERACTIVE)
+
+        stats = scheduler.stats()["priorities"]["interactive"]
+        assert (stats["queued"], stats["in_flight"], stats["rejected"]) == (0, 0, 1)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1)
+        await scheduler.acquire(Priority.INTERACTIVE)
+        waiter = asyncio.create_task(scheduler.acquire(Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert scheduler.stats()["priorities"]["interactive"]["queued"] == 0
+        scheduler.release(Priority.INTERACTIVE)
+        assert in_flight(scheduler, Priority.INTERACTIVE) == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_granted_while_the_waiter_is_cancelled_is_released():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1)
+        await scheduler.acquire(Priority.INTERACTIVE)
+        waiter = asyncio.create_task(scheduler.acquire(Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+
+        # Der Platz wird vergeben, bevor der wartende Task wieder läuft, und der Client bricht gleichzeitig ab
+        scheduler.release(Priority.INTERACTIVE)
+        assert in_flight(scheduler, Priority.INTERACTIVE) == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert in_flight(scheduler, Priority.INTERACTIVE) == 0
+        await asyncio.wait_for(scheduler.acquire(Priority.BATCH), timeout=1)
+
+    asyncio.run(scenario())
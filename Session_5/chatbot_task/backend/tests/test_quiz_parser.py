@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from src.quiz_parser import parse_quiz_output
+
+EXPECTED = {
+    "Frage": "Was speichert Chroma?",
+    "Antworten": {"A": "Bilder", "B": "Embeddings", "C": "Quizfragen"},
+    "Korrekte_Antwort": "B",
+    "Erklärung": "Chroma ist eine Vektordatenbank.",
+}
+
+TEXT_OUTPUT = """Frage: Was speichert Chroma?
+A) Bilder
+B) Embeddings
+C) Quizfragen
+Korrekte Antwort: B
+Erklärung: Chroma ist eine Vektordatenbank."""
+
+
+@pytest.mark.parametrize("output", [
+    json.dumps(EXPECTED, ensure_ascii=False),
+    # JSON in Markdown Codeblock mit Text davor und danach
+    "Hier ist die Frage:\n```json\n" + json.dumps(EXPECTED, ensure_ascii=False) + "\n```\nViel Erfolg!",
+    # Englische Schlüssel, Antworten als Liste, Buchstabe mit Antworttext
+    json.dumps({"question": "Was speichert Chroma?", "answers": ["Bilder", "Embeddings", "Quizfragen"],
+                "correct_answer": "B) Embeddings", "explanation": "Chroma ist eine Vektordatenbank."}),
+    # Kleingeschriebene Schlüssel, Antwortbuchstaben mit Klammer, kleingeschriebene Antwort
+    json.dumps({"frage": "Was speichert Chroma?", "optionen": {"a)": "Bilder", "b)": "Embeddings", "c)": "Quizfragen"},
+                "richtige antwort": "Antwort b", "begründung": "Chroma ist eine Vektordatenbank."}, ensure_ascii=False),
+    TEXT_OUTPUT,
+    # Markdown Formatierung und Leerzeilen-Einrückung im Textformat
+    TEXT_OUTPUT.replace("Frage:", "**Frage:**").replace("Korrekte Antwort:", "**Korrekte Antwort:**")
+    .replace("\nB)", "\n  (B)"),
+    TEXT_OUTPUT.replace("Korrekte Antwort", "Richtige Antwort").replace("Erklärung", "Begründung"),
+])
+def test_valid_outputs_are_parsed(output):
+    assert parse_quiz_output(output) == EXPECTED
+
+
+@pytest.mark.parametrize("output", [
+    "",
+    "Leider kann ich dazu keine Frage erstellen.",
+    # Unvollständiges JSON
+    '{"Frage": "Was speichert Chroma?", "Antworten": {"A": "Bilder"',
+    # Erklärung fehlt
+    json.dumps({k: v for k, v in EXPECTED.items() if k != "Erklärung"}, ensure_ascii=False),
+    # Keine gültige Antwort
+    json.dumps({**EXPECTED, "Korrekte_Antwort": "D"}, ensure_ascii=False),
+    # Nur zwei Antwortmöglichkeiten
+    json.dumps({**EXPECTED, "Antworten": ["Bilder", "Embeddings"]}, ensure_ascii=False),
+    # Leere Frage
+    json.dumps({**EXPECTED, "Frage": ""}, ensure_ascii=False),
+    # Textformat ohne korrekte Antwort
+    TEXT_OUTPUT.replace("Korrekte Antwort: B\n", ""),
+])
+def test_invalid_outputs_are_rejected(output):
+    assert parse_quiz_output(output) is None
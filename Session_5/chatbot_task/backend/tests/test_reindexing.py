@@ -0,0 +1,41 @@
+from typing import List
+
+from src.bot import CustomChatBot
+
+
+def stored(chatbot: CustomChatBot, source: str) -> List[str]:
+    return sorted(chatbot.client.get_collection("kurs").get(where={"source": source}, include=["documents"])["documents"])
+
+
+def test_reupload_embeds_only_changed_chunks(chatbot, index_chunks):
+    index_chunks("a.pdf", ["Einleitung", "Embeddings", "Chroma"])
+    chatbot.embedding_function.embedded.clear()
+
+    index_chunks("a.pdf", ["Einleitung", "Embeddings", "Chroma und FAISS"])
+
+    assert chatbot.embedding_function.embedded == ["Chroma und FAISS"]
+
+
+def test_reupload_removes_stale_chunks(chatbot, index_chunks):
+    index_chunks("a.pdf", ["Einleitung", "Embeddings", "Chroma"])
+    index_chunks("b.pdf", ["Chroma"])
+
+    index_chunks("a.pdf", ["Einleitung", "Vektordatenbanken"])
+
+    assert stored(chatbot, "a.pdf") == ["Einleitung", "Vektordatenbanken"]
+    # Gleicher Text einer anderen Datei bleibt erhalten
+    assert stored(chatbot, "b.pdf") == ["Chroma"]
+    assert chatbot.keyword_index.search("kurs", "Embeddings", k=5) == []
+
+
+def test_duplicate_chunks_within_a_file_are_stored_once(chatbot, index_chunks):
+    index_chunks("a.pdf", ["Agenda", "Embeddings", "Agenda"])
+
+    assert stored(chatbot, "a.pdf") == ["Agenda", "Embeddings"]
+    assert chatbot.embedding_function.embedded == ["Agenda", "Embeddings"]
+
+
+def test_chunk_ids_depend_on_source_and_content():
+    assert CustomChatBot._chunk_id("a.pdf", "Chroma") == CustomChatBot._chunk_id("a.pdf", "Chroma")
+    assert CustomChatBot._chunk_id("a.pdf", "Chroma") != CustomChatBot._chunk_id("b.pdf", "Chroma")
+    assert CustomChatBot._chunk_id("a.pdf", "Chroma") != CustomChatBot._chunk_id("a.pdf", "FAISS")
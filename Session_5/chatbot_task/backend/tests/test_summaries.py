@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from src.summaries import KIND_CHUNK, KIND_DOCUMENT, SummaryIndex, document_summary_id, is_broad_question
+
+
+@pytest.fixture
+def summary_index(tmp_path):
+    return SummaryIndex(str(tmp_path / "summary_store"))
+
+
+@pytest.mark.parametrize("question", [
+    "Worum geht es in der Vorlesung?",
+    "Wovon handelt das Skript?",
+    "Fasse die Folien zusammen.",
+    "Gib mir einen Überblick über die Vorlesung",
+    "What is this document about?",
+    "Summarize the lecture",
+])
+def test_overview_questions_are_broad(question):
+    assert is_broad_question(question)
+
+
+@pytest.mark.parametrize("question", [
+    "What is the theorem about convergence?",
+    "Gib mir eine Zusammenfassung von Gradient Descent",
+    "Was ist ein Überblick über Regression?",
+    "overview of BM25",
+])
+def test_detail_questions_are_not_broad(question):
+    assert not is_broad_question(question)
+
+
+def test_document_summaries_are_ranked_by_similarity_and_distance(summary_index):
+    sources = ["a.pdf", "b.pdf", "c.pdf"]
+    summary_index.store("kurs", [document_summary_id(source) for source in sources], ["A", "B", "C"],
+                        [[1.0, 0.0], [0.0, 1.0], [0.8, 0.6]],
+                        [{"kind": KIND_DOCUMENT, "source": source} for source in sources])
+
+    documents = summary_index.search_documents("kurs", [1.0, 0.1], k=3, max_distance=0.5)
+
+    # b.pdf ist zu weit von der Frage entfernt
+    assert [doc.metadata["source"] for doc in documents] == ["a.pdf", "c.pdf"]
+    assert summary_index.search_documents("kurs", [1.0, 0.1], k=3, max_distance=0.5, where={"source": "c.pdf"})[0].page_content == "C"
+
+
+def test_reads_do_not_create_summary_collections(summary_index, tmp_path):
+    def chunk_ids():
+        raise AssertionError("chunk ids are not needed without summaries")
+
+    assert not summary_index.is_ready("kurs", chunk_ids)
+    assert summary_index.document_summaries("kurs") == []
+    assert summary_index.search("kurs", [1.0, 0.0], k=3) == []
+    summary_index.delete("kurs", where={"source": "a.pdf"})
+
+    assert not os.path.exists(tmp_path / "summary_store" / "kurs")
+
+
+def test_is_ready_once_every_chunk_has_a_summary(summary_index):
+    summary_index.store("kurs", ["c1"], ["Zusammenfassung"], [[1.0, 0.0]], [{"kind": KIND_CHUNK, "source": "a.pdf"}])
+
+    assert not summary_index.is_ready("kurs", lambda: ["c1", "c2"])
+    summary_index.invalidate("kurs")
+    assert summary_index.is_ready("kurs", lambda: ["c1"])
@@ -1,9 +1,15 @@
+import asyncio
+import io
 import json
 import logging
+import os
+import time
+import zipfile
+from typing import Dict, List, Optional, Union
 
 import gradio as gr
+import httpx
 import pandas as pd
-import requests
 import websockets
 
 # Set up logging
@@ -11,66 +17,255 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 base_url = "http://backend:5001/"
+ws_url = "ws://backend:5001/ws?mode=session"
 
+# Gültigkeit der zwischengespeicherten Collection-Liste in Sekunden
+COLLECTIONS_CACHE_TTL = float(os.getenv("COLLECTIONS_CACHE_TTL", "5"))
 
-def upload_pdf(path: str):
-    if not path:
-        gr.Warning(f"Keine Datei ausgewählt")
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_collections_cache: Optional[tuple] = None
 
-    url = base_url + "upload_pdf"
 
-    with open(path, "rb") as f:
-        logger.info("Datei geladen")
-        files = {"file": f}
-        response = requests.post(url, files=files)
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Gemeinsamer HTTP Client mit Keep-Alive Verbindungen zum Backend.
+    Der Client ist an die Event Loop gebunden und wird pro Loop einmal erstellt.
+    """
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client_loop is not loop:
+        # Client der alten Loop in dieser schließen, damit seine Verbindungen nicht offen bleiben
+        if _http_client is not None and _http_client_loop is not None and _http_client_loop.is_running():
+            asyncio.run_coroutine_threadsafe(_http_client.aclose(), _http_client_loop)
+        _http_client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+        )
+        _http_client_loop = loop
+    return _http_client
 
-    if response.status_code == 200:
-        gr.Info(response.json().get('message', 'Upload erfolgreich'))
-        # TODO Geuploadete Collection auswählen im Dropdown
 
-        return update_dropdown(), get_collections()
+def invalidate_collections_cache():
+    global _collections_cache
+    _collections_cache = None
+
+
+class ChatSession:
+    """
+    Langlebige Websocket-Verbindung einer Browser-Sitzung zum Backend (Session Modus von /ws).
+    Die Nachrichten der Sitzung teilen sich die Verbindung und werden nacheinander beantwortet.
+    """
+
+    def __init__(self) -> None:
+        self.websocket = None
+        self.lock = asyncio.Lock()
+
+    async def _connect(self):
+        if self.websocket is None or self.websocket.closed:
+            self.websocket = await websockets.connect(ws_url)
+        return self.websocket
+
+    async def _send(self, payload: dict):
+        try:
+            websocket = await self._connect()
+            await websocket.send(json.dumps(payload))
+        except websockets.exceptions.ConnectionClosed:
+            # Verbindung wurde vom Backend geschlossen (z.B. Neustart), einmal neu verbinden
+            self.websocket = None
+            websocket = await self._connect()
+            await websocket.send(json.dumps(payload))
+        return websocket
+
+    async def ask(self, payload: dict, reset: bool = False):
+        """
+        Frage senden und die Antwort Chunk für Chunk zurückgeben.
+        """
+        async with self.lock:
+            if reset:
+                websocket = await self._send({"reset": True})
+                await websocket.recv()
+
+            websocket = await self._send(payload)
+            finished = False
+            try:
+                while True:
+                    frame = json.loads(await websocket.recv())
+                    if frame["type"] == "chunk":
+                        yield frame["content"]
+                    elif frame["type"] == "error":
+                        finished = True
+                        raise RuntimeError(frame.get("message"))
+                    elif frame["type"] == "end":
+                        finished = True
+                        return
+            finally:
+                # Abgebrochene Antworten würden die nächste Antwort auf der Verbindung vermischen
+                if not finished:
+                    await self.close()
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+            self.websocket = None
+
+
+# Websocket-Verbindungen pro Browser-Sitzung (session_hash von Gradio)
+chat_sessions: Dict[str, ChatSession] = {}
+
+
+async def close_chat_session(request: gr.Request):
+    session = chat_sessions.pop(request.session_hash, None)
+    if session is not None:
+        await session.close()
+
+
+def zip_pdfs(paths: List[str]) -> bytes:
+    """
+    Mehrere ausgewählte PDFs für den Bulk Import in ein ZIP Archiv packen
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for path in paths:
+            archive.write(path, os.path.basename(path))
+    return buffer.getvalue()
+
+
+async def import_files(paths: List[str], form_data: Optional[dict]):
+    # Eine ZIP Datei direkt hochladen, mehrere PDFs vorher zusammenpacken
+    if len(paths) == 1 and paths[0].lower().endswith(".zip"):
+        with open(paths[0], "rb") as f:
+            files = {"file": (os.path.basename(paths[0]), f)}
+            response = await get_http_client().post("import", files=files, data=form_data, timeout=600.0)
+    else:
+        pdfs = [path for path in paths if path.lower().endswith(".pdf")]
+        if len(pdfs) != len(paths):
+            gr.Warning("ZIP Dateien bitte einzeln hochladen")
+            return None
+        content = await asyncio.to_thread(zip_pdfs, pdfs)
+        files = {"file": ("upload.zip", content, "application/zip")}
+        response = await get_http_client().post("import", files=files, data=form_data, timeout=600.0)
+    return response
+
+
+async def upload_pdf(paths: Union[str, List[str]], selected_collection: str = None, add_to_collection: bool = False):
+    if isinstance(paths, str):
+        paths = [paths]
+    if not paths:
+        gr.Warning(f"Keine Datei ausgewählt")
+        return gr.update(), gr.update()
+
+    # Optional zur ausgewählten Collection hinzufügen statt eine neue Collection pro Datei anzulegen
+    form_data = {"collection_name": selected_collection} if add_to_collection and selected_collection else None
+    if len(paths) > 1 or paths[0].lower().endswith(".zip"):
+        response = await import_files(paths, form_data)
+        if response is None:
+            return gr.update(), gr.update()
+    else:
+        response = await upload_single_pdf(paths[0], form_data)
+
+    if response.is_success:
+        data = response.json()
+        gr.Info(data.get('message', 'Upload erfolgreich'))
+
+        collection_name = data.get("collection_name")
+        job_id = data.get("job_id")
+        if job_id:
+            job = await wait_for_ingestion_job(job_id)
+            # Beim Bulk Import ohne Ziel-Collection die erste importierte Collection auswählen
+            if not collection_name and job and job.get("files", {}).get("collections"):
+                collection_name = job["files"]["collections"][0]
+
+        # Geuploadete Collection im Dropdown auswählen
+        invalidate_collections_cache()
+        return await update_dropdown(collection_name), await get_collections()
     else:
         gr.Warning(response.json().get('message', 'Fehler beim Upload'))
+        return gr.update(), gr.update()
 
 
-def get_collections():
+async def upload_single_pdf(path: str, form_data: Optional[dict]):
+    with open(path, "rb") as f:
+        logger.info("Datei geladen")
+        files = {"file": (os.path.basename(path), f)}
+        response = await get_http_client().post("upload_pdf", files=files, data=form_data, timeout=120.0)
+    return response
+
+
+async def wait_for_ingestion_job(job_id: str, poll_interval: float = 1.0) -> Optional[dict]:
     """
-    Abfragen der Collections die in der ChromaDB gespeichert sind
+    Status des Indexierungs-Jobs im Backend abfragen bis dieser abgeschlossen ist
     """
-
+    while True:
+        try:
+            response = await get_http_client().get(f"ingestion_jobs/{job_id}")
+            response.raise_for_status()
+            job = response.json()
+        except Exception as e:
+            gr.Warning(f"Fehler beim Abfragen des Upload-Status: {e}")
+            return None
+
+        status = job.get("status")
+        report = job.get("files")
+        if status == "completed" and report:
+            gr.Info(f"{job['filename']}: {report['parsed']}/{report['total']} Dateien, "
+                    f"{job['progress']['chunks_written']} Chunks indexiert")
+            for error in report["errors"]:
+                gr.Warning(f"{error['file']}: {error['error']}")
+            return job
+        if status == "completed":
+            gr.Info(f"{job['filename']}: {job['progress']['chunks_written']} Chunks indexiert")
+            return job
+        if status in ("failed", "cancelled"):
+            gr.Warning(f"Indexierung von {job['filename']} {status}: {job.get('error') or ''}")
+            return job
+        await asyncio.sleep(poll_interval)
+
+
+def load_initial_collections() -> List[str]:
+    """
+    Collections beim Aufbau der Oberfläche laden. Synchron, da noch keine Event Loop läuft, an die
+    sich der gemeinsame HTTP Client binden könnte.
+    """
+    global _collections_cache
     try:
-        url = base_url + "get_collections"
-        response = requests.get(url)
+        response = httpx.get(f"{base_url}get_collections", timeout=httpx.Timeout(30.0, connect=5.0))
         response.raise_for_status()
         collections = response.json()
-        logger.debug(collections)
-        return collections
     except Exception as e:
-        gr.Warning(f"Fehler beim Collections laden: {e}")
+        logger.warning(f"Fehler beim Collections laden: {e}")
         return []
+    _collections_cache = (time.monotonic(), collections)
+    return list(collections)
 
 
-def set_collection(selected_collection: str):
+async def get_collections():
     """
-    Setzen der Collection die für die RAG Chain verwendet werden soll
+    Abfragen der Collections die in der ChromaDB gespeichert sind.
+    Die Liste wird COLLECTIONS_CACHE_TTL Sekunden zwischengespeichert.
     """
+    global _collections_cache
+    if _collections_cache is not None and time.monotonic() - _collections_cache[0] < COLLECTIONS_CACHE_TTL:
+        return list(_collections_cache[1])
+
     try:
-        url = base_url + "set_collection"
-        data = {"collection_name": selected_collection}
-        response = requests.post(url, json=data)
+        response = await get_http_client().get("get_collections")
         response.raise_for_status()
-        logger.info(f"Collection {selected_collection} ausgewählt")
+        collections = response.json()
+        logger.debug(collections)
+        _collections_cache = (time.monotonic(), collections)
+        return list(collections)
     except Exception as e:
-        gr.Warning(f"Fehler beim Setzen von {selected_collection}: {e} ")
+        gr.Warning(f"Fehler beim Collections laden: {e}")
+        return []
 
 
-def delete_collection(selected_collection: str):
+async def delete_collection(selected_collection: str):
     try:
-        url = base_url + "delete_collection"
-
         data = {"collection_name": selected_collection}
 
-        response = requests.put(url, json=data)
+        response = await get_http_client().put("delete_collection", json=data)
         response.raise_for_status()
         logger.info(f"Collection {selected_collection} gelöscht")
         gr.Info(f"Collection {selected_collection} gelöscht")
@@ -78,37 +273,46 @@ def delete_collection(selected_collection: str):
     except Exception as e:
         gr.Warning(f"Fehler beim Löschen von {selected_collection}: {e}")
         return False
+    finally:
+        invalidate_collections_cache()
 
 
-def generate_questions() -> dict:
+async def generate_questions(selected_collection: str):
     """
-    Generieren von Fragen basierend auf der momentan ausgewählten Collection    
+    Generieren von Fragen basierend auf der momentan ausgewählten Collection.
+    Die Fragen werden per Server-Sent Events gestreamt, sobald sie fertig sind.
     """
-    try:
-        url = base_url + "generate_questions"
-        response = requests.post(url)
+    params = {"collection_name": selected_collection}
+    async with get_http_client().stream("GET", "generate_questions/stream", params=params, timeout=None) as response:
         response.raise_for_status()
 
-        data = response.json()
-        if isinstance(data, str):  # Falls Backend String liefert, dekodieren
-            data = json.loads(data)
-        return data
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "question":
+                    yield str(data.pop("id")), data
+                elif event == "error":
+                    raise RuntimeError(data.get("error"))
 
-    except Exception as e:
-        gr.Warning(f"Fehler bei der Generierung von Fragen: {e}")
-        return {}
+
+async def get_current_collection():
+    response = await get_http_client().get("get_current_collection")
+    return response.json()['collection_name']
 
 
-def update_dropdown(selected_collection=None):
+async def update_dropdown(selected_collection=None):
     """
     Aktualisiere das Dropdown-Menü mit neuen Collections und optional einer vorausgewählten Collection.
     """
     if selected_collection == None:
-        curr_collection = requests.get(base_url + "get_current_collection")
-        name = curr_collection.json()['collection_name']
-        selected_collection = name
+        # Aktuelle Collection und Collection-Liste parallel abfragen
+        selected_collection, new_choices = await asyncio.gather(get_current_collection(), get_collections())
+    else:
+        new_choices = await get_collections()
 
-    new_choices = get_collections()
     selected_value = selected_collection if selected_collection else (
         new_choices[0] if new_choices else None)
     return gr.Dropdown(choices=new_choices, value=selected_value)
@@ -116,34 +320,25 @@ def update_dropdown(selected_collection=None):
 # WebSocket chat function (asynchronous generator)
 
 
-async def websocket_chat(message: str):
-    uri = "ws://backend:5001/ws"
+async def websocket_chat(message: str, selected_collection: str, session_hash: str, new_conversation: bool = False):
+    session = chat_sessions.setdefault(session_hash, ChatSession())
     try:
-        async with websockets.connect(uri) as websocket:
-            logger.info(f"Sending message to WebSocket: {message}")
-            await websocket.send(message)
-
-            while True:
-                try:
-                    chunk = await websocket.recv()
-                    logger.info(f"Received chunk: {chunk}")
-                    yield chunk  # Stream chunk to Gradio
-                except websockets.exceptions.ConnectionClosed:
-                    logger.info("WebSocket connection closed by the server.")
-                    break  # Verbindung geschlossen, Stream beenden
-                except Exception as e:
-                    logger.error(f"Error receiving chunk: {str(e)}")
-                    yield f"Error: {str(e)}"
-                    break
+        logger.info(f"Sending message to WebSocket: {message}")
+        # Collection pro Nachricht mitschicken, damit sich Nutzer nicht gegenseitig die Collection umstellen
+        async for chunk in session.ask({"question": message, "collection_name": selected_collection}, reset=new_conversation):
+            logger.info(f"Received chunk: {chunk}")
+            yield chunk  # Stream chunk to Gradio
 
     except Exception as e:
         logger.error(f"Error during WebSocket communication: {str(e)}")
+        # Verbindung verwerfen, die nächste Nachricht baut eine neue auf
+        await session.close()
         yield f"Error: {str(e)}"
 
 # Chat function to update the chatbot message history
 
 
-async def chat(message: str, history=[]):
+async def chat(message: str, history=[], selected_collection: str = None, request: gr.Request = None):
     if not message.strip():
         yield "Please enter a valid question."
         return
@@ -151,7 +346,8 @@ async def chat(message: str, history=[]):
     try:
         # Stream chunks from WebSocket and append them incrementally
         bot_message = ""
-        async for chunk in websocket_chat(message):
+        # Leerer Verlauf bedeutet neues Gespräch, dann auch den Verlauf im Backend zurücksetzen
+        async for chunk in websocket_chat(message, selected_collection, request.session_hash, new_conversation=not history):
             bot_message += str(chunk)  # Accumulate chunks
             yield bot_message  # Yield updated history incrementally for display
 
@@ -159,9 +355,14 @@ async def chat(message: str, history=[]):
         yield f"Fehler: {e}"
 
 
-def handle_question_generation():
-    data = generate_questions()
-    return data
+async def handle_question_generation(selected_collection: str):
+    questions = {}
+    try:
+        async for question_id, question in generate_questions(selected_collection):
+            questions[question_id] = question
+            yield dict(questions)
+    except Exception as e:
+        gr.Warning(f"Fehler bei der Generierung von Fragen: {e}")
 
 
 def show_question(questions: dict):
@@ -226,7 +427,7 @@ def update_stat_chart(stats):
 
 # Launch Gradio Chat Interface
 with gr.Blocks() as demo:
-    collections = get_collections() or []
+    collections = load_initial_collections()
     questions = gr.State({})
     stats = gr.State(pd.DataFrame(
         {"Bewertung": ["Korrekt", "Falsch"], "Anzahl": [0, 0]}))
@@ -234,12 +435,21 @@ with gr.Blocks() as demo:
     # State um Collections zu speichern, bei Änderung wird Verwaltung neu gerendert
     collections_state = gr.State(collections)
 
+    # Dropdown wird erst in der rechten Spalte gerendert, aber schon als Eingabe für den Chat benötigt
+    dropdown = gr.Dropdown(label="Collection",
+                           info="Collection für Kontext auswählen",
+                           choices=collections,
+                           value=collections[0] if collections else None,
+                           interactive=True,
+                           render=False)
+
     gr.Markdown("### MaxiKing Chatbot")
     with gr.Tab("Chatbot"):
         with gr.Row():
             with gr.Column(scale=2):
                 chatbot = gr.ChatInterface(
                     fn=chat,
+                    additional_inputs=[dropdown],
                     # Adjusted height for better usability
                     chatbot=gr.Chatbot(height=600),
                     # textbox=gr.Textbox(placeholder="Ask me questions about your script...", container=False, scale=7),
@@ -250,17 +460,13 @@ with gr.Blocks() as demo:
                               "What is deep learning?", "What is a linear regression?"],
                 )
             with gr.Column():
-                dropdown = gr.Dropdown(label="Collection",
-                                       info="Collection für Kontext auswählen",
-                                       choices=collections,
-                                       value=collections[0] if collections else None,
-                                       interactive=True)
+                dropdown.render()
                 upload_button = gr.UploadButton("Datei hinzufügen", file_types=[
-                                                ".pdf"], file_count="single")
+                                                ".pdf", ".zip"], file_count="multiple")
+                add_to_collection = gr.Checkbox(label="Zur ausgewählten Collection hinzufügen", value=False)
 
-            upload_button.upload(upload_pdf, inputs=upload_button, outputs=[
+            upload_button.upload(upload_pdf, inputs=[upload_button, dropdown, add_to_collection], outputs=[
                                  dropdown, collections_state])
-            dropdown.change(set_collection, inputs=dropdown)
     with gr.Tab("Quiz"):
         # Button zum Generieren von Fragen
         gen_questions_button = gr.Button("Fragen generieren")
@@ -283,6 +489,7 @@ with gr.Blocks() as demo:
     # Aktionen zuweisen
         gen_questions_button.click(
             handle_question_generation,
+            inputs=dropdown,
             outputs=questions
         )
 
@@ -319,13 +526,13 @@ with gr.Blocks() as demo:
                                show_label=False, container=False)
                     delete_btn = gr.Button("Löschen", scale=0, variant="stop")
 
-                    def delete(collection=collection):
+                    async def delete(collection=collection):
                         # Überprüfung ob Collection ohne Fehler gelöscht wurde, nur dann diese aus der Ansicht entfernen
-                        if delete_collection(str(collection)):
+                        if await delete_collection(str(collection)):
                             # Collection aus State löschen damit neu gerendert wird
                             collections.remove(collection)
 
-                        dropdown = update_dropdown()  # Dropdown aktualiseren
+                        dropdown = await update_dropdown()  # Dropdown aktualiseren
                         return collections, dropdown
 
                     delete_btn.click(
@@ -333,4 +540,5 @@ with gr.Blocks() as demo:
 
     demo.load(update_dropdown, outputs=dropdown)
     demo.load(get_collections, outputs=collections_state)
+    demo.unload(close_chat_session)
 demo.launch(debug=True)